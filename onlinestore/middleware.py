@@ -0,0 +1,216 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('onlinestore.sql')
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+\b')
+_PLACEHOLDER = re.compile(r'%s')
+_VALUE_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_VALUE_ROWS = re.compile(r'\(\?, \.\.\.\)(?:\s*,\s*\(\?, \.\.\.\))+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """
+    Нормализованная форма запроса без конкретных значений: строковые и числовые
+    литералы и плейсхолдеры заменяются на '?', списки значений IN (...) и строки
+    VALUES многострочной вставки любой длины сворачиваются, пробелы схлопываются.
+    """
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _VALUE_LIST.sub('(?, ...)', sql)
+    sql = _VALUE_ROWS.sub('(?, ...), ...', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def fingerprint_id(shape):
+    """Короткий идентификатор формы запроса для группировки строк лога."""
+    return hashlib.md5(shape.encode()).hexdigest()[:16]
+
+
+class QueryRecorder:
+    """
+    Обёртка выполнения запросов (connection.execute_wrapper), записывающая
+    текст, параметры и длительность каждого запроса.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, params, time.perf_counter() - started))
+
+    @contextmanager
+    def record(self):
+        """
+        Записывает запросы всех подключений текущего потока. Подключения к БД
+        у каждого потока свои, поэтому вход и выход выполняются в потоке, где работает ORM.
+        """
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+    def report(self, n_plus_one_threshold, slowest):
+        shapes = defaultdict(list)
+        exact = Counter()
+        for sql, params, duration in self.queries:
+            shapes[fingerprint(sql)].append(duration)
+            exact[(sql, repr(params))] += 1
+
+        # Точные повторы (тот же текст и те же параметры) по нормализованным формам
+        repeats = Counter()
+        for (sql, _), count in exact.items():
+            if count > 1:
+                repeats[fingerprint(sql)] += count - 1
+
+        return {
+            'queries': len(self.queries),
+            'db_time_ms': round(sum(duration for _, _, duration in self.queries) * 1000, 2),
+            'duplicates': sum(repeats.values()),
+            'duplicate_queries': [
+                {'fingerprint': fingerprint_id(shape), 'sql': shape, 'repeats': count}
+                for shape, count in repeats.most_common()
+            ],
+            # Одна и та же форма запроса много раз с разными параметрами — типичный N+1
+            'n_plus_one': [
+                {
+                    'fingerprint': fingerprint_id(shape), 'sql': shape,
+                    'count': len(durations), 'time_ms': round(sum(durations) * 1000, 2),
+                }
+                for shape, durations in sorted(shapes.items(), key=lambda item: -len(item[1]))
+                if len(durations) >= n_plus_one_threshold
+            ],
+            'slowest': [
+                {'fingerprint': fingerprint_id(fingerprint(sql)), 'sql': sql, 'time_ms': round(duration * 1000, 2)}
+                for sql, _, duration in sorted(self.queries, key=lambda query: -query[2])[:slowest]
+            ],
+        }
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Инструментирование SQL на уровне запроса (включается настройкой SQL_INSTRUMENTATION_ENABLED).
+
+    Для каждого HTTP-запроса считает количество SQL-запросов и суммарное время БД,
+    находит точные дубликаты и вероятные N+1 (одна форма запроса, повторённая
+    не меньше SQL_INSTRUMENTATION_N_PLUS_ONE_THRESHOLD раз), отбирает самые медленные
+    запросы; формы запросов сопровождаются коротким fingerprint для группировки в логе.
+    Сводка отдаётся в заголовках X-DB-* и пишется в лог onlinestore.sql
+    одной JSON-строкой (уровень WARNING, если найден N+1). Работает без DEBUG:
+    запросы перехватываются через connection.execute_wrapper.
+
+    Работает и в синхронном, и в асинхронном стеке. У потоковых ответов
+    (StreamingHttpResponse, FileResponse) учитываются и запросы, выполненные
+    при чтении тела; сводка пишется в лог после его отдачи, а заголовки X-DB-*
+    не добавляются — они уходят клиенту раньше тела.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SQL_INSTRUMENTATION_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.n_plus_one_threshold = getattr(settings, 'SQL_INSTRUMENTATION_N_PLUS_ONE_THRESHOLD', 5)
+        self.slowest = getattr(settings, 'SQL_INSTRUMENTATION_SLOWEST', 3)
+        self.headers = getattr(settings, 'SQL_INSTRUMENTATION_HEADERS', True)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+        return self.finish(request, response, recorder)
+
+    async def __acall__(self, request):
+        # Асинхронные представления обращаются к ORM через sync_to_async в общем потоке
+        # запроса: обёртки подключений ставятся и снимаются в нём же
+        recorder = QueryRecorder()
+        stack = ExitStack()
+        await sync_to_async(stack.enter_context)(recorder.record())
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.finish(request, response, recorder)
+
+    def finish(self, request, response, recorder):
+        if response.streaming:
+            content = response.streaming_content
+            if response.is_async:
+                response.streaming_content = self.arecord_stream(request, response, recorder, content)
+            else:
+                response.streaming_content = self.record_stream(request, response, recorder, content)
+            return response
+
+        report = self.report(recorder)
+        if self.headers:
+            response['X-DB-Query-Count'] = report['queries']
+            response['X-DB-Time-Ms'] = report['db_time_ms']
+            response['X-DB-Duplicate-Queries'] = report['duplicates']
+            response['X-DB-N-Plus-One'] = len(report['n_plus_one'])
+        self.log(request, response, report)
+        return response
+
+    def record_stream(self, request, response, recorder, content):
+        # Записываются только запросы, выполненные при получении очередной части тела
+        iterator = iter(content)
+        try:
+            while True:
+                with recorder.record():
+                    try:
+                        chunk = next(iterator)
+                    except StopIteration:
+                        break
+                yield chunk
+        finally:
+            self.log(request, response, self.report(recorder), streaming=True)
+
+    async def arecord_stream(self, request, response, recorder, content):
+        iterator = aiter(content)
+        try:
+            while True:
+                stack = ExitStack()
+                await sync_to_async(stack.enter_context)(recorder.record())
+                try:
+                    chunk = await anext(iterator)
+                except StopAsyncIteration:
+                    break
+                finally:
+                    await sync_to_async(stack.close)()
+                yield chunk
+        finally:
+            self.log(request, response, self.report(recorder), streaming=True)
+
+    def report(self, recorder):
+        return recorder.report(self.n_plus_one_threshold, self.slowest)
+
+    def log(self, request, response, report, streaming=False):
+        level = logging.WARNING if report['n_plus_one'] else logging.INFO
+        if logger.isEnabledFor(level):
+            entry = {'method': request.method, 'path': request.path, 'status': response.status_code}
+            if streaming:
+                entry['streaming'] = True
+            logger.log(level, json.dumps({**entry, **report}, ensure_ascii=False))
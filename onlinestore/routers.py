@@ -0,0 +1,161 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+"""
+Маршрутизация запросов между основной БД и репликами для чтения.
+
+Чтение каталога, отзывов и отчётов уходит на реплики (DATABASE_REPLICAS), запись —
+в основную БД. Модели, для которых важно сразу видеть собственные изменения
+(корзина, заказы, пользователи и их сессии), всегда читаются из основной БД.
+После первой записи в пределах запроса все дальнейшие чтения этого запроса
+тоже идут в основную БД; middleware продлевает это на DATABASE_REPLICA_LAG секунд
+для следующих запросов того же клиента, чтобы он не увидел реплику с отставанием.
+"""
+
+PRIMARY_DB = 'default'
+
+# Модели (app_label.model_name) и приложения (app_label), которые читаются только из основной БД
+PRIMARY_MODELS = {
+    'shop.cart',
+    'shop.cartitem',
+    'shop.order',
+    'shop.orderitem',
+    'shop.stockreservation',
+    'users',
+    'sessions',
+    'admin',
+}
+
+STICKY_COOKIE = 'db_primary'
+
+_pinned = ContextVar('db_pinned_to_primary', default=False)
+_wrote = ContextVar('db_wrote_to_primary', default=False)
+
+
+def replica_aliases():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def pin_to_primary():
+    """Направляет все дальнейшие чтения текущего запроса (контекста) в основную БД."""
+    _pinned.set(True)
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+@contextmanager
+def use_primary():
+    """Чтения внутри блока идут в основную БД (например, перед записью по прочитанным данным)."""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def reads_from_primary(model):
+    meta = model._meta
+    # Исторические модели миграций (RunPython) работают с основной БД, которую мигрируют
+    if meta.apps is not apps:
+        return True
+    return meta.app_label in PRIMARY_MODELS or meta.label_lower in PRIMARY_MODELS
+
+
+class PrimaryReplicaRouter:
+    """
+    Роутер: запись — в основную БД, чтение — на случайную реплику, если чтение
+    не закреплено за основной БД моделью, предыдущей записью или use_primary().
+    Без настроенных реплик всё идёт в основную БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        if not replicas or is_pinned() or reads_from_primary(model):
+            return PRIMARY_DB
+        # Связанные объекты читаются из той же реплики, что и исходный
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in replicas:
+            return instance._state.db
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if replica_aliases():
+            pin_to_primary()
+            _wrote.set(True)
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY_DB, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему вместе с данными из основной БД
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class DatabaseStickinessMiddleware:
+    """
+    Ограничивает закрепление чтений за основной БД текущим запросом и продлевает
+    его для клиента, который только что что-то записал.
+
+    Небезопасные методы (POST и т. п.) сразу читают из основной БД. Если запрос
+    что-то записал, клиент получает cookie на DATABASE_REPLICA_LAG секунд, и его
+    запросы в это время тоже читают из основной БД.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_aliases():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        tokens = self.start(request)
+        try:
+            response = self.get_response(request)
+            return self.finish(response)
+        finally:
+            self.reset(tokens)
+
+    async def __acall__(self, request):
+        tokens = self.start(request)
+        try:
+            response = await self.get_response(request)
+            return self.finish(response)
+        finally:
+            self.reset(tokens)
+
+    def start(self, request):
+        sticky = request.method not in ('GET', 'HEAD', 'OPTIONS') or STICKY_COOKIE in request.COOKIES
+        return _pinned.set(sticky), _wrote.set(False)
+
+    def reset(self, tokens):
+        pinned, wrote = tokens
+        _pinned.reset(pinned)
+        _wrote.reset(wrote)
+
+    def finish(self, response):
+        if _wrote.get():
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=getattr(settings, 'DATABASE_REPLICA_LAG', 5), httponly=True, samesite='Lax'
+            )
+        return response
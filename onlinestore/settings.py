@@ -49,8 +49,18 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'onlinestore.middleware.QueryInstrumentationMiddleware',
+    'onlinestore.routers.DatabaseStickinessMiddleware',
 ]
 
+# Инструментирование SQL по запросам: заголовки X-DB-* и JSON-лог onlinestore.sql
+SQL_INSTRUMENTATION_ENABLED = os.environ.get('SQL_INSTRUMENTATION', '') == '1'
+# Сколько повторов одной формы запроса считать вероятным N+1
+SQL_INSTRUMENTATION_N_PLUS_ONE_THRESHOLD = 5
+# Сколько самых медленных запросов включать в лог
+SQL_INSTRUMENTATION_SLOWEST = 3
+SQL_INSTRUMENTATION_HEADERS = True
+
 ROOT_URLCONF = 'onlinestore.urls'
 
 TEMPLATES = [
@@ -63,6 +73,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'shop.context_processors.cart_summary',
             ],
         },
     },
@@ -78,9 +89,90 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'TEST': {
+            # Тестовая БД в файле, а не в памяти: in-memory SQLite с общим кешем не ждёт
+            # снятия блокировки, из-за чего тесты конкурентного доступа были бы невозможны
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# Профиль SQLite для продакшена (включается DATABASE_PROFILE=production): WAL — читатели
+# не ждут писателя, транзакции сразу берут блокировку на запись (BEGIN IMMEDIATE) и ждут её
+# до timeout секунд вместо мгновенной ошибки «database is locked» при повышении блокировки,
+# соединения переиспользуются между запросами. PRAGMA применяются к каждому новому соединению
+# (shop.signals.configure_sqlite_connection); journal_mode=WAL сохраняется в файле БД
+SQLITE_PRODUCTION_PROFILE = {
+    'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'PRAGMAS': {
+        'journal_mode': 'WAL',
+        # В режиме WAL NORMAL не рискует целостностью, fsync только при checkpoint
+        'synchronous': 'NORMAL',
+        'busy_timeout': 20000,
+        'mmap_size': 256 * 1024 * 1024,
+        # Отрицательное значение — в КиБ: 64 МиБ кеша страниц на соединение
+        'cache_size': -64 * 1024,
+        'temp_store': 'MEMORY',
+    },
+}
+SQLITE_PRAGMAS = {}
+if os.environ.get('DATABASE_PROFILE') == 'production':
+    DATABASES['default'].update({
+        key: value for key, value in SQLITE_PRODUCTION_PROFILE.items() if key != 'PRAGMAS'
+    })
+    SQLITE_PRAGMAS = SQLITE_PRODUCTION_PROFILE['PRAGMAS']
+
+# Реплики для чтения (см. onlinestore.routers). Локально реплику заменяет копия файла БД:
+# DATABASE_REPLICA_PATHS=replica.sqlite3 (несколько — через запятую), копия обновляется
+# командой sync_sqlite_replicas. В тестах реплики — зеркала тестовой основной БД
+DATABASE_REPLICAS = []
+for number, replica_path in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_PATHS', '').split(',')), 1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / replica_path.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['onlinestore.routers.PrimaryReplicaRouter']
+
+# Сколько секунд после записи клиент читает из основной БД (допустимое отставание реплик)
+DATABASE_REPLICA_LAG = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Кеш каталога и сводок корзин сбрасывается сменой версий в самом кеше, поэтому все
+# процессы должны видеть один кеш. LocMemCache у каждого процесса свой — он годится
+# только для одного процесса (runserver, тесты); при нескольких воркерах задайте
+# CACHE_REDIS_URL (например, redis://127.0.0.1:6379/0, нужен пакет redis).
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', '')
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'onlinestore',
+            'OPTIONS': {
+                'MAX_ENTRIES': 10000,
+            },
+        }
+    }
+
+# Время жизни закешированных страниц каталога, секунд
+SHOP_CATALOG_CACHE_TIMEOUT = 60 * 15
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -127,8 +219,39 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Уменьшенные копии изображений товаров: имя варианта -> (ширина, высота)
+SHOP_IMAGE_VARIANTS = {
+    'thumb': (200, 200),
+    'medium': (600, 600),
+}
+# Строить варианты сразу при сохранении товара; False — только командой build_image_variants
+SHOP_IMAGE_VARIANTS_ON_SAVE = True
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Кому отправлять уведомления о сообщениях с формы обратной связи; None — адресам из ADMINS
+CONTACT_NOTIFICATION_EMAILS = None
+
+# Хранение корзин анонимных посетителей: 'db' — строки Cart/CartItem по ключу сессии,
+# 'session' — только в сессии (в связке с SESSION_ENGINE на signed_cookies — в подписанной cookie);
+# строки в БД создаются при входе пользователя
+SHOP_CART_BACKEND = 'db'
+
+# С общим кешем (CACHE_REDIS_URL) сессии читаются из кеша и пишутся в БД: тёплый запрос
+# (вместе со сводкой корзины для бейджа в шапке, см. shop.cart_summary) не обращается к БД
+# за сессией. С LocMemCache у каждого воркера была бы своя копия сессии, и после входа,
+# выхода или смены корзины в другом воркере он читал бы устаревшую — поэтому сессии в БД
+if CACHE_REDIS_URL:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
+# Сколько секунд держится резерв товара в корзине после её последнего изменения
+SHOP_RESERVATION_TTL = 15 * 60
+
+# Бэкенд поиска товаров (путь к классу). None — автоматически: FTS5 на SQLite, icontains на остальных СУБД
+SHOP_SEARCH_BACKEND = None
+
 LOGIN_URL = 'login/'
 
 LOGIN_REDIRECT_URL = '/home'
\ No newline at end of file
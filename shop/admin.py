@@ -1,37 +1,147 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.html import format_html
 
-from shop.models import Category, Product, OrderItem, Order, Review, CartItem, Cart
+from shop import cart_summary, rollups
+from shop.exports import stream_order_csv
+from shop.models import (
+    Category, Product, OrderItem, Order, Review, CartItem, Cart, DailyCategorySales, DailyProductSales,
+    StockReservation,
+)
+from shop.search import get_search_backend
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор для больших таблиц.
+
+    Для нефильтрованного списка берёт оценку количества строк из статистики
+    планировщика вместо COUNT(*) по всей таблице: pg_class.reltuples на PostgreSQL,
+    sqlite_stat1 на SQLite (заполняется ANALYZE или PRAGMA optimize).
+    Для отфильтрованных списков, остальных СУБД и таблиц без статистики считает точно.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = self.estimate_count(connections[queryset.db], queryset.model._meta.db_table)
+            if estimate:
+                return estimate
+        return super().count
+
+    @staticmethod
+    def estimate_count(connection, table):
+        """Оценка количества строк таблицы по статистике СУБД; None — статистики нет."""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [table])
+            elif connection.vendor == 'sqlite':
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+                if cursor.fetchone() is None:
+                    return None
+                # Первое число в stat — количество строк таблицы (для строки индекса — строк в индексе)
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+            else:
+                return None
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        estimate = int(float(str(row[0]).split()[0]))
+        return estimate if estimate > 0 else None
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Базовый класс админки для таблиц, растущих вместе с оборотом магазина:
+    оценочный подсчёт строк и без второго COUNT(*) по всей таблице при фильтрации.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('name', 'parent')
-    list_filter = ('name', 'parent',)
-    search_fields = ('name', 'parent',)
+    list_display = ('name', 'parent', 'depth')
+    list_filter = ('depth',)
+    list_select_related = ('parent',)
+    search_fields = ('name', 'parent__name',)
+    raw_id_fields = ('parent',)
+    # Сортировка по материализованному пути выводит дерево в порядке обхода
+    ordering = ('path',)
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'price', 'stock', 'category', 'created_at')
+class ProductAdmin(LargeTableAdmin):
+    list_display = ('name', 'price', 'stock', 'category', 'rating_avg', 'rating_count', 'created_at')
     list_filter = ('category',)
+    list_select_related = ('category',)
     search_fields = ('name', 'description')
+    raw_id_fields = ('category',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по полнотекстовому индексу вместо icontains по всей таблице
+        if not search_term:
+            return queryset, False
+        return get_search_backend().filter_queryset(queryset, search_term), False
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 1
+    fields = ('product', 'quantity', 'unit_price', 'line_total')
+    readonly_fields = ('unit_price', 'line_total')
+    raw_id_fields = ('product',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeTableAdmin):
     list_display = ('id', 'user', 'created_at', 'status', 'total_price')
     list_filter = ('status', 'created_at')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
     inlines = [OrderItemInline]
+    actions = ['export_csv']
+
+    def export_csv(self, request, queryset):
+        # Строки отдаются по мере чтения из БД, выгрузка целиком в памяти не собирается
+        response = StreamingHttpResponse(stream_order_csv(queryset), content_type='text/csv; charset=utf-8')
+        filename = f'orders-{timezone.localdate():%Y%m%d}.csv'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    export_csv.short_description = "Выгрузить выбранные заказы в CSV"
+
+    def save_related(self, request, form, formsets, change):
+        # Позиции сохраняются после заказа, поэтому сводки продаж по ним обновляются здесь, а не в сигнале заказа.
+        # Отмену и снятие отмены учитывает сигнал: он вычитает позиции на момент отмены и прибавляет
+        # позиции на момент фиксации. Здесь учитывается только изменение позиций заказа, который
+        # входит в сводки и до, и после сохранения, — в том числе при смене статуса в том же сохранении
+        order = form.instance
+        items_changed = change and any(f.has_changed() for f in formsets)
+        was_counted = change and form.initial.get('status') != Order.STATUS_CANCELLED
+        items_delta = items_changed and was_counted and not order.is_cancelled
+        if items_delta:
+            rollups.forget_order(order)
+        super().save_related(request, form, formsets, change)
+        if (not change or items_delta) and not order.is_cancelled:
+            rollups.record_order(order)
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(LargeTableAdmin):
     list_display = ('product', 'user', 'rating', 'created_at')
     list_filter = ('rating', 'created_at')
+    list_select_related = ('product', 'user')
     search_fields = ('product__name', 'user__username', 'comment')
+    raw_id_fields = ('product', 'user')
 
 class CartItemInline(admin.TabularInline):
     model = CartItem
@@ -39,26 +149,111 @@ class CartItemInline(admin.TabularInline):
     readonly_fields = ('product', 'quantity')
     can_delete = False
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
 
 @admin.register(Cart)
-class CartAdmin(admin.ModelAdmin):
-    list_display = ('user', 'created_at')
+class CartAdmin(LargeTableAdmin):
+    list_display = ('__str__', 'user', 'created_at', 'updated_at', 'items_count', 'total_price')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
     inlines = [CartItemInline]
+    actions = ['clear_cart']
 
-    def total_price(self, obj):
-        total = sum(item.get_total_price() for item in obj.items.all())
-        return format_html('<b>{:.2f} ₽</b>', total)
+    def get_queryset(self, request):
+        # Количество и сумма считаются одним GROUP BY в запросе списка, а не по корзинам в цикле
+        return super().get_queryset(request).annotate(
+            items_total=Sum('items__quantity'),
+            price_total=Sum(
+                F('items__quantity') * F('items__product__price'),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
 
-    total_price.short_description = 'Сумма корзины'
+    @admin.display(description='Товаров', ordering='items_total')
+    def items_count(self, obj):
+        return obj.items_total or 0
+
+    @admin.display(description='Сумма корзины', ordering='price_total')
+    def total_price(self, obj):
+        return format_html('<b>{} ₽</b>', f'{obj.price_total or 0:.2f}')
 
     def clear_cart(self, request, queryset):
-        for cart in queryset:
-            cart.items.all().delete()
+        CartItem.objects.filter(cart__in=queryset.values('pk')).delete()
+        StockReservation.objects.filter(cart__in=queryset.values('pk')).delete()
+        cart_summary.invalidate(*queryset.values_list('pk', flat=True))
         self.message_user(request, "Выбранные корзины очищены.")
 
     clear_cart.short_description = "Очистить выбранные корзины"
 
 
 @admin.register(CartItem)
-class CartItemAdmin(admin.ModelAdmin):
-    list_display = ('cart', 'product', 'quantity')
\ No newline at end of file
+class CartItemAdmin(LargeTableAdmin):
+    list_display = ('cart', 'product', 'quantity')
+    list_select_related = ('cart__user', 'product')
+    raw_id_fields = ('cart', 'product')
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        cart_summary.invalidate(obj.cart_id)
+
+    def delete_queryset(self, request, queryset):
+        cart_ids = set(queryset.values_list('cart_id', flat=True))
+        super().delete_queryset(request, queryset)
+        cart_summary.invalidate(*cart_ids)
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(LargeTableAdmin):
+    list_display = ('product', 'cart', 'quantity', 'expires_at')
+    list_select_related = ('cart__user', 'product')
+    raw_id_fields = ('cart', 'product')
+    ordering = ('expires_at',)
+
+
+class SalesReportAdmin(admin.ModelAdmin):
+    """
+    Отчёт о продажах по дневным сводкам: только чтение, с итогами по отфильтрованным строкам.
+
+    Читает только таблицы сводок и не обращается к заказам и их позициям.
+    """
+
+    change_list_template = 'admin/shop/sales_report_change_list.html'
+    date_hierarchy = 'day'
+    list_filter = ('day',)
+    ordering = ('-day', '-revenue')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        changelist = getattr(response, 'context_data', {}).get('cl')
+        if changelist is not None:
+            response.context_data['totals'] = changelist.queryset.aggregate(
+                units=Coalesce(Sum('units'), 0),
+                revenue=Coalesce(Sum('revenue'), 0, output_field=DecimalField(max_digits=14, decimal_places=2)),
+                orders=Coalesce(Sum('orders'), 0),
+            )
+        return response
+
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(SalesReportAdmin):
+    list_display = ('day', 'product', 'units', 'revenue', 'orders')
+    list_select_related = ('product',)
+    search_fields = ('product__name',)
+
+
+@admin.register(DailyCategorySales)
+class DailyCategorySalesAdmin(SalesReportAdmin):
+    list_display = ('day', 'category', 'units', 'revenue', 'orders')
+    list_select_related = ('category',)
+    search_fields = ('category__name',)
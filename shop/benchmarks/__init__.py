@@ -0,0 +1,172 @@
+import time
+from contextlib import contextmanager
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from shop import cart_summary
+from shop.models import Cart, CartItem, Order, OrderItem, Product
+from shop.utils import get_or_create_cart
+
+"""
+Сценарии бенчмарка горячих путей магазина.
+
+Каждый сценарий состоит из подготовки (не измеряется) и измеряемого вызова.
+Для каждого размера данных база заполняется командой generate_data с фиксированным
+зерном, поэтому количество запросов детерминировано и сравнивается с эталоном
+точно, а время — с допуском.
+"""
+
+DATA_SIZES = {
+    'small': {
+        'data': {'categories': 50, 'products': 500, 'users': 100, 'orders': 300, 'reviews': 500, 'carts': 100},
+        'lines': 10,
+    },
+    'large': {
+        'data': {'categories': 500, 'products': 5000, 'users': 1000, 'orders': 3000, 'reviews': 5000, 'carts': 1000},
+        'lines': 100,
+    },
+}
+
+BENCH_PASSWORD = 'bench-Passw0rd'
+
+
+@contextmanager
+def measure():
+    result = {}
+    with CaptureQueriesContext(connection) as ctx:
+        started = time.perf_counter()
+        yield result
+        result['seconds'] = time.perf_counter() - started
+    result['queries'] = len(ctx.captured_queries)
+
+
+class Scenarios:
+    """
+    Набор сценариев для одного размера данных. Методы с префиксом bench_
+    возвращают пару (setup, run): setup готовит состояние, run измеряется.
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.factory = RequestFactory()
+        User = get_user_model()
+        self.user = User.objects.create_user(
+            email='bench@example.com', username='bench', password=BENCH_PASSWORD, is_active=True
+        )
+        self.admin = User.objects.create_superuser(email='admin@example.com', username='admin', password=BENCH_PASSWORD)
+        self.admin.is_active = True
+        self.admin.save()
+        self.admin_client = Client()
+        self.admin_client.force_login(self.admin)
+        self.product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True)[:lines])
+        self.counter = 0
+
+    def names(self):
+        return sorted(name[len('bench_'):] for name in dir(self) if name.startswith('bench_'))
+
+    def run(self, name, repeat):
+        setup, run = getattr(self, f'bench_{name}')()
+        setup()
+        run()  # прогрев
+        best = None
+        for _ in range(repeat):
+            setup()
+            with measure() as result:
+                run()
+            if best is None or result['seconds'] < best['seconds']:
+                best = result
+        return best
+
+    def bench_cart_merge(self):
+        state = {}
+
+        def setup():
+            session = SessionStore()
+            session.create()
+            cart = Cart.objects.create(session_key=session.session_key)
+            CartItem.objects.bulk_create([CartItem(cart=cart, product_id=pk, quantity=1) for pk in self.product_ids])
+            # Как после get_or_create_cart для анонимного посетителя: id корзины лежит в сессии
+            cart_summary.remember_cart(session, cart)
+            request = self.factory.get('/')
+            request.session = session
+            request.user = self.user
+            state['request'] = request
+
+        return setup, lambda: get_or_create_cart(state['request'])
+
+    def bench_anonymous_cart(self):
+        state = {}
+
+        def setup():
+            request = self.factory.get('/')
+            request.session = SessionStore()
+            request.user = AnonymousUser()
+            state['request'] = request
+
+        return setup, lambda: get_or_create_cart(state['request'])
+
+    def bench_order_update_total_price(self):
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=pk, quantity=2, unit_price=10, line_total=20) for pk in self.product_ids
+        ])
+        return (lambda: None), order.update_total_price
+
+    def _admin_changelist(self, model_name):
+        url = reverse(f'admin:shop_{model_name}_changelist')
+        return (lambda: None), lambda: self.admin_client.get(url)
+
+    def bench_admin_orders(self):
+        return self._admin_changelist('order')
+
+    def bench_admin_carts(self):
+        return self._admin_changelist('cart')
+
+    def bench_admin_reviews(self):
+        return self._admin_changelist('review')
+
+    def bench_admin_products(self):
+        return self._admin_changelist('product')
+
+    def bench_catalog_cold(self):
+        url = reverse('shop:product_list')
+        return cache.clear, lambda: Client().get(url)
+
+    def bench_catalog_warm(self):
+        url = reverse('shop:product_list')
+        return (lambda: None), lambda: Client().get(url)
+
+    def bench_login_view(self):
+        url = reverse('users:login')
+        data = {'username': self.user.email, 'password': BENCH_PASSWORD}
+        return (lambda: None), lambda: Client().post(url, data)
+
+    def bench_register(self):
+        url = reverse('users:register')
+        state = {}
+
+        def setup():
+            self.counter += 1
+            state['data'] = {
+                'username': f'newbie{self.counter}',
+                'email': f'newbie{self.counter}@example.com',
+                'password1': BENCH_PASSWORD,
+                'password2': BENCH_PASSWORD,
+            }
+
+        return setup, lambda: Client().post(url, state['data'])
+
+
+def populate(size):
+    call_command('flush', interactive=False, verbosity=0)
+    cache.clear()
+    call_command('generate_data', seed=1, stdout=StringIO(), **DATA_SIZES[size]['data'])
@@ -0,0 +1,137 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from shop.models import Category
+
+"""
+Кеш каталога на версионированных ключах.
+
+Каждая закешированная страница включает в ключ версии тех областей, от которых
+она зависит: всего каталога, категории, товара. Сигналы на изменение товаров,
+категорий и отзывов меняют версии затронутых областей, после чего старые записи
+просто перестают запрашиваться и вытесняются кешем по таймауту. Версия — случайный
+токен, а не счётчик, поэтому вытеснение ключа версии не может «воскресить» старые записи.
+"""
+
+CATALOG_SCOPE = 'catalog'
+CATEGORY_SCOPE = 'category'
+PRODUCT_SCOPE = 'product'
+# Цены всех товаров: от неё зависят закешированные суммы корзин (shop.cart_summary)
+PRICES_SCOPE = 'prices'
+
+
+def get_timeout():
+    return getattr(settings, 'SHOP_CATALOG_CACHE_TIMEOUT', 60 * 15)
+
+
+def version_key(scope, pk=None):
+    return f'shop:version:{scope}:{pk}'
+
+
+def get_versions(*scopes):
+    """
+    Возвращает версии областей [(scope, pk), ...] одним обращением к кешу,
+    инициализируя отсутствующие.
+    """
+    keys = [version_key(scope, pk) for scope, pk in scopes]
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+async def aget_versions(*scopes):
+    """Асинхронный вариант get_versions."""
+    keys = [version_key(scope, pk) for scope, pk in scopes]
+    versions = await cache.aget_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        await cache.aset_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(*scopes):
+    cache.set_many({version_key(scope, pk): uuid.uuid4().hex for scope, pk in scopes}, None)
+
+
+def cached_payload(name, scopes, params, builder):
+    """
+    Возвращает данные страницы из кеша или строит их вызовом builder().
+
+    Args:
+        name: имя страницы (часть ключа)
+        scopes: области [(scope, pk), ...], при изменении которых страница устаревает
+        params: параметры запроса, влияющие на содержимое
+        builder: функция, строящая данные страницы; результат None не кешируется
+    """
+    key = page_key(name, get_versions(*scopes), params)
+    payload = cache.get(key)
+    if payload is None:
+        payload = builder()
+        if payload is not None:
+            cache.set(key, payload, get_timeout())
+    return payload
+
+
+async def acached_payload(name, scopes, params, builder):
+    """
+    Асинхронный вариант cached_payload: builder — корутинная функция.
+    """
+    key = page_key(name, await aget_versions(*scopes), params)
+    payload = await cache.aget(key)
+    if payload is None:
+        payload = await builder()
+        if payload is not None:
+            await cache.aset(key, payload, get_timeout())
+    return payload
+
+
+def page_key(name, versions, params):
+    raw = repr((versions, sorted(params.items())))
+    return f'shop:page:{name}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def category_chain_scopes(category_ids=(), paths=()):
+    """
+    Области категорий и всех их предков. Предки берутся из материализованных путей;
+    если переданы только id, пути читаются одним запросом.
+    """
+    paths = list(paths)
+    if category_ids:
+        paths += Category.objects.filter(pk__in=set(category_ids)).values_list('path', flat=True)
+    ids = {int(segment) for path in paths for segment in path.split('/') if segment}
+    return [(CATEGORY_SCOPE, pk) for pk in ids]
+
+
+def invalidate_product(product_id, category_ids):
+    """Сбрасывает страницу товара и списки всех категорий, в которых он показывается."""
+    bump_versions((CATALOG_SCOPE, None), (PRODUCT_SCOPE, product_id), *category_chain_scopes(category_ids))
+
+
+def invalidate_products(products):
+    """
+    Сбрасывает страницы товаров и списки их категорий после массового UPDATE,
+    который не вызывает сигналов. Пути категорий берутся из уже загруженных
+    товаров (product.category.path), без запросов к БД.
+    """
+    bump_versions(
+        (CATALOG_SCOPE, None),
+        *[(PRODUCT_SCOPE, product.pk) for product in products],
+        *category_chain_scopes(paths={product.category.path for product in products}),
+    )
+
+
+def invalidate_stock(products):
+    """Сбрасывает кеш товаров после изменения остатков при оформлении заказа."""
+    invalidate_products(products)
+
+
+def invalidate_category_paths(*paths):
+    """Сбрасывает списки категорий на указанных путях (категория и все её предки)."""
+    bump_versions(*category_chain_scopes(paths=[path for path in paths if path]))
@@ -0,0 +1,123 @@
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import Coalesce
+
+from shop import cache as catalog_cache
+from shop.models import Cart, CartItem, Product
+
+"""
+Краткая сводка корзины (количество товаров и сумма) для бейджа в шапке страниц.
+
+Сводка корзины в БД лежит в кеше под ключом корзины и удаляется после фиксации
+любого изменения её позиций: сигналом post_save CartItem и явными вызовами
+invalidate из массовых операций (Cart.apply, слияние корзин, оформление заказа),
+которые сигналов не вызывают. Сумма зависит от цен товаров, поэтому сводка
+хранит версию цен (PRICES_SCOPE) и пересчитывается после её смены.
+
+Id корзины хранится в сессии, так что тёплый запрос берёт сводку из кеша одним
+обращением, не обращаясь к БД. Сводка корзины, хранящейся только в сессии
+(SessionCart), лежит в самой сессии.
+"""
+
+CENT = Decimal('0.01')
+
+# Ключ сессии с id корзины посетителя в БД; 0 — корзины в БД нет
+CART_ID_SESSION_KEY = 'cart_id'
+# Ключ сессии со сводкой корзины, хранящейся только в сессии
+SESSION_SUMMARY_KEY = 'cart_summary'
+
+EMPTY_SUMMARY = {'count': 0, 'subtotal': Decimal('0.00')}
+
+
+def summary_key(cart_id):
+    return f'shop:cart:{cart_id}:summary'
+
+
+def invalidate(*cart_ids):
+    """Удаляет закешированные сводки корзин после фиксации текущей транзакции."""
+    keys = [summary_key(cart_id) for cart_id in cart_ids if cart_id]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def remember_cart(session, cart):
+    """Запоминает в сессии id корзины посетителя в БД."""
+    if session.get(CART_ID_SESSION_KEY) != cart.pk:
+        session[CART_ID_SESSION_KEY] = cart.pk
+
+
+def get_summary(session):
+    """
+    Сводка корзины посетителя {'count': ..., 'subtotal': ...}.
+
+    Тёплый запрос — одно обращение к кешу (сводка и версия цен вместе). Если id
+    корзины ещё не в сессии, корзина ищется одним запросом и запоминается.
+    """
+    cart_id = session.get(CART_ID_SESSION_KEY)
+    if cart_id is None:
+        cart_id = find_cart_id(session)
+        # Сессию ради бейджа не создаём: у посетителя без сессии нет и корзины
+        if session.session_key:
+            session[CART_ID_SESSION_KEY] = cart_id
+    if not cart_id:
+        return session_summary(session)
+
+    key = summary_key(cart_id)
+    prices_key = catalog_cache.version_key(catalog_cache.PRICES_SCOPE)
+    cached = cache.get_many([key, prices_key])
+    version = cached.get(prices_key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(prices_key, version, None)
+    summary = cached.get(key)
+    if summary is None or summary['version'] != version:
+        totals = CartItem.objects.filter(cart_id=cart_id).aggregate(
+            count=Coalesce(Sum('quantity'), 0),
+            subtotal=Coalesce(
+                Sum(F('quantity') * F('product__price')), 0,
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+        summary = {'version': version, 'count': totals['count'], 'subtotal': Decimal(totals['subtotal']).quantize(CENT)}
+        cache.set(key, summary, catalog_cache.get_timeout())
+    return {'count': summary['count'], 'subtotal': summary['subtotal']}
+
+
+def find_cart_id(session):
+    """Id корзины посетителя в БД по пользователю или ключу сессии; 0 — корзины нет."""
+    from shop.utils import CART_BACKEND_SESSION, get_cart_backend
+
+    user_id = session.get(SESSION_KEY)
+    if user_id is not None:
+        carts = Cart.objects.filter(user_id=user_id)
+    elif session.session_key and get_cart_backend() != CART_BACKEND_SESSION:
+        carts = Cart.objects.filter(session_key=session.session_key, user=None)
+    else:
+        return 0
+    return carts.values_list('pk', flat=True).first() or 0
+
+
+def session_summary(session):
+    """Сводка корзины, хранящейся только в сессии (SessionCart); пересчитывается при смене цен."""
+    from shop.utils import SESSION_CART_KEY
+
+    quantities = session.get(SESSION_CART_KEY)
+    if not quantities:
+        return EMPTY_SUMMARY
+    version = catalog_cache.get_versions((catalog_cache.PRICES_SCOPE, None))[0]
+    summary = session.get(SESSION_SUMMARY_KEY)
+    if summary is None or summary['version'] != version:
+        prices = dict(Product.objects.filter(pk__in=quantities).order_by().values_list('pk', 'price'))
+        subtotal = sum((prices[int(pk)] * quantity for pk, quantity in quantities.items() if int(pk) in prices), Decimal(0))
+        summary = {
+            'version': version,
+            'count': sum(quantities.values()),
+            'subtotal': str(subtotal.quantize(CENT)),
+        }
+        session[SESSION_SUMMARY_KEY] = summary
+    return {'count': summary['count'], 'subtotal': Decimal(summary['subtotal'])}
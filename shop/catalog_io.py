@@ -0,0 +1,125 @@
+"""
+Общие части команд импорта и экспорта товаров.
+
+Категории в файлах задаются путём из названий через ' / ' (например,
+«Электроника / Смартфоны») или просто названием, если оно уникально.
+"""
+
+import csv
+import json
+
+from shop.models import CATEGORY_PATH_SEPARATOR, Category
+
+PRODUCT_FIELDS = ['name', 'category', 'price', 'stock', 'description']
+CATEGORY_NAME_SEPARATOR = ' / '
+FORMATS = ('csv', 'jsonl')
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return 'jsonl' if str(path).endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+class CategoryMap:
+    """
+    Все категории в памяти: id -> путь из названий и обратно.
+    Загружается одним запросом, дальше разрешение категорий не обращается к БД.
+    """
+
+    def __init__(self):
+        self.names = {}
+        self.paths = {}
+        self.by_path = {}
+        self.by_name = {}
+        for pk, name, path in Category.objects.values_list('pk', 'name', 'path'):
+            self.names[pk] = name
+            self.paths[pk] = path
+        for pk in self.names:
+            self._register(pk)
+
+    def _register(self, pk):
+        self.by_path[self.name_path(pk)] = pk
+        self.by_name.setdefault(self.names[pk], set()).add(pk)
+
+    def ids_on_path(self, pk):
+        return [int(segment) for segment in self.paths[pk].split(CATEGORY_PATH_SEPARATOR) if segment]
+
+    def name_path(self, pk):
+        return CATEGORY_NAME_SEPARATOR.join(self.names[ancestor] for ancestor in self.ids_on_path(pk))
+
+    def resolve(self, value, create=False):
+        """
+        Возвращает id категории по пути или уникальному названию.
+
+        Raises:
+            LookupError: категория не найдена или название неоднозначно
+        """
+        value = CATEGORY_NAME_SEPARATOR.join(part.strip() for part in value.split(CATEGORY_NAME_SEPARATOR.strip()))
+        if value in self.by_path:
+            return self.by_path[value]
+        if CATEGORY_NAME_SEPARATOR not in value:
+            candidates = self.by_name.get(value, set())
+            if len(candidates) == 1:
+                return next(iter(candidates))
+            if len(candidates) > 1:
+                raise LookupError(f'Название категории «{value}» неоднозначно, укажите путь')
+        if not create:
+            raise LookupError(f'Категория «{value}» не найдена')
+        return self._create(value.split(CATEGORY_NAME_SEPARATOR))
+
+    def _create(self, parts):
+        parent_id = None
+        for depth in range(1, len(parts) + 1):
+            path = CATEGORY_NAME_SEPARATOR.join(parts[:depth])
+            pk = self.by_path.get(path)
+            if pk is None:
+                category = Category.objects.create(name=parts[depth - 1], parent_id=parent_id)
+                pk = category.pk
+                self.names[pk] = category.name
+                self.paths[pk] = category.path
+                self._register(pk)
+            parent_id = pk
+        return parent_id
+
+
+def read_rows(stream, fmt):
+    """
+    Построчно читает товары из CSV (с заголовком) или JSONL, не загружая файл целиком.
+
+    Строки JSONL отдаются неразобранными: разбирает их parse_row, чтобы ошибка
+    в одной строке относилась к ней, а не прерывала чтение файла.
+    """
+    if fmt == 'csv':
+        for line_number, row in enumerate(csv.DictReader(stream), start=2):
+            yield line_number, row
+    else:
+        for line_number, line in enumerate(stream, start=1):
+            if line.strip():
+                yield line_number, line
+
+
+def parse_row(record):
+    """Словарь полей товара из записи read_rows; ValueError, если запись — не объект."""
+    if isinstance(record, str):
+        record = json.loads(record)
+    if not isinstance(record, dict):
+        raise ValueError('строка должна быть объектом с полями товара')
+    return record
+
+
+class RowWriter:
+    """Пишет товары в поток в формате CSV или JSONL."""
+
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        if fmt == 'csv':
+            self.writer = csv.DictWriter(stream, fieldnames=PRODUCT_FIELDS)
+            self.writer.writeheader()
+
+    def write(self, row):
+        if self.fmt == 'csv':
+            self.writer.writerow(row)
+        else:
+            self.stream.write(json.dumps(row, ensure_ascii=False) + '\n')
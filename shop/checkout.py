@@ -0,0 +1,94 @@
+from django.db import transaction
+from django.db.models import F, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from shop import cache as catalog_cache
+from shop import cart_summary, rollups
+from shop.models import Cart, Order, OrderItem, Product, StockReservation
+
+"""
+Оформление заказа: превращение корзины в заказ с резервированием товара на складе.
+"""
+
+
+class CheckoutError(Exception):
+    """Заказ не может быть оформлен."""
+
+
+class EmptyCartError(CheckoutError):
+    """Корзина пуста."""
+
+
+class OutOfStockError(CheckoutError):
+    """На складе недостаточно товара для одной из позиций корзины."""
+
+    def __init__(self, product, requested):
+        self.product = product
+        self.requested = requested
+        super().__init__(f'Недостаточно товара «{product.name}» на складе (запрошено {requested}).')
+
+
+def checkout(cart):
+    """
+    Оформляет заказ из корзины пользователя в одной транзакции.
+
+    Остатки списываются условными UPDATE ... SET stock = stock - n WHERE stock >= n + r,
+    где r — действующие резервы других корзин (shop.reservations), поэтому параллельные
+    покупатели одного товара не могут уйти в минус и забрать чужой резерв: если
+    хотя бы одна позиция не списалась, транзакция откатывается целиком
+    и выбрасывается OutOfStockError. Позиции заказа создаются одним bulk_create
+    с зафиксированными ценами, итоговая стоимость заказа записывается сразу
+    при его создании, корзина очищается, её резервы снимаются. Сводки продаж и кеш каталога
+    (в нём показываются остатки) обновляются уже после фиксации транзакции.
+
+    Returns:
+        Order: созданный заказ
+    """
+    if cart.user_id is None:
+        raise CheckoutError('Оформить заказ может только авторизованный пользователь.')
+
+    with transaction.atomic():
+        # Первая операция транзакции — запись в строку корзины: она сериализует
+        # параллельное оформление одной и той же корзины и сразу берёт блокировку
+        # на запись в SQLite, не допуская взаимоблокировки при повышении уровня блокировки
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+
+        # Списываем остатки в порядке id товаров, чтобы встречные транзакции брали
+        # блокировки строк в одном и том же порядке
+        lines = list(cart.items.select_related('product__category').order_by('product_id'))
+        if not lines:
+            raise EmptyCartError('Корзина пуста.')
+
+        now = timezone.now()
+        for line in lines:
+            reserved_by_others = Coalesce(
+                Subquery(StockReservation.objects.reserved_for(line.product_id, exclude_cart=cart, now=now)), 0
+            )
+            updated = Product.objects.filter(
+                pk=line.product_id, stock__gte=reserved_by_others + line.quantity
+            ).update(stock=F('stock') - line.quantity)
+            if not updated:
+                raise OutOfStockError(line.product, line.quantity)
+
+        items = [
+            OrderItem(
+                product=line.product,
+                quantity=line.quantity,
+                unit_price=line.product.price,
+                line_total=line.product.price * line.quantity,
+            )
+            for line in lines
+        ]
+        order = Order.objects.create(user_id=cart.user_id, total_price=sum(item.line_total for item in items))
+        for item in items:
+            item.order = order
+        OrderItem.objects.bulk_create(items)
+        cart.items.all().delete()
+        cart.reservations.all().delete()
+        cart_summary.invalidate(cart.pk)
+        rollups.record_order(order)
+        products = [line.product for line in lines]
+        transaction.on_commit(lambda: catalog_cache.invalidate_stock(products))
+
+    return order
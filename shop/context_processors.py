@@ -0,0 +1,15 @@
+from django.utils.functional import SimpleLazyObject
+
+from shop.cart_summary import EMPTY_SUMMARY, get_summary
+
+
+def cart_summary(request):
+    """
+    Сводка корзины посетителя для бейджа в шапке: {{ cart_summary.count }} и {{ cart_summary.subtotal }}.
+
+    Считается лениво — только на страницах, которые её выводят.
+    """
+    session = getattr(request, 'session', None)
+    if session is None:
+        return {'cart_summary': EMPTY_SUMMARY}
+    return {'cart_summary': SimpleLazyObject(lambda: get_summary(session))}
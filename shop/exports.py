@@ -0,0 +1,65 @@
+"""
+Потоковая выгрузка заказов в CSV.
+
+Позиции заказов читаются одним запросом с JOIN заказа, покупателя и товара
+пачками через iterator(), каждая строка сразу уходит в поток (файл или
+StreamingHttpResponse), поэтому память не зависит от количества заказов.
+Суммы берутся из зафиксированных в позиции цен, а не из текущих цен товаров.
+"""
+
+import csv
+
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+from shop.models import OrderItem
+
+ORDER_EXPORT_HEADER = [
+    'order_id', 'created_at', 'status', 'username', 'email', 'order_total',
+    'product_id', 'product_name', 'quantity', 'unit_price', 'line_total',
+]
+ORDER_EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: write() возвращает строку, а не копит её."""
+
+    def write(self, value):
+        return value
+
+
+def order_export_rows(orders, chunk_size=ORDER_EXPORT_CHUNK_SIZE):
+    """
+    Строки выгрузки для переданного набора заказов: по строке на позицию.
+
+    Args:
+        orders: QuerySet заказов (используется как подзапрос, в память не загружается)
+    """
+    items = (
+        OrderItem.objects
+        .filter(order__in=orders.order_by().values('pk'))
+        # Позиции, созданные до фиксации цен и ещё не заполненные backfill_order_item_prices
+        .annotate(
+            price=Coalesce('unit_price', 'product__price'),
+            total=Coalesce('line_total', F('product__price') * F('quantity')),
+        )
+        .order_by('order_id', 'pk')
+        .values_list(
+            'order_id', 'order__created_at', 'order__status', 'order__user__username', 'order__user__email',
+            'order__total_price', 'product_id', 'product__name', 'quantity', 'price', 'total',
+        )
+    )
+    for (order_id, created_at, status, username, email, order_total,
+         product_id, product_name, quantity, price, total) in items.iterator(chunk_size=chunk_size):
+        yield (
+            order_id, created_at.isoformat(), status, username, email, f'{order_total:.2f}',
+            product_id, product_name, quantity, f'{price:.2f}', f'{total:.2f}',
+        )
+
+
+def stream_order_csv(orders, chunk_size=ORDER_EXPORT_CHUNK_SIZE):
+    """Генератор строк CSV (с заголовком) для StreamingHttpResponse."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(ORDER_EXPORT_HEADER)
+    for row in order_export_rows(orders, chunk_size):
+        yield writer.writerow(row)
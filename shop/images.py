@@ -0,0 +1,94 @@
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+"""
+Готовые варианты изображений товаров (миниатюры фиксированных размеров).
+
+Каждый вариант сохраняется в WebP и JPEG (для клиентов без поддержки WebP).
+Имя файла строится из хеша содержимого оригинала и параметров варианта,
+поэтому файлы никогда не перезаписываются и их можно кешировать бессрочно.
+"""
+
+DEFAULT_IMAGE_VARIANTS = {
+    'thumb': (200, 200),
+    'medium': (600, 600),
+}
+
+IMAGE_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+
+def get_image_variants():
+    return getattr(settings, 'SHOP_IMAGE_VARIANTS', DEFAULT_IMAGE_VARIANTS)
+
+
+def image_variant_sizes():
+    """Размеры вариантов из настроек в том виде, в каком они хранятся в Product.image_variants."""
+    return {variant: [width, height] for variant, (width, height) in get_image_variants().items()}
+
+
+def variants_are_current(image_name, variants):
+    """
+    Построены ли варианты для этого изображения и текущих настроек SHOP_IMAGE_VARIANTS:
+    после изменения набора или размеров вариантов их нужно перестроить.
+    """
+    return (
+        bool(variants)
+        and variants.get('source') == image_name
+        and variants.get('sizes') == image_variant_sizes()
+    )
+
+
+def build_image_variants(image_name):
+    """
+    Строит все варианты для изображения из хранилища и возвращает их описание:
+    {'source': image_name, 'sizes': {'thumb': [200, 200], ...},
+    'thumb': {'webp': path, 'jpeg': path}, ...}.
+
+    Функция самодостаточна (получает и возвращает только строки), поэтому
+    её можно выполнять в пуле процессов.
+    """
+    with default_storage.open(image_name, 'rb') as source:
+        data = source.read()
+    digest = hashlib.sha256(data).hexdigest()[:20]
+
+    original = ImageOps.exif_transpose(Image.open(BytesIO(data)))
+    result = {'source': image_name, 'sizes': image_variant_sizes()}
+    for variant, (width, height) in get_image_variants().items():
+        resized = None
+        result[variant] = {}
+        for extension, options in IMAGE_FORMATS.items():
+            path = f'products/variants/{digest}-{variant}-{width}x{height}.{extension}'
+            if not default_storage.exists(path):
+                if resized is None:
+                    resized = original.copy()
+                    resized.thumbnail((width, height), Image.Resampling.LANCZOS)
+                image = resized
+                if options['format'] == 'JPEG' and image.mode != 'RGB':
+                    image = image.convert('RGB')
+                elif options['format'] == 'WEBP' and image.mode not in ('RGB', 'RGBA'):
+                    image = image.convert('RGBA')
+                buffer = BytesIO()
+                image.save(buffer, **options)
+                default_storage.save(path, ContentFile(buffer.getvalue()))
+            result[variant][extension] = path
+    return result
+
+
+def variant_url(product, variant, extension='webp'):
+    """
+    URL варианта изображения товара; если вариант ещё не построен — URL оригинала.
+    """
+    if not product.image:
+        return None
+    variants = product.image_variants or {}
+    if variants_are_current(product.image.name, variants) and variant in variants:
+        return default_storage.url(variants[variant][extension])
+    return product.image.url
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from shop.models import Order, OrderItem, Product
+
+
+class Command(BaseCommand):
+    """
+    Заполняет цену за единицу и стоимость позиции у позиций заказов, созданных
+    до появления этих полей, и пересчитывает суммы затронутых заказов.
+
+    Позиции обрабатываются диапазонами id: на каждую пачку приходится один UPDATE
+    позиций и один UPDATE заказов, каждая пачка выполняется в своей транзакции.
+    Исторические цены не сохранились, поэтому берётся текущая цена товара.
+    """
+
+    help = 'Заполняет unit_price и line_total у старых позиций заказов пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Размер диапазона id в одной пачке')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        max_id = OrderItem.objects.filter(unit_price__isnull=True).aggregate(max_id=Max('pk'))['max_id']
+        if max_id is None:
+            self.stdout.write('Все позиции заказов уже заполнены.')
+            return
+
+        price = Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('price')[:1])
+        order_total = Subquery(
+            OrderItem.objects.filter(order_id=OuterRef('pk'))
+            .order_by()
+            .values('order_id')
+            # Позиции заказа из следующих пачек ещё не заполнены — считаем их по текущей цене
+            .annotate(total=Sum(Coalesce('line_total', F('product__price') * F('quantity'))))
+            .values('total')[:1]
+        )
+        filled = 0
+        start = 0
+        while start < max_id:
+            batch = OrderItem.objects.filter(pk__gt=start, pk__lte=start + batch_size, unit_price__isnull=True)
+            with transaction.atomic():
+                order_ids = list(batch.order_by().values_list('order_id', flat=True).distinct())
+                filled += batch.update(unit_price=price, line_total=price * F('quantity'))
+                Order.objects.filter(pk__in=order_ids).update(
+                    total_price=Coalesce(order_total, 0, output_field=DecimalField(max_digits=10, decimal_places=2))
+                )
+            start += batch_size
+            self.stdout.write(f'Обработано до id {min(start, max_id)} из {max_id}, заполнено позиций: {filled}')
+
+        self.stdout.write(self.style.SUCCESS(f'Готово, заполнено позиций: {filled}.'))
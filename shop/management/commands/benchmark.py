@@ -0,0 +1,101 @@
+import contextlib
+import json
+from io import StringIO
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from shop.benchmarks import DATA_SIZES, Scenarios, populate
+
+BASELINE_PATH = Path(__file__).resolve().parents[2] / 'benchmarks' / 'baseline.json'
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк горячих путей: количество SQL-запросов и время выполнения
+    на нескольких объёмах данных.
+
+    Работает на отдельной временной SQLite-базе (как тестовый прогон), рабочая
+    база не затрагивается. Результаты сравниваются с эталоном
+    shop/benchmarks/baseline.json: рост количества запросов — ошибка всегда,
+    рост времени — если он превышает допуск. При регрессии команда завершается
+    с ненулевым кодом.
+    """
+
+    help = 'Измеряет количество запросов и время горячих путей и сравнивает с эталоном'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default=','.join(DATA_SIZES), help='Объёмы данных через запятую')
+        parser.add_argument('--repeat', type=int, default=5, help='Количество замеров (берётся лучший)')
+        parser.add_argument('--time-tolerance', type=float, default=3.0,
+                            help='Во сколько раз время может превысить эталон')
+        parser.add_argument('--time-slack', type=float, default=0.005,
+                            help='Абсолютный допуск по времени, секунд (шум на быстрых путях)')
+        parser.add_argument('--update-baseline', action='store_true', help='Записать результаты как новый эталон')
+
+    def handle(self, *args, **options):
+        sizes = [size for size in options['sizes'].split(',') if size]
+        unknown = set(sizes) - set(DATA_SIZES)
+        if unknown:
+            raise CommandError(f'Неизвестные объёмы данных: {", ".join(sorted(unknown))}')
+
+        results = self.run(sizes, options['repeat'])
+
+        if options['update_baseline']:
+            baseline = self.load_baseline()
+            baseline.update(results)
+            BASELINE_PATH.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Эталон записан в {BASELINE_PATH}'))
+            return
+
+        failures = self.compare(results, self.load_baseline(), options['time_tolerance'], options['time_slack'])
+        if failures:
+            raise CommandError('Регрессия производительности:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Регрессий не обнаружено.'))
+
+    def run(self, sizes, repeat):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        results = {}
+        try:
+            # Быстрый хешер паролей: иначе время входа и регистрации определяет PBKDF2, а не код магазина
+            with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+                for size in sizes:
+                    populate(size)
+                    scenarios = Scenarios(DATA_SIZES[size]['lines'])
+                    results[size] = {}
+                    for name in scenarios.names():
+                        # Представления пишут отладочный вывод через print — в отчёт бенчмарка он не нужен
+                        with contextlib.redirect_stdout(StringIO()):
+                            result = scenarios.run(name, repeat)
+                        results[size][name] = {'queries': result['queries'], 'seconds': round(result['seconds'], 5)}
+                        self.stdout.write(
+                            f"{size:>6} {name:<28} {result['queries']:>4} запросов {result['seconds'] * 1000:>9.2f} мс"
+                        )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        return results
+
+    def load_baseline(self):
+        if not BASELINE_PATH.exists():
+            return {}
+        return json.loads(BASELINE_PATH.read_text())
+
+    def compare(self, results, baseline, tolerance, slack):
+        failures = []
+        for size, scenarios in results.items():
+            for name, result in scenarios.items():
+                expected = baseline.get(size, {}).get(name)
+                if expected is None:
+                    self.stdout.write(self.style.WARNING(f'{size}/{name}: нет эталона'))
+                    continue
+                if result['queries'] > expected['queries']:
+                    failures.append(f"{size}/{name}: {result['queries']} запросов, эталон {expected['queries']}")
+                if result['seconds'] > expected['seconds'] * tolerance + slack:
+                    failures.append(
+                        f"{size}/{name}: {result['seconds'] * 1000:.2f} мс, эталон {expected['seconds'] * 1000:.2f} мс"
+                    )
+        return failures
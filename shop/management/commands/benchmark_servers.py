@@ -0,0 +1,207 @@
+import asyncio
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from shop.benchmarks import DATA_SIZES, populate
+from shop.models import Category, Product
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает пропускную способность каталога под onlinestore.asgi и onlinestore.wsgi
+    при множестве одновременных медленных клиентов.
+
+    Приложения вызываются в процессе, без сетевого сервера: WSGI — пулом из
+    --workers потоков (как синхронный сервер с потоками), ASGI — в одном цикле
+    событий (как один воркер uvicorn). Медленный клиент моделируется задержкой
+    --latency на приём запроса и на каждую отправку тела ответа: под WSGI поток
+    на это время занят, под ASGI ожидание не занимает поток.
+
+    Работает на отдельной временной базе, заполненной как в команде benchmark.
+    """
+
+    help = 'Сравнивает пропускную способность каталога под ASGI и WSGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', default='small', choices=list(DATA_SIZES), help='Объём данных')
+        parser.add_argument('--requests', type=int, default=400, help='Всего запросов в каждом режиме')
+        parser.add_argument('--clients', type=int, default=100, help='Одновременных клиентов')
+        parser.add_argument('--workers', type=int, default=8, help='Потоков WSGI-сервера')
+        parser.add_argument('--latency', type=float, default=0.05,
+                            help='Задержка сети клиента на приём запроса и отправку ответа, секунд')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Запрашиваемый путь (можно несколько; по умолчанию — страницы каталога)')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['clients'] < 1 or options['workers'] < 1:
+            raise CommandError('Количество запросов, клиентов и потоков должно быть положительным')
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            populate(options['size'])
+            paths = options['paths'] or self.catalog_paths()
+            rng = random.Random(1)
+            requests = [rng.choice(paths) for _ in range(options['requests'])]
+
+            from onlinestore.asgi import application as asgi_application
+            from onlinestore.wsgi import application as wsgi_application
+
+            # Прогрев: кеш каталога и ленивые инициализации не должны попадать в замер одного из режимов
+            for path in paths:
+                run_wsgi(wsgi_application, path, 0)
+
+            results = {
+                'WSGI': self.measure_wsgi(wsgi_application, requests, options),
+                'ASGI': self.measure_asgi(asgi_application, requests, options),
+            }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(
+            f"{options['requests']} запросов, {options['clients']} клиентов, задержка клиента "
+            f"{options['latency'] * 1000:.0f} мс, потоков WSGI {options['workers']}"
+        )
+        for mode, (elapsed, latencies, errors) in results.items():
+            self.stdout.write(
+                f'{mode}: {len(latencies) / elapsed:8.1f} запр/с, '
+                f'p50 {statistics.median(latencies) * 1000:7.1f} мс, '
+                f'p95 {percentile(latencies, 0.95) * 1000:7.1f} мс, ошибок {errors}'
+            )
+        wsgi_rps = options['requests'] / results['WSGI'][0]
+        asgi_rps = options['requests'] / results['ASGI'][0]
+        self.stdout.write(self.style.SUCCESS(f'ASGI / WSGI: {asgi_rps / wsgi_rps:.2f}x'))
+
+    def catalog_paths(self):
+        category_ids = list(Category.objects.filter(depth=0).values_list('pk', flat=True)[:5])
+        product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True)[:20])
+        paths = ['/shop/products/', '/shop/products/search/?q=product']
+        paths += [f'/shop/products/?category={pk}' for pk in category_ids]
+        paths += [f'/shop/products/{pk}/' for pk in product_ids]
+        return paths
+
+    def measure_wsgi(self, application, requests, options):
+        # Клиенты сверх числа потоков сервера ждут в очереди, как в backlog сокета;
+        # время ожидания входит в задержку, которую видит клиент
+        workers = threading.Semaphore(options['workers'])
+
+        def client(path):
+            started = time.perf_counter()
+            with workers:
+                status = run_wsgi(application, path, options['latency'])
+            return time.perf_counter() - started, status
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['clients']) as pool:
+            results = list(pool.map(client, requests))
+        return summarize(time.perf_counter() - started, results)
+
+    def measure_asgi(self, application, requests, options):
+        async def main():
+            slots = asyncio.Semaphore(options['clients'])
+
+            async def client(path):
+                async with slots:
+                    started = time.perf_counter()
+                    status = await run_asgi(application, path, options['latency'])
+                    return time.perf_counter() - started, status
+
+            return await asyncio.gather(*(client(path) for path in requests))
+
+        started = time.perf_counter()
+        results = asyncio.run(main())
+        return summarize(time.perf_counter() - started, results)
+
+
+def summarize(elapsed, results):
+    latencies = [latency for latency, _ in results]
+    errors = sum(1 for _, status in results if status != 200)
+    return elapsed, latencies, errors
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_wsgi(application, path, latency):
+    url = urlsplit(path)
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'testserver',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(),
+        'wsgi.errors': BytesIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    status = []
+    time.sleep(latency)  # поток сервера занят приёмом запроса от медленного клиента
+    response = application(environ, lambda value, headers, exc_info=None: status.append(value))
+    try:
+        for _ in response:
+            time.sleep(latency)  # и отправкой ответа
+    finally:
+        response.close()
+    return int(status[0].split()[0])
+
+
+async def run_asgi(application, path, latency):
+    url = urlsplit(path)
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': url.path,
+        'raw_path': url.path.encode(),
+        'query_string': url.query.encode(),
+        'headers': [(b'host', b'testserver')],
+        'client': ('127.0.0.1', 0),
+        'server': ('testserver', 80),
+    }
+    done = asyncio.Event()
+    received = False
+    status = None
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            await asyncio.sleep(latency)
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Обработчик ждёт разрыва соединения параллельно с запросом — отдаём его после ответа
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body':
+            await asyncio.sleep(latency)
+            if not message.get('more_body'):
+                done.set()
+
+    await application(scope, receive, send)
+    done.set()
+    return status
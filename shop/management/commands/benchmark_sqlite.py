@@ -0,0 +1,138 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from shop.benchmarks import DATA_SIZES, populate
+from shop.models import Order, Product
+
+# Профиль по умолчанию — настройки Django без изменений; продакшен-профиль берётся из settings.py
+DEFAULT_PROFILE = {
+    'OPTIONS': {},
+    'CONN_MAX_AGE': 0,
+    'PRAGMAS': {'journal_mode': 'DELETE'},
+}
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочный тест SQLite: параллельные читатели (страница каталога) и писатели
+    (транзакция «прочитать остаток — списать — создать заказ») на профиле по
+    умолчанию и на продакшен-профиле (WAL, PRAGMA, BEGIN IMMEDIATE, постоянные соединения).
+
+    Для каждого профиля выводит пропускную способность, задержки и количество
+    ошибок «database is locked». Работает на отдельной временной базе.
+    """
+
+    help = 'Сравнивает профили SQLite под параллельным чтением и записью'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', default='small', choices=list(DATA_SIZES), help='Объём данных')
+        parser.add_argument('--readers', type=int, default=8, help='Потоков чтения')
+        parser.add_argument('--writers', type=int, default=8, help='Потоков записи')
+        parser.add_argument('--duration', type=float, default=5.0, help='Длительность каждого прогона, секунд')
+        parser.add_argument('--profile', action='append', choices=['default', 'production'], dest='profiles',
+                            help='Профиль (можно несколько; по умолчанию — все)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Бенчмарк предназначен для SQLite')
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            populate(options['size'])
+            self.product_ids = list(Product.objects.values_list('pk', flat=True))
+            self.user_ids = list(Order.objects.values_list('user_id', flat=True).distinct()[:100])
+            connection.close()
+            profiles = {'default': DEFAULT_PROFILE, 'production': settings.SQLITE_PRODUCTION_PROFILE}
+            for name in options['profiles'] or profiles:
+                self.report(name, self.run_profile(profiles[name], options))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def run_profile(self, profile, options):
+        settings_dict = connections.settings['default']
+        saved = {key: settings_dict.get(key) for key in ('OPTIONS', 'CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')}
+        settings_dict.update({key: value for key, value in profile.items() if key != 'PRAGMAS'})
+        try:
+            with override_settings(SQLITE_PRAGMAS=profile['PRAGMAS']):
+                stats = {'read': [], 'write': [], 'locked': 0}
+                lock = threading.Lock()
+                deadline = time.monotonic() + options['duration']
+                threads = [
+                    threading.Thread(target=self.worker, args=(self.read, 'read', deadline, stats, lock, profile))
+                    for _ in range(options['readers'])
+                ] + [
+                    threading.Thread(target=self.worker, args=(self.write, 'write', deadline, stats, lock, profile))
+                    for _ in range(options['writers'])
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            settings_dict.update(saved)
+        stats['duration'] = options['duration']
+        return stats
+
+    def worker(self, operation, kind, deadline, stats, lock, profile):
+        rng = random.Random(threading.get_ident())
+        latencies = []
+        locked = 0
+        try:
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    operation(rng)
+                except OperationalError as exc:
+                    if 'locked' not in str(exc):
+                        raise
+                    locked += 1
+                    continue
+                finally:
+                    # Профиль по умолчанию открывает соединение на каждый запрос
+                    if not profile['CONN_MAX_AGE']:
+                        connection.close()
+                latencies.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+        with lock:
+            stats[kind].extend(latencies)
+            stats['locked'] += locked
+
+    def read(self, rng):
+        list(Product.objects.order_by('-created_at', '-pk')[:20])
+        Product.objects.filter(pk=rng.choice(self.product_ids)).first()
+
+    def write(self, rng):
+        product_id = rng.choice(self.product_ids)
+        with transaction.atomic():
+            # Чтение перед записью: в режиме DEFERRED повышение блокировки до записи
+            # при конкурирующем писателе сразу завершается ошибкой «database is locked»
+            stock = Product.objects.filter(pk=product_id).values_list('stock', flat=True).first()
+            Product.objects.filter(pk=product_id).update(stock=F('stock') + (1 if stock == 0 else 0))
+            Order.objects.create(user_id=rng.choice(self.user_ids))
+
+    def report(self, name, stats):
+        reads, writes = stats['read'], stats['write']
+        self.stdout.write(
+            f"{name:>10}: чтений {len(reads) / stats['duration']:8.1f}/с "
+            f"(p95 {percentile(reads) * 1000:6.1f} мс), "
+            f"записей {len(writes) / stats['duration']:7.1f}/с "
+            f"(p95 {percentile(writes) * 1000:6.1f} мс), "
+            f"ошибок «database is locked»: {stats['locked']}"
+        )
+
+
+def percentile(values, fraction=0.95):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
@@ -0,0 +1,68 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from shop import cache as catalog_cache
+from shop.images import build_image_variants, variants_are_current
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    """
+    Строит уменьшенные копии изображений для всех товаров, у которых они
+    отсутствуют или устарели.
+
+    Товары читаются пачками по id, изображения обрабатываются в пуле процессов
+    (рабочие процессы не обращаются к БД, только к хранилищу файлов),
+    результаты каждой пачки записываются одним bulk_update, после чего
+    сбрасывается кеш каталога для этих товаров.
+    """
+
+    help = 'Строит варианты изображений товаров в пуле процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Количество процессов (по умолчанию — по числу CPU)')
+        parser.add_argument('--batch-size', type=int, default=200, help='Количество товаров в одной пачке')
+        parser.add_argument('--force', action='store_true', help='Перестроить варианты для всех товаров')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        built = failed = 0
+        last_id = 0
+
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                batch = list(
+                    Product.objects.filter(pk__gt=last_id).exclude(image='').exclude(image=None)
+                    .select_related('category').only('pk', 'image', 'image_variants', 'category__path')
+                    .order_by('pk')[:options['batch_size']]
+                )
+                if not batch:
+                    break
+                last_id = batch[-1].pk
+
+                pending = [
+                    product for product in batch
+                    if options['force'] or not variants_are_current(product.image.name, product.image_variants)
+                ]
+                futures = {pool.submit(build_image_variants, product.image.name): product for product in pending}
+                updated = []
+                for future in as_completed(futures):
+                    product = futures[future]
+                    try:
+                        product.image_variants = future.result()
+                    except Exception as exc:
+                        failed += 1
+                        self.stderr.write(f'Товар #{product.pk} ({product.image.name}): {exc}')
+                    else:
+                        updated.append(product)
+                if updated:
+                    Product.objects.bulk_update(updated, ['image_variants'])
+                    # bulk_update не вызывает сигналов: кешированный каталог отдавал бы прежние URL
+                    catalog_cache.invalidate_products(updated)
+                built += len(updated)
+                self.stdout.write(f'Обработано до id {last_id}, построено: {built}, ошибок: {failed}')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Готово за {elapsed:.1f} с: построено {built}, ошибок {failed}.'))
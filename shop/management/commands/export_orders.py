@@ -0,0 +1,61 @@
+import sys
+import time
+from datetime import datetime, time as day_time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from shop.exports import ORDER_EXPORT_CHUNK_SIZE, stream_order_csv
+from shop.models import Order
+
+
+class Command(BaseCommand):
+    """
+    Потоковая выгрузка заказов и их позиций в CSV.
+
+    Строки пишутся в файл по мере чтения из БД (см. shop.exports), поэтому
+    выгрузка за несколько месяцев не требует памяти больше одной пачки.
+    """
+
+    help = 'Выгружает заказы и их позиции в CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', help='Путь к файлу (по умолчанию — stdout)')
+        parser.add_argument('--since', help='Начальная дата заказов включительно, ГГГГ-ММ-ДД')
+        parser.add_argument('--until', help='Конечная дата заказов включительно, ГГГГ-ММ-ДД')
+        parser.add_argument('--status', choices=[value for value, _ in Order.STATUS_CHOICES], help='Статус заказов')
+        parser.add_argument('--chunk-size', type=int, default=ORDER_EXPORT_CHUNK_SIZE, help='Размер пачки чтения из БД')
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if options['since']:
+            orders = orders.filter(created_at__gte=self.day_start(options['since']))
+        if options['until']:
+            orders = orders.filter(created_at__lt=self.day_start(options['until'], next_day=True))
+        if options['status']:
+            orders = orders.filter(status=options['status'])
+
+        started = time.monotonic()
+        stream = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        lines = 0
+        try:
+            for line in stream_order_csv(orders, options['chunk_size']):
+                stream.write(line)
+                lines += 1
+        finally:
+            if options['output']:
+                stream.close()
+
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Выгружено позиций: {max(lines - 1, 0)} за {time.monotonic() - started:.1f} с.'
+            ))
+
+    def day_start(self, value, next_day=False):
+        try:
+            day = datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Неверная дата «{value}», ожидается ГГГГ-ММ-ДД')
+        if next_day:
+            day += timedelta(days=1)
+        return timezone.make_aware(datetime.combine(day, day_time.min))
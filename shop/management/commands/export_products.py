@@ -0,0 +1,53 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.catalog_io import FORMATS, CategoryMap, RowWriter, detect_format
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    """
+    Потоковый экспорт товаров в CSV или JSONL.
+
+    Товары читаются курсором пачками (iterator), категории подставляются из карты
+    в памяти, поэтому память не зависит от количества товаров. Файл экспорта
+    пригоден для обратного импорта командой import_products.
+    """
+
+    help = 'Экспортирует товары в CSV или JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', help='Путь к файлу (по умолчанию — stdout)')
+        parser.add_argument('--format', choices=FORMATS, help='Формат файла (по умолчанию — по расширению)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Размер пачки чтения из БД')
+
+    def handle(self, *args, **options):
+        fmt = detect_format(options['output'] or '', options['format'])
+        categories = CategoryMap()
+        started = time.monotonic()
+        rows = Product.objects.order_by('pk').values_list('name', 'category_id', 'price', 'stock', 'description')
+
+        stream = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        exported = 0
+        try:
+            writer = RowWriter(stream, fmt)
+            for name, category_id, price, stock, description in rows.iterator(chunk_size=options['batch_size']):
+                writer.write({
+                    'name': name,
+                    'category': categories.name_path(category_id),
+                    'price': str(price),
+                    'stock': stock,
+                    'description': description or '',
+                })
+                exported += 1
+        finally:
+            if options['output']:
+                stream.close()
+
+        if options['output']:
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(
+                f'Экспортировано {exported} товаров за {elapsed:.1f} с ({exported / elapsed if elapsed else 0:.0f} строк/с).'
+            ))
@@ -0,0 +1,233 @@
+import itertools
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from shop.models import RATING_VALUES, Cart, CartItem, Category, Order, OrderItem, Product, Review
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    """
+    Генерирует синтетический набор данных для нагрузочного тестирования.
+
+    Все строки создаются через bulk_create пачками, сигналы моделей не вызываются,
+    поэтому по окончании пересчитываются материализованные пути категорий,
+    рейтинги товаров, сводки продаж и поисковый индекс. При одинаковом --seed
+    и параметрах получается один и тот же набор данных (даты — относительно момента запуска).
+    Повторный запуск с тем же --seed добавляет категории, товары, заказы и отзывы,
+    а пользователей и анонимные корзины прошлого запуска переиспользует.
+
+    Распределения:
+        - дерево категорий случайной формы глубиной до --max-depth;
+        - товары распределены по категориям по закону Ципфа (--category-skew):
+          немного крупных категорий и длинный хвост мелких;
+        - доля --hot-share всех позиций заказов, корзин и отзывов приходится
+          на --hot-skus самых популярных товаров, остальное — равномерно;
+        - даты заказов и корзин равномерно распределены по последним --days дням,
+          корзина изменялась в случайный момент после создания.
+    """
+
+    help = 'Генерирует синтетические категории, товары, пользователей, заказы, отзывы и корзины'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42, help='Зерно генератора случайных чисел')
+        parser.add_argument('--categories', type=int, default=200)
+        parser.add_argument('--max-depth', type=int, default=5, help='Максимальная глубина дерева категорий')
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--max-order-items', type=int, default=5, help='Максимум позиций в заказе')
+        parser.add_argument('--reviews', type=int, default=10000)
+        parser.add_argument('--carts', type=int, default=2000, help='Количество анонимных корзин')
+        parser.add_argument('--hot-skus', type=int, default=20, help='Количество «горячих» товаров')
+        parser.add_argument('--hot-share', type=float, default=0.3, help='Доля спроса на «горячие» товары')
+        parser.add_argument('--category-skew', type=float, default=1.1, help='Показатель распределения Ципфа')
+        parser.add_argument('--days', type=int, default=365, help='За сколько последних дней распределить даты')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.tag = f"s{options['seed']}"
+        self.now = timezone.now()
+
+        self.stage('Категории', self.create_categories)
+        self.stage('Товары', self.create_products)
+        self.stage('Пользователи', self.create_users)
+        self.stage('Заказы', self.create_orders)
+        self.stage('Отзывы', self.create_reviews)
+        self.stage('Корзины', self.create_carts)
+        self.stage('Рейтинги', lambda: call_command('rebuild_product_ratings', stdout=self.stdout))
+        self.stage('Сводки продаж', lambda: call_command('rebuild_sales_rollups', stdout=self.stdout))
+        self.stage('Поисковый индекс', lambda: call_command('rebuild_search_index', stdout=self.stdout))
+
+    def stage(self, title, func):
+        started = time.monotonic()
+        count = func()
+        elapsed = time.monotonic() - started
+        suffix = f': {count} строк' if count is not None else ''
+        self.stdout.write(f'{title}{suffix} за {elapsed:.1f} с')
+
+    def bulk_create(self, model, objects):
+        created = []
+        for batch in batched(objects, self.options['batch_size']):
+            with transaction.atomic():
+                created.extend(obj.pk for obj in model.objects.bulk_create(batch))
+        return created
+
+    def random_moment(self, since=None):
+        """Случайный момент между since (по умолчанию — --days дней назад) и моментом запуска."""
+        since = since or self.now - timedelta(days=self.options['days'])
+        return since + (self.now - since) * self.rng.random()
+
+    def pick_product(self):
+        if self.hot_ids and self.rng.random() < self.options['hot_share']:
+            return self.rng.choice(self.hot_ids)
+        return self.rng.choice(self.product_ids)
+
+    def create_categories(self):
+        # Дерево строится по уровням: у каждой новой категории родитель — случайная категория предыдущих уровней
+        total, max_depth = self.options['categories'], self.options['max_depth']
+        roots = max(1, total // 20) if max_depth > 1 else total
+        levels = [self.bulk_create(Category, (Category(name=f'Категория {self.tag}-{i}') for i in range(roots)))]
+        self.category_ids = list(levels[0])
+        remaining = total - roots
+        depth = 1
+        while remaining > 0 and depth < max_depth:
+            count = remaining if depth == max_depth - 1 else max(1, remaining // 2)
+            parents = levels[-1]
+            level = self.bulk_create(Category, (
+                Category(name=f'Категория {self.tag}-{len(self.category_ids) + i}', parent_id=self.rng.choice(parents))
+                for i in range(count)
+            ))
+            levels.append(level)
+            self.category_ids.extend(level)
+            remaining -= count
+            depth += 1
+        Category.objects.rebuild_paths()
+        return len(self.category_ids)
+
+    def create_products(self):
+        categories = list(self.category_ids)
+        self.rng.shuffle(categories)
+        weights = [1 / rank ** self.options['category_skew'] for rank in range(1, len(categories) + 1)]
+        chosen = self.rng.choices(categories, weights=weights, k=self.options['products'])
+
+        self.product_prices = {}
+        products = (
+            Product(
+                name=f'Товар {self.tag}-{i}',
+                description=f'Описание товара {i}',
+                price=Decimal(f'{self.rng.lognormvariate(7, 1):.2f}').min(Decimal('99999999.99')),
+                stock=self.rng.randint(0, 500),
+                category_id=category_id,
+            )
+            for i, category_id in enumerate(chosen)
+        )
+        for batch in batched(products, self.options['batch_size']):
+            with transaction.atomic():
+                for product in Product.objects.bulk_create(batch):
+                    self.product_prices[product.pk] = product.price
+        self.product_ids = list(self.product_prices)
+        self.hot_ids = self.rng.sample(self.product_ids, min(self.options['hot_skus'], len(self.product_ids)))
+        return len(self.product_ids)
+
+    def create_users(self):
+        # Пользователи уникальны по имени и email: при повторном запуске с тем же --seed
+        # уже созданные переиспользуются, создаются только недостающие
+        password = make_password(self.tag)
+        User = get_user_model()
+        usernames = [f'user_{self.tag}_{i}' for i in range(self.options['users'])]
+        user_ids = dict(User.objects.filter(username__startswith=f'user_{self.tag}_').values_list('username', 'pk'))
+        missing = [username for username in usernames if username not in user_ids]
+        user_ids.update(zip(missing, self.bulk_create(User, (
+            User(username=username, email=f'{username}@example.com', password=password, is_active=True)
+            for username in missing
+        ))))
+        self.user_ids = [user_ids[username] for username in usernames]
+        return len(missing)
+
+    def create_orders(self):
+        statuses = [status for status, _ in Order.STATUS_CHOICES]
+        created = 0
+        for batch in batched(range(self.options['orders']), self.options['batch_size']):
+            orders, lines = [], []
+            for _ in batch:
+                items = {}
+                for _ in range(self.rng.randint(1, self.options['max_order_items'])):
+                    product_id = self.pick_product()
+                    items[product_id] = items.get(product_id, 0) + self.rng.randint(1, 3)
+                order_lines = [
+                    OrderItem(product_id=product_id, quantity=quantity, unit_price=self.product_prices[product_id],
+                              line_total=self.product_prices[product_id] * quantity)
+                    for product_id, quantity in items.items()
+                ]
+                orders.append(Order(
+                    user_id=self.rng.choice(self.user_ids),
+                    status=self.rng.choice(statuses),
+                    total_price=sum(line.line_total for line in order_lines),
+                ))
+                lines.append(order_lines)
+            with transaction.atomic():
+                Order.objects.bulk_create(orders)
+                # auto_now_add перезаписывает дату при вставке, поэтому она выставляется отдельным UPDATE
+                for order, order_lines in zip(orders, lines):
+                    order.created_at = self.random_moment()
+                    for line in order_lines:
+                        line.order_id = order.pk
+                Order.objects.bulk_update(orders, ['created_at'])
+                OrderItem.objects.bulk_create(itertools.chain.from_iterable(lines), batch_size=self.options['batch_size'])
+            created += len(orders)
+        return created
+
+    def create_reviews(self):
+        # Оценки смещены к высоким, как в реальных магазинах
+        rating_weights = [5, 7, 15, 33, 40]
+        target = min(self.options['reviews'], len(self.product_ids) * len(self.user_ids))
+        pairs = set()
+        while len(pairs) < target:
+            pairs.add((self.pick_product(), self.rng.choice(self.user_ids)))
+        reviews = (
+            Review(product_id=product_id, user_id=user_id,
+                   rating=self.rng.choices(RATING_VALUES, weights=rating_weights)[0], comment='')
+            for product_id, user_id in sorted(pairs)
+        )
+        return len(self.bulk_create(Review, reviews))
+
+    def create_carts(self):
+        cart_ids = []
+        items = []
+        # Ключ сессии начинается с метки набора и не обрезается, поэтому ключи разных --seed
+        # не совпадают; корзины, созданные прошлым запуском с тем же --seed, пропускаются
+        prefix = f'{self.tag}-'
+        existing = set(Cart.objects.filter(session_key__startswith=prefix).values_list('session_key', flat=True))
+        session_keys = (f'{prefix}{i:x}' for i in range(self.options['carts']))
+        carts = (Cart(session_key=session_key) for session_key in session_keys if session_key not in existing)
+        for batch in batched(carts, self.options['batch_size']):
+            with transaction.atomic():
+                Cart.objects.bulk_create(batch)
+                # auto_now_add/auto_now перезаписывают даты при вставке, поэтому они выставляются отдельным UPDATE
+                for cart in batch:
+                    cart.created_at = self.random_moment()
+                    cart.updated_at = self.random_moment(since=cart.created_at)
+                Cart.objects.bulk_update(batch, ['created_at', 'updated_at'])
+            cart_ids.extend(cart.pk for cart in batch)
+        for cart_id in cart_ids:
+            for product_id in {self.pick_product() for _ in range(self.rng.randint(1, 4))}:
+                items.append(CartItem(cart_id=cart_id, product_id=product_id, quantity=self.rng.randint(1, 3)))
+        self.bulk_create(CartItem, items)
+        return len(cart_ids)
@@ -0,0 +1,116 @@
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from onlinestore.routers import use_primary
+from shop import cache as catalog_cache
+from shop.catalog_io import FORMATS, CategoryMap, detect_format, parse_row, read_rows
+from shop.models import Product
+from shop.search import get_search_backend
+
+
+class Command(BaseCommand):
+    """
+    Потоковый импорт товаров из CSV или JSONL.
+
+    Файл читается построчно, категории разрешаются по карте в памяти, товары
+    вставляются или обновляются пачками одним INSERT ... ON CONFLICT по ключу
+    (name, category). Память не зависит от размера файла. Ошибочные строки
+    пропускаются с сообщением. Кеш карточек товаров сбрасывается после каждой
+    пачки, по окончании перестраивается поисковый индекс и сбрасывается кеш
+    затронутых категорий.
+
+    Колонки: name, category, price, stock, description.
+    """
+
+    help = 'Импортирует товары из CSV или JSONL пачками (upsert по названию и категории)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу')
+        parser.add_argument('--format', choices=FORMATS, help='Формат файла (по умолчанию — по расширению)')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Количество товаров в одной пачке')
+        parser.add_argument('--create-categories', action='store_true', help='Создавать отсутствующие категории')
+        parser.add_argument('--max-errors', type=int, default=100, help='Прервать импорт после N ошибочных строк')
+
+    def handle(self, *args, **options):
+        fmt = detect_format(options['path'], options['format'])
+        # Карта категорий дополняется по ходу импорта, поэтому читается из основной БД, а не с реплики
+        with use_primary():
+            categories = CategoryMap()
+        self.started = time.monotonic()
+        self.imported = 0
+        errors = 0
+        touched_categories = set()
+        batch = {}
+
+        with open(options['path'], encoding='utf-8', newline='') as stream:
+            for line_number, record in read_rows(stream, fmt):
+                try:
+                    product = self.build_product(parse_row(record), categories, options['create_categories'])
+                except (LookupError, ValueError, TypeError) as exc:
+                    errors += 1
+                    self.stderr.write(f'Строка {line_number}: {exc}')
+                    if errors >= options['max_errors']:
+                        raise CommandError(f'Слишком много ошибок ({errors}), импорт прерван')
+                    continue
+
+                # Повтор ключа внутри пачки: побеждает последняя строка (ON CONFLICT не обновляет строку дважды)
+                batch[(product.name, product.category_id)] = product
+                touched_categories.add(product.category_id)
+                if len(batch) >= options['batch_size']:
+                    self.flush(batch)
+                    batch = {}
+        self.flush(batch)
+
+        get_search_backend().rebuild()
+        catalog_cache.bump_versions(
+            (catalog_cache.CATALOG_SCOPE, None),
+            (catalog_cache.PRICES_SCOPE, None),
+            *{(catalog_cache.CATEGORY_SCOPE, pk) for category in touched_categories
+              for pk in categories.ids_on_path(category)},
+        )
+        self.stdout.write(self.style.SUCCESS(f'Импортировано {self.imported} товаров, ошибок {errors}. {self.rate()}'))
+
+    def build_product(self, row, categories, create_categories):
+        name = str(row.get('name') or '').strip()
+        if not name:
+            raise ValueError('не указано название товара')
+        return Product(
+            name=name,
+            category_id=categories.resolve(str(row.get('category') or ''), create=create_categories),
+            price=self.clean_field('price', str(row.get('price'))),
+            stock=self.clean_field('stock', row.get('stock') or 0),
+            description=str(row.get('description') or ''),
+        )
+
+    def clean_field(self, name, value):
+        """
+        Значение поля товара, проверенное валидаторами модели: бесконечные и
+        не помещающиеся в max_digits/decimal_places цены, отрицательные и выходящие
+        за диапазон целого столбца остатки отклоняются здесь, а не срывают вставку пачки.
+        """
+        try:
+            return Product._meta.get_field(name).clean(value, None)
+        except ValidationError as exc:
+            raise ValueError(f'{name}: {" ".join(exc.messages)}') from None
+
+    def flush(self, batch):
+        if not batch:
+            return
+        with transaction.atomic():
+            products = Product.objects.bulk_create(
+                batch.values(),
+                update_conflicts=True,
+                unique_fields=['name', 'category'],
+                update_fields=['price', 'stock', 'description'],
+            )
+        # Upsert не вызывает сигналов: карточки обновлённых товаров сбрасываются здесь
+        catalog_cache.bump_versions(*[(catalog_cache.PRODUCT_SCOPE, product.pk) for product in products])
+        self.imported += len(batch)
+        self.stdout.write(f'Импортировано {self.imported}. {self.rate()}')
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return f'{elapsed:.1f} с, {self.imported / elapsed if elapsed else 0:.0f} строк/с'
@@ -0,0 +1,57 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from shop.models import Cart
+
+
+class Command(BaseCommand):
+    """
+    Удаляет брошенные корзины (по умолчанию — только анонимные) вместе с их позициями.
+
+    Корзины удаляются короткими пачками по индексу updated_at, каждая пачка —
+    в своей транзакции, поэтому таблица не блокируется надолго. Состояние между
+    запусками не хранится: удалённые строки просто исчезают из выборки, так что
+    прерванную команду можно в любой момент запустить заново.
+    """
+
+    help = 'Удаляет брошенные корзины пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Удалять корзины, не менявшиеся дольше N дней')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Количество корзин в одной пачке')
+        parser.add_argument('--sleep', type=float, default=0.05, help='Пауза между пачками, секунд')
+        parser.add_argument('--max-batches', type=int, default=None, help='Остановиться после N пачек')
+        parser.add_argument('--include-users', action='store_true', help='Удалять и корзины пользователей')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        carts = Cart.objects.filter(updated_at__lt=cutoff)
+        if not options['include_users']:
+            carts = carts.filter(user__isnull=True)
+
+        started = time.monotonic()
+        deleted_carts = deleted_items = batches = 0
+        while options['max_batches'] is None or batches < options['max_batches']:
+            ids = list(carts.order_by('updated_at').values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            with transaction.atomic():
+                # Фильтр по updated_at повторяется: корзину могли изменить после выборки id
+                _, per_model = carts.filter(pk__in=ids).delete()
+            deleted_carts += per_model.get('shop.Cart', 0)
+            deleted_items += per_model.get('shop.CartItem', 0)
+            batches += 1
+
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'Пачка {batches}: удалено корзин {deleted_carts}, позиций {deleted_items} '
+                f'({deleted_carts / elapsed:.0f} корзин/с)'
+            )
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Готово: удалено корзин {deleted_carts}, позиций {deleted_items}.'))
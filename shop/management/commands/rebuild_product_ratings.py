@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, FloatField, IntegerField, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce
+
+from shop.models import RATING_VALUES, Product, Review
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает денормализованную статистику оценок товаров по таблице отзывов.
+
+    Товары обрабатываются диапазонами id: на каждый диапазон приходится один
+    UPDATE с коррелированными подзапросами, которые читают отзывы товара по индексу
+    review.product_id. Каждый диапазон выполняется в своей транзакции.
+    """
+
+    help = 'Пересчитывает рейтинг (количество, сумму, среднее и гистограмму оценок) товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Размер диапазона id в одной пачке')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        max_id = Product.objects.aggregate(max_id=Max('pk'))['max_id'] or 0
+
+        reviews = Review.objects.filter(product_id=OuterRef('pk')).order_by().values('product_id')
+
+        def stat(aggregate):
+            return Coalesce(Subquery(reviews.annotate(value=aggregate).values('value')), 0,
+                            output_field=IntegerField())
+
+        count = stat(Count('id'))
+        total = stat(Sum('rating'))
+        changes = {
+            'rating_count': count,
+            'rating_sum': total,
+            'rating_avg': Coalesce(
+                Subquery(reviews.annotate(value=Cast(Sum('rating'), FloatField()) / Count('id')).values('value')),
+                0.0,
+                output_field=FloatField(),
+            ),
+            **{f'rating_{rating}': stat(Count('id', filter=Q(rating=rating))) for rating in RATING_VALUES},
+        }
+
+        processed = 0
+        for start in range(0, max_id, batch_size):
+            with transaction.atomic():
+                processed += Product.objects.filter(pk__gt=start, pk__lte=start + batch_size).update(**changes)
+
+        self.stdout.write(self.style.SUCCESS(f'Рейтинг пересчитан для {processed} товаров.'))
@@ -0,0 +1,81 @@
+from datetime import datetime, time as day_time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from shop.models import DailyCategorySales, DailyProductSales, Order, OrderItem
+from shop.rollups import CENT
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает дневные сводки продаж по заказам.
+
+    Обрабатывает по одному дню: в одной транзакции удаляет сводки за день
+    и вставляет заново посчитанные группировкой позиций заказов за этот день.
+    Используется для первоначального заполнения и для исправления сводок
+    после изменений в обход приращений (например, queryset.update статуса).
+    """
+
+    help = 'Пересчитывает дневные сводки продаж по товарам и категориям'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Первый день, ГГГГ-ММ-ДД (по умолчанию — день первого заказа)')
+        parser.add_argument('--until', help='Последний день, ГГГГ-ММ-ДД (по умолчанию — день последнего заказа)')
+
+    def handle(self, *args, **options):
+        bounds = Order.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+        if bounds['first'] is None:
+            self.stdout.write('Заказов нет.')
+            return
+        first = self.parse_day(options['since']) or timezone.localdate(bounds['first'])
+        last = self.parse_day(options['until']) or timezone.localdate(bounds['last'])
+
+        day = first
+        rows = 0
+        while day <= last:
+            rows += self.rebuild_day(day)
+            day += timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано дней: {(last - first).days + 1}, строк сводок: {rows}.'))
+
+    def rebuild_day(self, day):
+        start = timezone.make_aware(datetime.combine(day, day_time.min))
+        lines = (
+            OrderItem.objects
+            .filter(order__created_at__gte=start, order__created_at__lt=start + timedelta(days=1))
+            .exclude(order__status=Order.STATUS_CANCELLED)
+            .annotate(revenue=Coalesce('line_total', F('product__price') * F('quantity')))
+        )
+        products = [
+            DailyProductSales(day=day, product_id=row['product_id'], units=row['units'],
+                              revenue=row['total'].quantize(CENT), orders=row['order_count'])
+            for row in self.totals(lines, 'product_id')
+        ]
+        categories = [
+            DailyCategorySales(day=day, category_id=row['product__category_id'], units=row['units'],
+                               revenue=row['total'].quantize(CENT), orders=row['order_count'])
+            for row in self.totals(lines, 'product__category_id')
+        ]
+        with transaction.atomic():
+            DailyProductSales.objects.filter(day=day).delete()
+            DailyCategorySales.objects.filter(day=day).delete()
+            DailyProductSales.objects.bulk_create(products, batch_size=1000)
+            DailyCategorySales.objects.bulk_create(categories, batch_size=1000)
+        return len(products) + len(categories)
+
+    def totals(self, lines, key):
+        return (
+            lines.order_by().values(key)
+            .annotate(units=Sum('quantity'), total=Sum('revenue'), order_count=Count('order_id', distinct=True))
+        )
+
+    def parse_day(self, value):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Неверная дата «{value}», ожидается ГГГГ-ММ-ДД')
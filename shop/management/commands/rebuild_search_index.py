@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from shop.search import get_search_backend
+
+
+class Command(BaseCommand):
+    """
+    Полностью перестраивает поисковый индекс товаров.
+
+    Нужен после массовых изменений, обходящих сигналы (queryset.update, bulk_create),
+    и после восстановления базы из резервной копии.
+    """
+
+    help = 'Перестраивает поисковый индекс товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Количество товаров в одной пачке')
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Поисковый индекс перестроен ({type(backend).__name__}).'))
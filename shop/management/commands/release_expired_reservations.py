@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from shop.models import StockReservation
+
+
+class Command(BaseCommand):
+    """
+    Удаляет истёкшие резервы товаров пачками по индексу expires_at.
+
+    Истёкшие резервы уже не уменьшают доступный остаток, команда лишь не даёт
+    таблице резервов расти. Каждая пачка удаляется в своей короткой транзакции,
+    поэтому резервирование и оформление заказов не ждут её долго; прерванную
+    команду можно запустить заново.
+    """
+
+    help = 'Удаляет истёкшие резервы товаров пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Количество резервов в одной пачке')
+        parser.add_argument('--sleep', type=float, default=0.05, help='Пауза между пачками, секунд')
+        parser.add_argument('--max-batches', type=int, default=None, help='Остановиться после N пачек')
+
+    def handle(self, *args, **options):
+        # Граница фиксируется на старте: резервы, истекающие во время работы, уберёт следующий запуск
+        expired = StockReservation.objects.expired(timezone.now())
+
+        deleted = batches = 0
+        while options['max_batches'] is None or batches < options['max_batches']:
+            ids = list(expired.order_by('expires_at').values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            with transaction.atomic():
+                # Повторная проверка срока: резерв могли продлить после выборки id
+                count, _ = expired.filter(pk__in=ids).delete()
+            deleted += count
+            batches += 1
+            self.stdout.write(f'Пачка {batches}: удалено резервов {deleted}')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Готово: удалено истёкших резервов {deleted}.'))
@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from onlinestore.routers import PRIMARY_DB, replica_aliases
+
+
+class Command(BaseCommand):
+    """
+    Обновляет локальные SQLite-реплики копией основной БД.
+
+    Копирование идёт через backup API SQLite: копия согласованна, основная БД
+    в это время доступна. Используется для локальной проверки маршрутизации
+    чтения на реплики (DATABASE_REPLICA_PATHS); на настоящих репликах данные
+    доставляет репликация СУБД.
+    """
+
+    help = 'Копирует основную SQLite-базу в файлы реплик'
+
+    def handle(self, *args, **options):
+        aliases = replica_aliases()
+        if not aliases:
+            raise CommandError('Реплики не настроены (DATABASE_REPLICA_PATHS)')
+        for alias in [PRIMARY_DB, *aliases]:
+            if settings.DATABASES[alias]['ENGINE'] != 'django.db.backends.sqlite3':
+                raise CommandError(f'База «{alias}» не SQLite, копировать её этой командой нельзя')
+
+        primary = connections[PRIMARY_DB]
+        primary.ensure_connection()
+        for alias in aliases:
+            started = time.monotonic()
+            replica = connections[alias]
+            replica.ensure_connection()
+            primary.connection.backup(replica.connection)
+            replica.close()
+            self.stdout.write(f'{alias}: {settings.DATABASES[alias]["NAME"]} ({time.monotonic() - started:.1f} с)')
+        self.stdout.write(self.style.SUCCESS('Реплики обновлены.'))
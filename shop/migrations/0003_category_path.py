@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-17 13:05
+
+from django.db import migrations, models
+
+
+def fill_category_paths(apps, schema_editor):
+    # Замороженная копия shop.models.rebuild_category_paths: миграция не должна
+    # зависеть от текущего кода моделей
+    Category = apps.get_model('shop', 'Category')
+    parents = dict(Category.objects.values_list('pk', 'parent_id'))
+    children = {}
+    for pk, parent_id in parents.items():
+        children.setdefault(parent_id, []).append(pk)
+
+    level = [(pk, '') for pk in children.get(None, [])]
+    depth = 0
+    while level:
+        updated = []
+        next_level = []
+        for pk, parent_path in level:
+            path = f'{parent_path}{pk:010d}/'
+            updated.append(Category(pk=pk, path=path, depth=depth))
+            next_level.extend((child, path) for child in children.get(pk, []))
+        Category.objects.bulk_update(updated, ['path', 'depth'], batch_size=1000)
+        level = next_level
+        depth += 1
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_cart_session_key_cart_updated_at_alter_cart_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Глубина'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=512, verbose_name='Путь'),
+        ),
+        migrations.RunPython(fill_category_paths, migrations.RunPython.noop),
+    ]
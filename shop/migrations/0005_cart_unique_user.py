@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-17 13:06
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicate_user_carts(apps, schema_editor):
+    Cart = apps.get_model('shop', 'Cart')
+    CartItem = apps.get_model('shop', 'CartItem')
+    duplicated = Cart.objects.exclude(user=None).values('user_id').annotate(n=Count('id')).filter(n__gt=1)
+    for row in duplicated:
+        carts = list(Cart.objects.filter(user_id=row['user_id']).order_by('pk'))
+        target, extra = carts[0], carts[1:]
+        for item in CartItem.objects.filter(cart__in=extra):
+            existing = CartItem.objects.filter(cart=target, product_id=item.product_id).first()
+            if existing:
+                existing.quantity += item.quantity
+                existing.save()
+            else:
+                item.cart = target
+                item.save()
+        Cart.objects.filter(pk__in=[cart.pk for cart in extra]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_product_rating_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_user_carts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user',), name='unique_cart_per_user'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-17 14:10
+
+from django.db import migrations
+
+
+def create_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS shop_product_fts "
+        "USING fts5(name, description, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "INSERT INTO shop_product_fts (rowid, name, description) "
+        "SELECT id, name, COALESCE(description, '') FROM shop_product"
+    )
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS shop_product_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
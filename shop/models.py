@@ -1,6 +1,81 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, FloatField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Concat, Substr
 from django.core.validators import MinValueValidator
+from django.utils import timezone
+
+RATING_VALUES = range(1, 6)
+
+# Ширина одного сегмента материализованного пути: id категории, дополненный нулями,
+# плюс разделитель. Фиксированная ширина сохраняет лексикографический порядок путей.
+CATEGORY_PATH_ID_WIDTH = 10
+CATEGORY_PATH_SEPARATOR = '/'
+
+
+def category_path_segment(pk):
+    return f'{pk:0{CATEGORY_PATH_ID_WIDTH}d}{CATEGORY_PATH_SEPARATOR}'
+
+
+def category_subtree_bounds(path):
+    """
+    Возвращает полуинтервал [lower, upper) путей, лежащих в поддереве с корнем ``path``.
+
+    Пути состоят только из цифр и разделителя '/', следующий за которым символ — '0',
+    поэтому поддерево выбирается диапазонным условием по индексу, без LIKE.
+    """
+    return path, path[:-1] + '0'
+
+
+def rebuild_category_paths(model):
+    """
+    Пересчитывает path и depth всех категорий по полю parent: обход в ширину,
+    один bulk_update на уровень дерева. model — модель категории, в том числе
+    историческая модель из миграции.
+    """
+    children = {}
+    for pk, parent_id in model.objects.values_list('pk', 'parent_id'):
+        children.setdefault(parent_id, []).append(pk)
+
+    level = [(pk, '') for pk in children.get(None, [])]
+    depth = 0
+    while level:
+        updated = []
+        next_level = []
+        for pk, parent_path in level:
+            path = parent_path + category_path_segment(pk)
+            updated.append(model(pk=pk, path=path, depth=depth))
+            next_level.extend((child, path) for child in children.get(pk, []))
+        model.objects.bulk_update(updated, ['path', 'depth'], batch_size=1000)
+        level = next_level
+        depth += 1
+
+
+class CategoryQuerySet(models.QuerySet):
+    """
+    Запросы по дереву категорий через материализованный путь ``Category.path``.
+    Каждый метод выполняется одним запросом вне зависимости от глубины дерева.
+    """
+
+    def descendants_of(self, category, include_self=False):
+        lower, upper = category_subtree_bounds(category.path)
+        qs = self.filter(path__gte=lower, path__lt=upper)
+        if not include_self:
+            qs = qs.exclude(pk=category.pk)
+        return qs
+
+    def ancestors_of(self, category, include_self=False):
+        ids = category.path_ids()
+        if not include_self:
+            ids = ids[:-1]
+        return self.filter(pk__in=ids).order_by('depth')
+
+    def rebuild_paths(self):
+        """
+        Полностью пересчитывает path и depth по полю parent. Нужен после
+        массовых операций, обходящих Category.save().
+        """
+        rebuild_category_paths(self.model)
 
 
 class Category(models.Model):
@@ -15,6 +90,12 @@ class Category(models.Model):
         name (CharField): Название категории
         description (TextField): Описание категории
         parent (ForeignKey): Родительская категория (может быть пустой)
+        path (CharField): Материализованный путь от корня, например ``0000000001/0000000004/``
+        depth (PositiveIntegerField): Глубина категории в дереве (0 — корень)
+
+    Поля path и depth поддерживаются автоматически при сохранении, перемещении
+    и удалении категории, поэтому выборка поддерева или цепочки предков
+    выполняется одним индексированным запросом.
     """
 
     name = models.CharField(max_length=256, verbose_name='Название')
@@ -27,6 +108,10 @@ class Category(models.Model):
         related_name='subcategories',
         verbose_name='Родительская категория'
     )
+    path = models.CharField(max_length=512, blank=True, default='', editable=False, db_index=True, verbose_name='Путь')
+    depth = models.PositiveIntegerField(default=0, editable=False, verbose_name='Глубина')
+
+    objects = CategoryQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Категория'
@@ -35,6 +120,113 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем исходного родителя, чтобы пересчитывать путь только при перемещении
+        instance._loaded_parent_id = dict(zip(field_names, values)).get('parent_id')
+        return instance
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        if self._is_own_descendant(self.parent):
+            raise ValidationError('Категория не может быть вложена сама в себя или в свою подкатегорию.')
+
+    def save(self, *args, **kwargs):
+        moved = not self.path or self.parent_id != getattr(self, '_loaded_parent_id', None)
+        self._previous_path = ''
+        parent_path = ''
+        if moved and self.parent_id:
+            parent_path = Category.objects.values_list('path', flat=True).get(pk=self.parent_id)
+            if self.pk and category_path_segment(self.pk) in parent_path:
+                raise ValueError('Категория не может быть вложена сама в себя или в свою подкатегорию.')
+        # Путь существующей категории пересчитывается до сохранения, чтобы обработчики
+        # post_save уже видели новое положение в дереве; новой — после получения id
+        if moved and self.pk is not None:
+            self._move_subtree(parent_path + category_path_segment(self.pk))
+        super().save(*args, **kwargs)
+        if moved and not self.path:
+            self._move_subtree(parent_path + category_path_segment(self.pk))
+        self._loaded_parent_id = self.parent_id
+
+    def _is_own_descendant(self, category):
+        return bool(self.pk and category and category.path and category_path_segment(self.pk) in category.path)
+
+    def _move_subtree(self, new_path):
+        new_depth = new_path.count(CATEGORY_PATH_SEPARATOR) - 1
+        old_path = self._previous_path = self.path
+        if old_path:
+            # Переписываем префикс пути у всего поддерева одним UPDATE
+            lower, upper = category_subtree_bounds(old_path)
+            Category.objects.filter(path__gte=lower, path__lt=upper).update(
+                path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (new_depth - self.depth),
+            )
+        else:
+            Category.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+        self.path = new_path
+        self.depth = new_depth
+
+    def path_ids(self):
+        """Возвращает id категорий на пути от корня до текущей включительно."""
+        return [int(segment) for segment in self.path.split(CATEGORY_PATH_SEPARATOR) if segment]
+
+    def descendants(self, include_self=False):
+        return Category.objects.descendants_of(self, include_self=include_self)
+
+    def ancestors(self, include_self=False):
+        return Category.objects.ancestors_of(self, include_self=include_self)
+
+
+class ProductQuerySet(models.QuerySet):
+
+    def in_category_subtree(self, category):
+        """
+        Товары категории и всех её подкатегорий любой вложенности — одним запросом.
+
+        Id категорий поддерева выбираются подзапросом по индексу path, а товары —
+        по category_id IN (...): так работает индекс product_category_created_idx,
+        чего не происходит при фильтре по диапазону path через JOIN.
+        """
+        lower, upper = category_subtree_bounds(category.path)
+        subtree = Category.objects.filter(path__gte=lower, path__lt=upper).values('pk')
+        return self.filter(category_id__in=subtree)
+
+    def adjust_rating(self, product_id, rating, delta):
+        """
+        Атомарно добавляет (delta=1) или убирает (delta=-1) одну оценку
+        в денормализованной статистике товара одним UPDATE через F-выражения.
+        """
+        count = F('rating_count') + delta
+        total = F('rating_sum') + rating * delta
+        changes = {
+            'rating_count': count,
+            'rating_sum': total,
+            'rating_avg': Case(
+                When(rating_count=-delta, then=Value(0.0)),
+                default=Cast(total, FloatField()) / count,
+                output_field=FloatField(),
+            ),
+        }
+        if rating in RATING_VALUES:
+            changes[f'rating_{rating}'] = F(f'rating_{rating}') + delta
+        return self.filter(pk=product_id).update(**changes)
+
+    def with_available_stock(self, exclude_cart=None, now=None):
+        """
+        Добавляет available_stock — остаток за вычетом действующих резервов корзин.
+
+        Резервы суммируются коррелированным подзапросом по индексу
+        (product, expires_at, quantity), не читая саму таблицу резервов.
+        Резервы корзины exclude_cart не вычитаются.
+        """
+        return self.annotate(
+            available_stock=F('stock') - Coalesce(
+                Subquery(StockReservation.objects.reserved_for(OuterRef('pk'), exclude_cart=exclude_cart, now=now)),
+                0,
+            )
+        )
+
 class Product(models.Model):
     """
     Модель товара в системе магазина.
@@ -51,6 +243,14 @@ class Product(models.Model):
         image (ImageField): Изображение товара
         category (ForeignKey): Категория, к которой относится товар
         created_at (DateTimeField): Дата и время добавления товара
+        rating_count (PositiveIntegerField): Количество отзывов
+        rating_sum (PositiveIntegerField): Сумма оценок
+        rating_avg (FloatField): Средняя оценка
+        rating_1 .. rating_5 (PositiveIntegerField): Гистограмма оценок от 1 до 5
+        image_variants (JSONField): Пути к готовым уменьшенным копиям изображения
+
+    Поля рейтинга денормализованы: они обновляются сигналами при создании,
+    изменении и удалении отзывов и пересчитываются командой rebuild_product_ratings.
     """
 
     name = models.CharField(max_length=256, verbose_name='Название')
@@ -72,26 +272,68 @@ class Product(models.Model):
         null=True,
         verbose_name='Изображение'
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Варианты изображения'
+    )
+    # Отдельный индекс не нужен: category — первое поле product_category_created_idx
     category = models.ForeignKey(
         Category,
         on_delete=models.CASCADE,
         related_name='products',
+        db_index=False,
         verbose_name='Категория'
     )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Дата добавления'
     )
+    rating_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество отзывов')
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name='Сумма оценок')
+    rating_avg = models.FloatField(default=0, editable=False, verbose_name='Средняя оценка')
+    rating_1 = models.PositiveIntegerField(default=0, editable=False, verbose_name='Оценок 1')
+    rating_2 = models.PositiveIntegerField(default=0, editable=False, verbose_name='Оценок 2')
+    rating_3 = models.PositiveIntegerField(default=0, editable=False, verbose_name='Оценок 3')
+    rating_4 = models.PositiveIntegerField(default=0, editable=False, verbose_name='Оценок 4')
+    rating_5 = models.PositiveIntegerField(default=0, editable=False, verbose_name='Оценок 5')
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
         unique_together = ('name', 'category')
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['-rating_avg', '-rating_count'], name='product_rating_idx'),
+            # Ключи keyset-пагинации каталога: вся лента и лента одной категории
+            models.Index(fields=['-created_at', '-id'], name='product_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='product_category_created_idx'),
+        ]
+        constraints = [
+            # Страховка на уровне БД от ухода остатка в минус при конкурентном списании
+            models.CheckConstraint(condition=models.Q(stock__gte=0), name='product_stock_non_negative'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        # Исходная категория нужна, чтобы при переносе товара сбросить кеш обеих категорий,
+        # исходная цена — чтобы при её изменении сбросить суммы корзин
+        instance._loaded_category_id = loaded.get('category_id')
+        instance._loaded_price = loaded.get('price')
+        return instance
+
+    @property
+    def rating_histogram(self):
+        return {rating: getattr(self, f'rating_{rating}') for rating in RATING_VALUES}
+
 
 class Order(models.Model):
     """
@@ -112,7 +354,9 @@ class Order(models.Model):
         ('processing', 'В обработке'),
         ('shipping', 'Доставляется'),
         ('delivered', 'Доставлено'),
+        ('cancelled', 'Отменён'),
     ]
+    STATUS_CANCELLED = 'cancelled'
 
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -126,14 +370,31 @@ class Order(models.Model):
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = 'Заказы'
+        indexes = [
+            # Выборки заказов за период: выгрузка, пересчёт сводок продаж
+            models.Index(fields=['created_at'], name='order_created_idx'),
+        ]
 
     def __str__(self):
         return f'Заказ #{self.id} от {self.user.username}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Исходный статус нужен, чтобы при отмене заказа (или её снятии) скорректировать отчёты о продажах
+        instance._loaded_status = dict(zip(field_names, values)).get('status')
+        return instance
+
+    @property
+    def is_cancelled(self):
+        return self.status == self.STATUS_CANCELLED
+
     def update_total_price(self):
-        total = sum(item.total_price() for item in self.items.all())
-        self.total_price = total
-        self.save()
+        # Сумма считается одним агрегатом по зафиксированным стоимостям позиций; у позиций,
+        # ещё не заполненных backfill_order_item_prices, — по текущей цене товара
+        total = self.items.aggregate(total=Sum(Coalesce('line_total', F('product__price') * F('quantity'))))['total']
+        self.total_price = total or 0
+        self.save(update_fields=['total_price'])
 
 class OrderItem(models.Model):
     """
@@ -147,6 +408,8 @@ class OrderItem(models.Model):
         order (ForeignKey): Заказ, к которому относится позиция
         product (ForeignKey): Товар в заказе
         quantity (PositiveIntegerField): Количество единиц товара
+        unit_price (DecimalField): Цена единицы товара на момент оформления заказа
+        line_total (DecimalField): Стоимость позиции (unit_price * quantity)
     """
 
     order = models.ForeignKey(
@@ -157,6 +420,10 @@ class OrderItem(models.Model):
     product = models.ForeignKey(
         Product, on_delete=models.CASCADE, verbose_name='Товар')
     quantity = models.PositiveIntegerField(default=1, verbose_name='Количество')
+    unit_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True, editable=False, verbose_name='Цена за единицу')
+    line_total = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True, editable=False, verbose_name='Стоимость позиции')
 
     class Meta:
         verbose_name = 'Позиция заказа'
@@ -165,8 +432,25 @@ class OrderItem(models.Model):
     def __str__(self):
         return f'{self.product.name} x {self.quantity}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Исходный товар нужен, чтобы при замене товара в позиции зафиксировать цену нового
+        instance._loaded_product_id = dict(zip(field_names, values)).get('product_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Цена фиксируется при создании позиции (или замене товара в ней) и не меняется вслед за ценой товара
+        if self.unit_price is None or self.product_id != getattr(self, '_loaded_product_id', self.product_id):
+            self.unit_price = self.product.price
+        self.line_total = self.unit_price * self.quantity
+        super().save(*args, **kwargs)
+        self._loaded_product_id = self.product_id
+
     def total_price(self):
-        return self.product.price * self.quantity
+        if self.line_total is None:
+            return self.product.price * self.quantity
+        return self.line_total
 
 class Review(models.Model):
     """
@@ -200,11 +484,53 @@ class Review(models.Model):
     def __str__(self):
         return f'Отзыв {self.user.username} о {self.product.name} ({self.rating}/5)'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Исходные товар и оценка нужны, чтобы при изменении отзыва скорректировать статистику товара
+        loaded = dict(zip(field_names, values))
+        if 'product_id' in loaded and 'rating' in loaded:
+            instance._loaded_rating = (loaded['product_id'], loaded['rating'])
+        return instance
+
     def clean(self):
         from django.core.exceptions import ValidationError
         if not (1 <= self.rating <= 5):
             raise ValidationError('Оценка должна быть от 1 до 5.')
         
+# Операции пачки изменений корзины (Cart.apply, SessionCart.apply)
+CART_ADD = 'add'
+CART_SET = 'set'
+CART_REMOVE = 'remove'
+CART_OPERATIONS = (CART_ADD, CART_SET, CART_REMOVE)
+
+
+def fold_cart_changes(changes):
+    """
+    Сворачивает пачку изменений корзины [(операция, product_id, quantity), ...] по товарам.
+
+    'add' увеличивает количество на quantity, 'set' устанавливает quantity
+    (0 — удалить позицию), 'remove' удаляет позицию. Изменения одного товара
+    применяются по порядку.
+
+    Returns:
+        dict: {product_id: (absolute, amount)} — absolute=False означает прибавить
+        amount к текущему количеству, True — установить amount
+    """
+    folded = {}
+    for operation, product_id, quantity in changes:
+        absolute, amount = folded.get(product_id, (False, 0))
+        if operation == CART_ADD:
+            folded[product_id] = (absolute, amount + quantity)
+        elif operation == CART_SET:
+            folded[product_id] = (True, quantity)
+        elif operation == CART_REMOVE:
+            folded[product_id] = (True, 0)
+        else:
+            raise ValueError(f'Неизвестная операция с корзиной: {operation}')
+    return folded
+
+
 class Cart(models.Model):
     """
     Модель корзины покупок в системе магазина.
@@ -217,17 +543,106 @@ class Cart(models.Model):
         Created_at (DateTimeField): Дата и время создания корзины.
     """
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
-    session_key = models.CharField(max_length=40, null=True, blank=True)
+    session_key = models.CharField(max_length=40, null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
 
     class Meta:
         verbose_name = 'Корзина'
         verbose_name_plural = 'Корзины'
+        constraints = [
+            # Один пользователь — одна корзина; анонимные корзины (user IS NULL) не ограничиваются
+            models.UniqueConstraint(fields=['user'], name='unique_cart_per_user'),
+        ]
+        indexes = [
+            # Отбор брошенных корзин по возрасту для команды purge_carts
+            models.Index(fields=['updated_at'], name='cart_updated_idx'),
+        ]
 
     def __str__(self):
         return f"Cart #{self.id} (user={self.user}, session={self.session_key})"
 
+    def quantities(self):
+        """Содержимое корзины в виде {product_id: quantity}."""
+        return dict(self.items.values_list('product_id', 'quantity'))
+
+    def _lock(self):
+        """
+        Первая операция транзакции изменения корзины — запись в её строку: сериализует
+        параллельные изменения одной корзины и в SQLite сразу берёт блокировку на запись.
+        """
+        Cart.objects.filter(pk=self.pk).update(updated_at=timezone.now())
+
+    def apply(self, changes):
+        """
+        Применяет пачку изменений [(операция, product_id, quantity), ...] в одной транзакции
+        (см. fold_cart_changes).
+
+        Товар резервируется одним вызовом reservations.reserve на итоговые количества;
+        если его не хватает, не применяется ни одно изменение. Существующие позиции
+        увеличиваются одним UPDATE с F-выражением, новые и установленные — одним upsert
+        по ключу (cart, product), удалённые — одним DELETE. Сводка корзины в кеше
+        сбрасывается после фиксации.
+
+        Raises:
+            InsufficientStockError: доступного остатка не хватает; корзина не меняется
+        """
+        from shop import cart_summary, reservations
+
+        folded = fold_cart_changes(changes)
+        if not folded:
+            return
+        with transaction.atomic():
+            self._lock()
+            current = dict(self.items.filter(product_id__in=folded).values_list('product_id', 'quantity'))
+            targets = {
+                product_id: amount if absolute else current.get(product_id, 0) + amount
+                for product_id, (absolute, amount) in folded.items()
+            }
+            reservations.reserve(self, targets)
+
+            increments = {
+                product_id: amount
+                for product_id, (absolute, amount) in folded.items()
+                if not absolute and product_id in current and targets[product_id] > 0
+            }
+            if increments:
+                self.items.filter(product_id__in=increments).update(quantity=F('quantity') + Case(
+                    *[When(product_id=product_id, then=Value(amount)) for product_id, amount in increments.items()],
+                    default=Value(0),
+                ))
+            CartItem.objects.bulk_create(
+                [
+                    CartItem(cart=self, product_id=product_id, quantity=quantity)
+                    for product_id, quantity in targets.items()
+                    if quantity > 0 and product_id not in increments
+                ],
+                update_conflicts=True,
+                unique_fields=['cart', 'product'],
+                update_fields=['quantity'],
+            )
+            removed = [product_id for product_id, quantity in targets.items() if quantity <= 0]
+            if removed:
+                self.items.filter(product_id__in=removed).delete()
+            cart_summary.invalidate(self.pk)
+
+    def add(self, product_id, quantity=1):
+        self.apply([(CART_ADD, product_id, quantity)])
+
+    def set_quantity(self, product_id, quantity):
+        self.apply([(CART_SET, product_id, quantity)])
+
+    def remove(self, product_id):
+        self.apply([(CART_REMOVE, product_id, 0)])
+
+    def clear(self):
+        from shop import cart_summary
+
+        with transaction.atomic():
+            self.items.all().delete()
+            self.reservations.all().delete()
+            cart_summary.invalidate(self.pk)
+
 class CartItem(models.Model):
     """
     Модель элемента корзины в системе магазина.
@@ -255,4 +670,145 @@ class CartItem(models.Model):
         return f'{self.product.name} x {self.quantity}'
 
     def get_total_price(self):
-        return self.product.price * self.quantity
\ No newline at end of file
+        return self.product.price * self.quantity
+
+
+class StockReservationQuerySet(models.QuerySet):
+
+    def active(self, now=None):
+        return self.filter(expires_at__gt=now or timezone.now())
+
+    def expired(self, now=None):
+        return self.filter(expires_at__lte=now or timezone.now())
+
+    def reserved_for(self, product, exclude_cart=None, now=None):
+        """
+        Запрос суммы действующих резервов товара (id или OuterRef) для подзапроса
+        или values_list: одна строка с полем total.
+        """
+        reservations = self.active(now).filter(product=product)
+        if exclude_cart is not None:
+            reservations = reservations.exclude(cart=exclude_cart)
+        return reservations.values('product').annotate(total=Sum('quantity')).values('total')
+
+    def reserved_quantities(self, product_ids, exclude_cart=None, now=None):
+        """Суммы действующих резервов в виде {product_id: quantity} одним запросом."""
+        reservations = self.active(now).filter(product_id__in=product_ids)
+        if exclude_cart is not None:
+            reservations = reservations.exclude(cart=exclude_cart)
+        return dict(reservations.values('product').annotate(total=Sum('quantity')).values_list('product', 'total'))
+
+
+class StockReservation(models.Model):
+    """
+    Резерв товара на складе за корзиной на ограниченное время.
+
+    Количество резерва совпадает с количеством позиции корзины. Резерв действует
+    до expires_at (SHOP_RESERVATION_TTL после последнего изменения корзины),
+    затем перестаёт учитываться в доступном остатке; истёкшие строки удаляет
+    команда release_expired_reservations. Создаётся и изменяется через
+    shop.reservations, снимается при оформлении заказа.
+
+    Attributes:
+        cart (ForeignKey): Корзина, за которой закреплён резерв
+        product (ForeignKey): Товар
+        quantity (PositiveIntegerField): Зарезервировано единиц
+        expires_at (DateTimeField): Момент окончания резерва
+    """
+
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='reservations', verbose_name='Корзина')
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='reservations', verbose_name='Товар')
+    quantity = models.PositiveIntegerField(verbose_name='Количество')
+    expires_at = models.DateTimeField(verbose_name='Действует до')
+
+    objects = StockReservationQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Резерв товара'
+        verbose_name_plural = 'Резервы товаров'
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='stock_reservation_unique'),
+        ]
+        indexes = [
+            # Сумма действующих резервов товара читается только из индекса
+            models.Index(fields=['product', 'expires_at', 'quantity'], name='stock_reservation_product_idx'),
+            # Отбор истёкших резервов пачками для команды release_expired_reservations
+            models.Index(fields=['expires_at'], name='stock_reservation_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} x {self.quantity} до {self.expires_at:%H:%M:%S}'
+
+
+class SalesRollup(models.Model):
+    """
+    Базовая модель дневной сводки продаж.
+
+    Сводки обновляются приращениями при оформлении, отмене и удалении заказов
+    (см. shop.rollups) и полностью пересчитываются командой rebuild_sales_rollups.
+    Отменённые заказы в сводки не входят.
+
+    Attributes:
+        day (DateField): День оформления заказа
+        units (IntegerField): Продано единиц товара
+        revenue (DecimalField): Выручка по зафиксированным ценам позиций
+        orders (IntegerField): Количество заказов
+    """
+
+    day = models.DateField(verbose_name='День')
+    units = models.IntegerField(default=0, verbose_name='Продано, шт.')
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Выручка')
+    orders = models.IntegerField(default=0, verbose_name='Заказов')
+
+    class Meta:
+        abstract = True
+
+
+class DailyProductSales(SalesRollup):
+    """
+    Дневная сводка продаж товара.
+
+    Attributes:
+        product (ForeignKey): Товар
+    """
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales', verbose_name='Товар')
+
+    class Meta:
+        verbose_name = 'Продажи товара за день'
+        verbose_name_plural = 'Продажи товаров по дням'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='daily_product_sales_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'day'], name='daily_product_sales_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} за {self.day}'
+
+
+class DailyCategorySales(SalesRollup):
+    """
+    Дневная сводка продаж категории (по товарам, непосредственно входящим в категорию).
+
+    Attributes:
+        category (ForeignKey): Категория
+    """
+
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name='daily_sales', verbose_name='Категория')
+
+    class Meta:
+        verbose_name = 'Продажи категории за день'
+        verbose_name_plural = 'Продажи категорий по дням'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category'], name='daily_category_sales_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['category', 'day'], name='daily_category_sales_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.category_id} за {self.day}'
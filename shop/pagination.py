@@ -0,0 +1,73 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+"""
+Keyset (cursor) пагинация по ключу (created_at, id).
+
+В отличие от OFFSET, стоимость получения страницы не зависит от её номера:
+каждая следующая страница — это диапазонное условие по составному индексу
+от последней строки предыдущей страницы.
+"""
+
+
+class InvalidCursor(ValueError):
+    """Курсор повреждён или сформирован не этим сервером."""
+
+
+def encode_cursor(obj):
+    payload = json.dumps([obj.created_at.isoformat(), obj.pk])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+    if created_at is None:
+        raise InvalidCursor(cursor)
+    return created_at, pk
+
+
+def keyset_slice(queryset, cursor=None, page_size=20):
+    """
+    Запрос страницы объектов, упорядоченных по убыванию (created_at, id), начиная
+    после курсора; в запрос входит одна лишняя строка — признак следующей страницы.
+
+    Raises:
+        InvalidCursor: если курсор не удалось разобрать
+    """
+    queryset = queryset.order_by('-created_at', '-pk')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        # created_at <= X задаёт начало диапазона в индексе, остальное — остаточный фильтр;
+        # условие вида (a < X) OR (a = X AND id < Y) целиком заставило бы читать индекс с начала
+        queryset = queryset.filter(Q(created_at__lte=created_at), Q(created_at__lt=created_at) | Q(pk__lt=pk))
+    return queryset[:page_size + 1]
+
+
+def keyset_page(objects, page_size):
+    next_cursor = encode_cursor(objects[page_size - 1]) if len(objects) > page_size else None
+    return objects[:page_size], next_cursor
+
+
+def paginate_keyset(queryset, cursor=None, page_size=20):
+    """
+    Возвращает страницу объектов, упорядоченных по убыванию (created_at, id),
+    начиная после курсора, и курсор следующей страницы (None, если страница последняя).
+
+    Raises:
+        InvalidCursor: если курсор не удалось разобрать
+    """
+    return keyset_page(list(keyset_slice(queryset, cursor, page_size)), page_size)
+
+
+async def apaginate_keyset(queryset, cursor=None, page_size=20):
+    """Асинхронный вариант paginate_keyset."""
+    return keyset_page([obj async for obj in keyset_slice(queryset, cursor, page_size)], page_size)
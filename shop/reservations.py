@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from shop.models import Product, StockReservation
+
+"""
+Резервирование товара за корзинами на время SHOP_RESERVATION_TTL.
+
+Доступный остаток товара — stock минус действующие резервы других корзин.
+Резерв корзины по товару равен количеству в её позиции и продлевается при
+каждом изменении корзины; истёкший резерв при этом заново проверяется по остатку. Блокировки держатся только на время короткой
+транзакции резервирования (несколько запросов), а не пока товар лежит в
+корзине: дальше резерв — просто строка с отметкой времени, которую другие
+транзакции учитывают при подсчёте доступного остатка.
+"""
+
+
+class InsufficientStockError(Exception):
+    """Доступного остатка (за вычетом чужих резервов) не хватает на запрошенное количество."""
+
+    def __init__(self, product_id, requested, available):
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+        super().__init__(f'Товар {product_id}: запрошено {requested}, доступно {available}.')
+
+
+def reservation_ttl():
+    return timedelta(seconds=getattr(settings, 'SHOP_RESERVATION_TTL', 15 * 60))
+
+
+def available_stock(product_ids, exclude_cart=None):
+    """Доступные остатки товаров в виде {product_id: quantity} одним запросом."""
+    return dict(
+        Product.objects.filter(pk__in=product_ids).order_by()
+        .with_available_stock(exclude_cart=exclude_cart)
+        .values_list('pk', 'available_stock')
+    )
+
+
+def reserve(cart, quantities, partial=False):
+    """
+    Устанавливает резерв корзины по товарам {product_id: quantity} и продлевает
+    срок её действующих резервов. Нулевое количество снимает резерв товара.
+
+    Если доступного остатка не хватает, выбрасывает InsufficientStockError и
+    ничего не меняет; с partial=True резервирует сколько есть. Истёкшие резервы
+    остальных позиций корзины не продлеваются вслепую: пока они не действовали,
+    товар могли зарезервировать другие корзины, поэтому они заново проходят
+    проверку остатка и восстанавливаются сколько есть или снимаются.
+
+    Первая операция — запись (продление резервов корзины): в SQLite она сразу
+    берёт блокировку на запись. Затем строки товаров блокируются в порядке id
+    (SELECT ... FOR UPDATE там, где он поддерживается), поэтому параллельное
+    резервирование одного товара выполняется по очереди и не может превысить остаток.
+
+    Returns:
+        dict: зарезервированное количество по каждому запрошенному товару
+    """
+    now = timezone.now()
+    expires_at = now + reservation_ttl()
+    # Без точки сохранения: внутри изменения корзины нехватка товара откатывает всю транзакцию
+    with transaction.atomic(savepoint=False):
+        cart.reservations.active(now).update(expires_at=expires_at)
+        expired = dict(
+            cart.reservations.expired(now).exclude(product_id__in=list(quantities)).values_list('product_id', 'quantity')
+        )
+        product_ids = sorted({*quantities, *expired})
+        if not product_ids:
+            return {}
+        stock = dict(
+            Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk').values_list('pk', 'stock')
+        )
+        held = StockReservation.objects.reserved_quantities(product_ids, exclude_cart=cart, now=now)
+
+        granted = {}
+        for product_id in product_ids:
+            requested = quantities.get(product_id, expired.get(product_id))
+            available = max(stock.get(product_id, 0) - held.get(product_id, 0), 0)
+            if requested > available and not partial and product_id in quantities:
+                raise InsufficientStockError(product_id, requested, available)
+            granted[product_id] = max(min(requested, available), 0)
+
+        StockReservation.objects.bulk_create(
+            [
+                StockReservation(cart=cart, product_id=product_id, quantity=quantity, expires_at=expires_at)
+                for product_id, quantity in granted.items()
+                if quantity
+            ],
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity', 'expires_at'],
+        )
+        released = [product_id for product_id, quantity in granted.items() if not quantity]
+        if released:
+            cart.reservations.filter(product_id__in=released).delete()
+    return {product_id: granted[product_id] for product_id in quantities}
@@ -0,0 +1,88 @@
+"""
+Дневные сводки продаж по товарам и категориям.
+
+Отчёты читают только таблицы DailyProductSales и DailyCategorySales и не
+соединяют позиции заказов с товарами и категориями. Сводки обновляются
+приращениями уже после фиксации транзакции заказа (transaction.on_commit),
+поэтому оформление заказа не держит блокировки на строках сводок.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from shop.models import DailyCategorySales, DailyProductSales, OrderItem
+
+CENT = Decimal('0.01')
+
+
+class OrderContribution:
+    """
+    Вклад одного заказа в сводки: по товарам и по категориям за день заказа.
+
+    Считается одним запросом по позициям заказа; категория берётся текущая
+    категория товара.
+    """
+
+    def __init__(self, order):
+        self.day = timezone.localdate(order.created_at)
+        self.products = {}
+        self.categories = defaultdict(lambda: [0, Decimal(0), 1])
+        lines = (
+            OrderItem.objects.filter(order_id=order.pk)
+            .values('product_id', 'product__category_id')
+            .annotate(
+                units=Sum('quantity'),
+                revenue=Sum(Coalesce('line_total', F('product__price') * F('quantity'))),
+            )
+        )
+        for line in lines:
+            revenue = Decimal(line['revenue'] or 0).quantize(CENT)
+            self.products[line['product_id']] = [line['units'], revenue, 1]
+            category = self.categories[line['product__category_id']]
+            category[0] += line['units']
+            category[1] += revenue
+
+    def apply(self, sign=1):
+        """Прибавляет вклад к сводкам (sign=-1 — вычитает)."""
+        with transaction.atomic():
+            for product_id, totals in self.products.items():
+                _increment(DailyProductSales, {'day': self.day, 'product_id': product_id}, totals, sign)
+            for category_id, totals in self.categories.items():
+                _increment(DailyCategorySales, {'day': self.day, 'category_id': category_id}, totals, sign)
+
+
+def _increment(model, key, totals, sign):
+    units, revenue, orders = (value * sign for value in totals)
+    changes = {'units': F('units') + units, 'revenue': F('revenue') + revenue, 'orders': F('orders') + orders}
+    if model.objects.filter(**key).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, units=units, revenue=revenue, orders=orders)
+    except IntegrityError:
+        # Строку за этот день успела создать параллельная транзакция
+        model.objects.filter(**key).update(**changes)
+
+
+def record_order(order, sign=1):
+    """
+    Учитывает заказ в сводках после фиксации текущей транзакции.
+
+    Вклад считается уже после фиксации, когда позиции заказа записаны.
+    """
+    transaction.on_commit(lambda: OrderContribution(order).apply(sign))
+
+
+def forget_order(order):
+    """
+    Вычитает заказ из сводок после фиксации текущей транзакции.
+
+    Вклад считается сразу: при удалении заказа после фиксации позиций уже не будет.
+    """
+    contribution = OrderContribution(order)
+    transaction.on_commit(lambda: contribution.apply(-1))
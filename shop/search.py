@@ -0,0 +1,153 @@
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Q, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from shop.models import Product, category_subtree_bounds
+
+"""
+Полнотекстовый поиск товаров.
+
+Бэкенд выбирается настройкой SHOP_SEARCH_BACKEND (путь к классу); если она
+не задана, на SQLite используется FTS5-индекс, на остальных СУБД — простой
+поиск через icontains.
+"""
+
+FTS_TABLE = 'shop_product_fts'
+
+
+def search_terms(query):
+    return re.findall(r'\w+', query or '')
+
+
+class BaseSearchBackend:
+    """
+    Интерфейс бэкенда поиска.
+
+    index/remove вызываются сигналами при сохранении и удалении товара,
+    rebuild — командой rebuild_search_index, filter_queryset — поиском в админке,
+    search — ранжированным поиском в каталоге.
+    """
+
+    def index(self, product):
+        pass
+
+    def remove(self, product_id):
+        pass
+
+    def rebuild(self, batch_size=1000):
+        pass
+
+    def filter_queryset(self, queryset, query):
+        raise NotImplementedError
+
+    def search(self, query, category=None, limit=20):
+        raise NotImplementedError
+
+
+class BasicSearchBackend(BaseSearchBackend):
+    """
+    Поиск без отдельного индекса: каждое слово запроса ищется через icontains
+    в названии или описании. Релевантность не вычисляется, товары упорядочиваются по рейтингу.
+    """
+
+    def filter_queryset(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+        for term in terms:
+            queryset = queryset.filter(Q(name__icontains=term) | Q(description__icontains=term))
+        return queryset
+
+    def search(self, query, category=None, limit=20):
+        products = Product.objects.all()
+        if category is not None:
+            products = products.in_category_subtree(category)
+        return list(self.filter_queryset(products, query).order_by('-rating_avg', '-rating_count')[:limit])
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    Поиск по теневой таблице SQLite FTS5 (shop_product_fts), где rowid совпадает с id товара.
+    Результаты ранжируются по bm25, название весит больше описания.
+    """
+
+    rank = f'bm25({FTS_TABLE}, 10.0, 1.0)'
+
+    def match_expression(self, query):
+        # Каждое слово берётся в кавычки (экранирование синтаксиса FTS5) и ищется по префиксу
+        return ' '.join('"{}"*'.format(term.replace('"', '""')) for term in search_terms(query))
+
+    def index(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)',
+                [product.pk, product.name, product.description or ''],
+            )
+
+    def remove(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product_id])
+
+    def rebuild(self, batch_size=1000):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            rows = Product.objects.order_by('pk').values_list('pk', 'name', 'description')
+            batch = []
+            for pk, name, description in rows.iterator(chunk_size=batch_size):
+                batch.append((pk, name, description or ''))
+                if len(batch) >= batch_size:
+                    cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)', batch)
+                    batch = []
+            if batch:
+                cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)', batch)
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+
+    def filter_queryset(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]))
+
+    def search(self, query, category=None, limit=20):
+        match = self.match_expression(query)
+        if not match:
+            return []
+
+        sql = [f'SELECT f.rowid FROM {FTS_TABLE} f']
+        params = []
+        if category is not None:
+            lower, upper = category_subtree_bounds(category.path)
+            sql.append('JOIN shop_product p ON p.id = f.rowid JOIN shop_category c ON c.id = p.category_id')
+            sql.append(f'WHERE {FTS_TABLE} MATCH %s AND c.path >= %s AND c.path < %s')
+            params += [match, lower, upper]
+        else:
+            sql.append(f'WHERE {FTS_TABLE} MATCH %s')
+            params.append(match)
+        sql.append(f'ORDER BY {self.rank} LIMIT %s')
+        params.append(limit)
+
+        with connection.cursor() as cursor:
+            cursor.execute(' '.join(sql), params)
+            ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            return []
+
+        # Сохраняем порядок релевантности, полученный из FTS-индекса
+        position = Case(*[When(pk=pk, then=i) for i, pk in enumerate(ids)], output_field=IntegerField())
+        return list(Product.objects.filter(pk__in=ids).order_by(position))
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    path = getattr(settings, 'SHOP_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTSBackend()
+    return BasicSearchBackend()
@@ -1,6 +1,16 @@
+from django.conf import settings
 from django.contrib.auth import user_logged_in
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.functions import Substr
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 
+from shop import cache as catalog_cache
+from shop import cart_summary, rollups
+from shop.images import build_image_variants, variants_are_current
+from shop.models import CartItem, Category, Order, Product, Review, category_subtree_bounds
+from shop.search import get_search_backend
 from shop.utils import get_or_create_cart
 
 """
@@ -19,4 +29,194 @@ def merge_carts_on_login(sender, request, user, **kwargs):
         user: Авторизованный пользователь
         **kwargs: Дополнительные аргументы
     """
-    get_or_create_cart(request)
\ No newline at end of file
+    # login() обновляет request.user, только если атрибут уже есть (его нет, например, у test Client.login)
+    if not hasattr(request, 'user'):
+        request.user = user
+    get_or_create_cart(request)
+
+
+@receiver(connection_created)
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """
+    Применяет PRAGMA из SQLITE_PRAGMAS к каждому новому соединению с SQLite.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(post_delete, sender=Category)
+def detach_category_subtree(sender, instance, **kwargs):
+    """
+    Пересчитывает материализованные пути после удаления категории.
+
+    Подкатегории удалённой категории становятся корневыми (parent = SET_NULL),
+    поэтому у всего поддерева отрезается префикс пути удалённой категории.
+    """
+    if not instance.path:
+        return
+    lower, upper = category_subtree_bounds(instance.path)
+    Category.objects.filter(path__gte=lower, path__lt=upper).update(
+        path=Substr('path', len(instance.path) + 1),
+        depth=F('depth') - (instance.depth + 1),
+    )
+
+
+@receiver(pre_save, sender=Review)
+def remember_stored_rating(sender, instance, **kwargs):
+    """
+    Читает сохранённые товар и оценку отзыва, если они не запомнены при загрузке
+    (отзыв создан в коде с существующим pk или загружен без этих полей).
+    """
+    if instance.pk is not None and not hasattr(instance, '_loaded_rating'):
+        instance._loaded_rating = Review.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_review_save(sender, instance, created, **kwargs):
+    """
+    Поддерживает денормализованную статистику оценок товара при создании
+    и изменении отзыва (в том числе при переносе отзыва на другой товар).
+    """
+    current = (instance.product_id, instance.rating)
+    previous = None if created else getattr(instance, '_loaded_rating', None)
+    if previous != current:
+        if previous is not None:
+            Product.objects.adjust_rating(*previous, delta=-1)
+        Product.objects.adjust_rating(*current, delta=1)
+    instance._previous_rating = previous
+    instance._loaded_rating = current
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_review_delete(sender, instance, **kwargs):
+    """
+    Убирает оценку удалённого отзыва из статистики товара.
+    """
+    product_id, rating = getattr(instance, '_loaded_rating', (instance.product_id, instance.rating))
+    Product.objects.adjust_rating(product_id, rating, delta=-1)
+
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, **kwargs):
+    """
+    Обновляет запись товара в поисковом индексе.
+    """
+    get_search_backend().index(instance)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_index(sender, instance, **kwargs):
+    """
+    Удаляет товар из поискового индекса.
+    """
+    get_search_backend().remove(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def build_product_image_variants(sender, instance, **kwargs):
+    """
+    Строит уменьшенные копии изображения товара при его загрузке или замене.
+
+    Отключается настройкой SHOP_IMAGE_VARIANTS_ON_SAVE = False — тогда варианты
+    строит команда build_image_variants.
+    """
+    if not getattr(settings, 'SHOP_IMAGE_VARIANTS_ON_SAVE', True):
+        return
+    if instance.image:
+        if variants_are_current(instance.image.name, instance.image_variants):
+            return
+        instance.image_variants = build_image_variants(instance.image.name)
+    elif instance.image_variants:
+        instance.image_variants = {}
+    else:
+        return
+    Product.objects.filter(pk=instance.pk).update(image_variants=instance.image_variants)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    """
+    Сбрасывает кеш страницы товара и списков его текущей и прежней категорий.
+    """
+    category_ids = {instance.category_id, getattr(instance, '_loaded_category_id', None)} - {None}
+    catalog_cache.invalidate_product(instance.pk, category_ids)
+    instance._loaded_category_id = instance.category_id
+
+
+@receiver(post_save, sender=Product)
+def invalidate_cart_summaries_on_price_change(sender, instance, created, **kwargs):
+    """
+    Сбрасывает суммы всех корзин при изменении цены товара: корзины с товаром
+    не ищутся, сводки пересчитываются при следующем показе.
+    """
+    if not created and instance.price != getattr(instance, '_loaded_price', None):
+        catalog_cache.bump_versions((catalog_cache.PRICES_SCOPE, None))
+    instance._loaded_price = instance.price
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_cart_summaries_on_product_delete(sender, instance, **kwargs):
+    catalog_cache.bump_versions((catalog_cache.PRICES_SCOPE, None))
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def invalidate_cart_summary(sender, instance, **kwargs):
+    """
+    Сбрасывает сводку корзины при сохранении или удалении позиции, в том числе
+    каскадном (удаление товара). Массовые операции (Cart.apply, оформление заказа)
+    сбрасывают её сами.
+    """
+    cart_summary.invalidate(instance.cart_id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    """
+    Сбрасывает кеш списков категории и её предков, при перемещении — и прежних предков.
+    """
+    catalog_cache.invalidate_category_paths(instance.path, getattr(instance, '_previous_path', ''))
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_review_cache(sender, instance, **kwargs):
+    """
+    Отзыв меняет рейтинг товара, который показывается и на странице товара, и в списках.
+    """
+    product_ids = {instance.product_id}
+    previous = getattr(instance, '_previous_rating', None)
+    if previous is not None:
+        product_ids.add(previous[0])
+    for product_id, category_id in Product.objects.filter(pk__in=product_ids).values_list('pk', 'category_id'):
+        catalog_cache.invalidate_product(product_id, [category_id])
+
+
+@receiver(post_save, sender=Order)
+def update_sales_on_order_status(sender, instance, created, **kwargs):
+    """
+    Убирает отменённый заказ из сводок продаж и возвращает его туда при снятии отмены.
+
+    Новые заказы учитываются там, где создаются их позиции (оформление заказа, админка).
+    """
+    previous = None if created else getattr(instance, '_loaded_status', None)
+    if previous is not None and previous != instance.status:
+        if instance.is_cancelled:
+            rollups.forget_order(instance)
+        elif previous == Order.STATUS_CANCELLED:
+            rollups.record_order(instance)
+    instance._loaded_status = instance.status
+
+
+@receiver(pre_delete, sender=Order)
+def update_sales_on_order_delete(sender, instance, **kwargs):
+    """
+    Вычитает удаляемый заказ из сводок продаж (позиции ещё не удалены).
+    """
+    if getattr(instance, '_loaded_status', instance.status) != Order.STATUS_CANCELLED:
+        rollups.forget_order(instance)
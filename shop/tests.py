@@ -1,3 +1,1269 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from onlinestore.middleware import QueryInstrumentationMiddleware, fingerprint
+from onlinestore.routers import STICKY_COOKIE, DatabaseStickinessMiddleware, PrimaryReplicaRouter, use_primary
+from shop import reservations
+from shop.admin import EstimatedCountPaginator
+from shop.cart_summary import get_summary
+from shop.checkout import EmptyCartError, OutOfStockError, checkout
+from shop.images import variant_url, variants_are_current
+from shop.management.commands import purge_carts
+from shop.models import (
+    Cart, CartItem, Category, DailyCategorySales, DailyProductSales, Order, OrderItem, Product, Review,
+    StockReservation,
+)
+
+
+class CategoryTreeTests(TestCase):
+
+    def setUp(self):
+        self.electronics = Category.objects.create(name='Электроника')
+        self.phones = Category.objects.create(name='Телефоны', parent=self.electronics)
+        self.cases = Category.objects.create(name='Чехлы', parent=self.phones)
+        self.sale = Category.objects.create(name='Распродажа')
+
+    def tree(self):
+        return {name: (path, depth) for name, path, depth in Category.objects.values_list('name', 'path', 'depth')}
+
+    def assertTree(self, expected):
+        # expected: {имя: (цепочка имён от корня)}
+        pks = dict(Category.objects.values_list('name', 'pk'))
+        self.assertEqual(self.tree(), {
+            name: (''.join(f'{pks[ancestor]:010d}/' for ancestor in chain), len(chain) - 1)
+            for name, chain in expected.items()
+        })
+
+    def test_create_builds_paths(self):
+        self.assertTree({
+            'Электроника': ['Электроника'],
+            'Телефоны': ['Электроника', 'Телефоны'],
+            'Чехлы': ['Электроника', 'Телефоны', 'Чехлы'],
+            'Распродажа': ['Распродажа'],
+        })
+        self.assertEqual(list(self.electronics.descendants()), [self.phones, self.cases])
+        self.assertEqual(list(self.cases.ancestors()), [self.electronics, self.phones])
+
+    def test_move_subtree(self):
+        self.phones.parent = self.sale
+        self.phones.save()
+
+        self.assertTree({
+            'Электроника': ['Электроника'],
+            'Телефоны': ['Распродажа', 'Телефоны'],
+            'Чехлы': ['Распродажа', 'Телефоны', 'Чехлы'],
+            'Распродажа': ['Распродажа'],
+        })
+
+        phones = Category.objects.get(pk=self.phones.pk)
+        phones.parent = None
+        phones.save()
+        self.assertEqual(self.tree()['Чехлы'][1], 1)
+        self.assertFalse(self.sale.descendants().exists())
+
+    def test_move_into_own_subtree_is_rejected(self):
+        electronics = Category.objects.get(pk=self.electronics.pk)
+        electronics.parent = self.cases
+
+        with self.assertRaises(ValueError):
+            electronics.save()
+        self.assertEqual(self.tree()['Чехлы'][1], 2)
+
+    def test_delete_parent_detaches_subtree(self):
+        self.electronics.delete()
+
+        self.assertTree({
+            'Телефоны': ['Телефоны'],
+            'Чехлы': ['Телефоны', 'Чехлы'],
+            'Распродажа': ['Распродажа'],
+        })
+
+    def test_rebuild_paths(self):
+        Category.objects.update(path='', depth=0)
+
+        Category.objects.rebuild_paths()
+
+        self.assertEqual(self.tree()['Чехлы'], (self.cases.path, 2))
+
+    def test_subtree_products_use_category_index(self):
+        phone = Product.objects.create(name='Смартфон', price='100.00', category=self.phones)
+        case = Product.objects.create(name='Чехол', price='10.00', category=self.cases)
+        Product.objects.create(name='Уценка', price='1.00', category=self.sale)
+
+        products = Product.objects.in_category_subtree(self.phones).order_by('-created_at', '-id')
+
+        self.assertEqual(list(products), [case, phone])
+        self.assertIn('product_category_created_idx', products.explain())
+
+
+class ProductRatingTests(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        category = Category.objects.create(name='Книги')
+        self.book = Product.objects.create(name='Роман', price=Decimal('5.00'), category=category)
+        self.other = Product.objects.create(name='Повесть', price=Decimal('4.00'), category=category)
+        self.alice = User.objects.create(username='alice', email='alice@example.com')
+        self.bob = User.objects.create(username='bob', email='bob@example.com')
+
+    def stats(self, product):
+        product.refresh_from_db()
+        return product.rating_count, product.rating_sum, product.rating_avg, product.rating_histogram
+
+    def test_create_update_move_and_delete(self):
+        review = Review.objects.create(product=self.book, user=self.alice, rating=5)
+        Review.objects.create(product=self.book, user=self.bob, rating=2)
+        self.assertEqual(self.stats(self.book), (2, 7, 3.5, {1: 0, 2: 1, 3: 0, 4: 0, 5: 1}))
+
+        review.rating = 4
+        review.save()
+        self.assertEqual(self.stats(self.book), (2, 6, 3.0, {1: 0, 2: 1, 3: 0, 4: 1, 5: 0}))
+
+        review.product = self.other
+        review.save()
+        self.assertEqual(self.stats(self.book), (1, 2, 2.0, {1: 0, 2: 1, 3: 0, 4: 0, 5: 0}))
+        self.assertEqual(self.stats(self.other), (1, 4, 4.0, {1: 0, 2: 0, 3: 0, 4: 1, 5: 0}))
+
+        review.delete()
+        self.assertEqual(self.stats(self.other), (0, 0, 0.0, {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}))
+
+    def test_save_without_loaded_rating_reads_stored_row(self):
+        review = Review.objects.create(product=self.book, user=self.alice, rating=5)
+
+        Review(pk=review.pk, product=self.book, user=self.alice, rating=3, created_at=review.created_at).save()
+        self.assertEqual(self.stats(self.book)[:2], (1, 3))
+
+        partial = Review.objects.only('pk', 'comment').get(pk=review.pk)
+        partial.comment = 'Перечитал'
+        partial.save()
+        self.assertEqual(self.stats(self.book)[:2], (1, 3))
+
+    def test_rebuild_command_matches_signals(self):
+        Review.objects.create(product=self.book, user=self.alice, rating=5)
+        Review.objects.create(product=self.book, user=self.bob, rating=2)
+        expected = self.stats(self.book)
+        Product.objects.update(rating_count=0, rating_sum=0, rating_avg=0, rating_5=0, rating_2=0)
+
+        call_command('rebuild_product_ratings', stdout=StringIO())
+
+        self.assertEqual(self.stats(self.book), expected)
+
+
+class CheckoutTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='buyer', email='buyer@example.com')
+        category = Category.objects.create(name='Электроника')
+        self.phone = Product.objects.create(name='Смартфон', price='100.00', stock=3, category=category)
+        self.case = Product.objects.create(name='Чехол', price='10.50', stock=10, category=category)
+        self.cart = Cart.objects.create(user=self.user)
+
+    def test_checkout_creates_order_and_decrements_stock(self):
+        CartItem.objects.create(cart=self.cart, product=self.phone, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.case, quantity=3)
+
+        order = checkout(self.cart)
+
+        self.assertEqual(order.total_price, 231.5)
+        self.assertEqual(order.items.count(), 2)
+        self.assertFalse(self.cart.items.exists())
+        self.phone.refresh_from_db()
+        self.case.refresh_from_db()
+        self.assertEqual((self.phone.stock, self.case.stock), (1, 7))
+
+    def test_oversell_rolls_back_whole_order(self):
+        CartItem.objects.create(cart=self.cart, product=self.case, quantity=1)
+        CartItem.objects.create(cart=self.cart, product=self.phone, quantity=4)
+
+        with self.assertRaises(OutOfStockError):
+            checkout(self.cart)
+
+        self.case.refresh_from_db()
+        self.assertEqual(self.case.stock, 10)
+        self.assertEqual(self.cart.items.count(), 2)
+        self.assertFalse(self.user.orders.exists())
+
+    def test_empty_cart(self):
+        with self.assertRaises(EmptyCartError):
+            checkout(self.cart)
+
+
+class CheckoutConcurrencyTests(TransactionTestCase):
+    buyers = 12
+    stock = 5
+
+    def test_concurrent_buyers_never_oversell(self):
+        User = get_user_model()
+        category = Category.objects.create(name='Распродажа')
+        product = Product.objects.create(name='Хит продаж', price='9.99', stock=self.stock, category=category)
+        carts = []
+        for i in range(self.buyers):
+            cart = Cart.objects.create(user=User.objects.create(username=f'buyer{i}', email=f'buyer{i}@example.com'))
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+            carts.append(cart)
+
+        barrier = threading.Barrier(self.buyers)
+        results = []
+
+        def buy(cart):
+            try:
+                barrier.wait()
+                checkout(cart)
+                results.append('ok')
+            except OutOfStockError:
+                results.append('out_of_stock')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(cart,)) for cart in carts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(results.count('ok'), self.stock)
+        self.assertEqual(results.count('out_of_stock'), self.buyers - self.stock)
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(product.orderitem_set.count(), self.stock)
+
+
+class PurgeCartsTests(TestCase):
+
+    def setUp(self):
+        old = timezone.now() - timedelta(days=40)
+        self.abandoned = Cart.objects.create(session_key='abandoned')
+        self.touched = Cart.objects.create(session_key='touched')
+        self.fresh = Cart.objects.create(session_key='fresh')
+        self.user_cart = Cart.objects.create(user=get_user_model().objects.create(username='u', email='u@example.com'))
+        Cart.objects.exclude(pk=self.fresh.pk).update(updated_at=old)
+
+    def test_purges_only_carts_still_abandoned_at_delete_time(self):
+        def touch_then_atomic():
+            # Посетитель меняет корзину между выборкой пачки и её удалением
+            Cart.objects.filter(pk=self.touched.pk).update(updated_at=timezone.now())
+            return transaction.atomic()
+
+        with mock.patch.object(purge_carts, 'transaction', SimpleNamespace(atomic=touch_then_atomic)):
+            call_command('purge_carts', days=30, sleep=0, stdout=StringIO())
+
+        self.assertEqual(set(Cart.objects.values_list('pk', flat=True)),
+                         {self.touched.pk, self.fresh.pk, self.user_cart.pk})
+
+
+class StockReservationTests(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        category = Category.objects.create(name='Электроника')
+        self.phone = Product.objects.create(name='Смартфон', price=Decimal('100.00'), stock=3, category=category)
+        self.cart = Cart.objects.create(user=User.objects.create(username='first', email='first@example.com'))
+        self.other = Cart.objects.create(user=User.objects.create(username='second', email='second@example.com'))
+
+    def test_add_reserves_and_limits_other_carts(self):
+        self.cart.add(self.phone.pk, 2)
+
+        self.assertEqual(reservations.available_stock([self.phone.pk]), {self.phone.pk: 1})
+        self.assertEqual(reservations.available_stock([self.phone.pk], exclude_cart=self.cart), {self.phone.pk: 3})
+        with self.assertRaises(reservations.InsufficientStockError) as raised:
+            self.other.add(self.phone.pk, 2)
+        self.assertEqual(raised.exception.available, 1)
+        self.assertFalse(self.other.items.exists())
+
+        self.cart.set_quantity(self.phone.pk, 1)
+        self.other.add(self.phone.pk, 2)
+        self.assertEqual(self.other.reservations.get().quantity, 2)
+
+    def test_remove_releases_reservation(self):
+        self.cart.add(self.phone.pk, 3)
+        self.cart.remove(self.phone.pk)
+
+        self.assertFalse(StockReservation.objects.exists())
+        self.other.add(self.phone.pk, 3)
+
+    def test_expired_reservations_do_not_count_and_are_swept(self):
+        self.cart.add(self.phone.pk, 3)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.other.add(self.phone.pk, 3)
+        call_command('release_expired_reservations', sleep=0, stdout=StringIO())
+
+        self.assertEqual(list(StockReservation.objects.values_list('cart', 'quantity')), [(self.other.pk, 3)])
+
+    def test_expired_reservation_is_not_renewed_over_other_carts(self):
+        self.phone.stock = 5
+        self.phone.save()
+        case = Product.objects.create(name='Чехол', price=Decimal('10.00'), stock=10, category=self.phone.category)
+        self.cart.add(self.phone.pk, 5)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.other.add(self.phone.pk, 5)
+
+        # Изменение корзины не продлевает истёкший резерв: остаток уже зарезервирован другой корзиной
+        self.cart.add(case.pk, 1)
+
+        self.assertEqual(dict(self.cart.reservations.values_list('product', 'quantity')), {case.pk: 1})
+        checkout(self.other)
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.stock, 0)
+
+    def test_expired_reservation_is_restored_while_stock_lasts(self):
+        self.cart.add(self.phone.pk, 3)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.other.add(self.phone.pk, 1)
+        case = Product.objects.create(name='Чехол', price=Decimal('10.00'), stock=10, category=self.phone.category)
+
+        self.cart.add(case.pk, 1)
+
+        reserved = {
+            product_id: (quantity, expires_at > timezone.now())
+            for product_id, quantity, expires_at in self.cart.reservations.values_list('product', 'quantity', 'expires_at')
+        }
+        self.assertEqual(reserved, {self.phone.pk: (2, True), case.pk: (1, True)})
+
+    def test_checkout_respects_other_reservations_and_consumes_own(self):
+        CartItem.objects.create(cart=self.cart, product=self.phone, quantity=2)
+        self.other.add(self.phone.pk, 2)
+
+        with self.assertRaises(OutOfStockError):
+            checkout(self.cart)
+
+        checkout(self.other)
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.stock, 1)
+        self.assertFalse(StockReservation.objects.exists())
+
+
+class StockReservationConcurrencyTests(TransactionTestCase):
+    shoppers = 12
+    stock = 5
+
+    def test_concurrent_reservations_never_exceed_stock(self):
+        User = get_user_model()
+        category = Category.objects.create(name='Распродажа')
+        product = Product.objects.create(name='Хит продаж', price='9.99', stock=self.stock, category=category)
+        carts = [
+            Cart.objects.create(user=User.objects.create(username=f'shopper{i}', email=f'shopper{i}@example.com'))
+            for i in range(self.shoppers)
+        ]
+
+        barrier = threading.Barrier(self.shoppers)
+        results = []
+
+        def add(cart):
+            try:
+                barrier.wait()
+                cart.add(product.pk, 1)
+                results.append('ok')
+            except reservations.InsufficientStockError:
+                results.append('unavailable')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=add, args=(cart,)) for cart in carts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count('ok'), self.stock)
+        self.assertEqual(results.count('unavailable'), self.shoppers - self.stock)
+        self.assertEqual(CartItem.objects.filter(product=product).count(), self.stock)
+        self.assertEqual(reservations.available_stock([product.pk]), {product.pk: 0})
+
+
+class AdminChangelistQueryTests(TestCase):
+    """
+    Количество запросов на страницу списка в админке не должно зависеть
+    от количества строк на странице.
+    """
+
+    changelists = ('cart', 'cartitem', 'stockreservation', 'order', 'review', 'product', 'category')
+
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create(
+            username='admin', email='admin@example.com', is_staff=True, is_superuser=True, is_active=True
+        )
+        self.client.force_login(self.admin)
+        self.root = Category.objects.create(name='Каталог')
+        self.rows = 0
+
+    def add_rows(self, count):
+        User = get_user_model()
+        for i in range(self.rows, self.rows + count):
+            user = User.objects.create(username=f'user{i}', email=f'user{i}@example.com')
+            category = Category.objects.create(name=f'Категория {i}', parent=self.root)
+            product = Product.objects.create(name=f'Товар {i}', price='10.00', stock=5, category=category)
+            cart = Cart.objects.create(user=user)
+            cart.add(product.pk, 2)
+            order = Order.objects.create(user=user)
+            OrderItem.objects.create(order=order, product=product, quantity=1)
+            Review.objects.create(product=product, user=user, rating=4)
+        self.rows += count
+
+    def count_queries(self, model_name):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(f'admin:shop_{model_name}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        self.add_rows(2)
+        small = {name: self.count_queries(name) for name in self.changelists}
+        self.add_rows(20)
+        large = {name: self.count_queries(name) for name in self.changelists}
+        self.assertEqual(small, large)
+
+    def test_unfiltered_count_is_estimated_from_sqlite_stat1(self):
+        self.add_rows(3)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        Product.objects.create(name='Новый товар', price='10.00', stock=5, category=self.root)
+
+        # Статистика не обновляется сама: оценка отстаёт, отфильтрованный список считается точно
+        self.assertEqual(EstimatedCountPaginator(Product.objects.order_by('pk'), 10).count, 3)
+        self.assertEqual(EstimatedCountPaginator(Product.objects.filter(stock=5).order_by('pk'), 10).count, 4)
+
+
+class CatalogCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create(username='reviewer', email='reviewer@example.com')
+        self.root = Category.objects.create(name='Электроника')
+        self.phones = Category.objects.create(name='Смартфоны', parent=self.root)
+        self.books = Category.objects.create(name='Книги')
+        self.phone = Product.objects.create(name='Смартфон', price='100.00', stock=3, category=self.phones)
+
+    def get_json(self, url, params=None):
+        response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_warm_catalog_page_runs_no_queries(self):
+        url = reverse('shop:product_list')
+        self.get_json(url, {'category': self.root.pk})
+        with self.assertNumQueries(0):
+            self.get_json(url, {'category': self.root.pk})
+        self.get_json(reverse('shop:product_detail', args=[self.phone.pk]))
+        with self.assertNumQueries(0):
+            self.get_json(reverse('shop:product_detail', args=[self.phone.pk]))
+
+    def test_product_change_invalidates_its_category_chain(self):
+        url = reverse('shop:product_list')
+        self.get_json(url, {'category': self.root.pk})
+        self.get_json(url, {'category': self.books.pk})
+
+        self.phone.price = '90.00'
+        self.phone.save()
+        self.assertEqual(self.get_json(url, {'category': self.root.pk})['results'][0]['price'], '90.00')
+        with self.assertNumQueries(0):
+            self.get_json(url, {'category': self.books.pk})
+
+        self.phone.category = self.books
+        self.phone.save()
+        self.assertEqual(self.get_json(url, {'category': self.root.pk})['results'], [])
+        self.assertEqual(len(self.get_json(url, {'category': self.books.pk})['results']), 1)
+
+    def test_review_and_category_move_invalidate(self):
+        detail_url = reverse('shop:product_detail', args=[self.phone.pk])
+        list_url = reverse('shop:product_list')
+        self.get_json(detail_url)
+        self.get_json(list_url, {'category': self.books.pk})
+
+        Review.objects.create(product=self.phone, user=self.user, rating=5)
+        self.assertEqual(self.get_json(detail_url)['rating_count'], 1)
+
+        self.phones.parent = self.books
+        self.phones.save()
+        self.assertEqual(len(self.get_json(list_url, {'category': self.books.pk})['results']), 1)
+        self.assertEqual(self.get_json(list_url, {'category': self.root.pk})['results'], [])
+
+    def test_invalid_category(self):
+        url = reverse('shop:product_list')
+        for category in ('abc', '²', '-1', str(10 ** 30)):
+            self.assertEqual(self.client.get(url, {'category': category}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'category': '0'}).status_code, 404)
+
+    def test_checkout_invalidates_stock(self):
+        detail_url = reverse('shop:product_detail', args=[self.phone.pk])
+        list_url = reverse('shop:product_list')
+        self.get_json(detail_url)
+        self.get_json(list_url, {'category': self.root.pk})
+        self.get_json(list_url)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.phone, quantity=2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            checkout(cart)
+
+        self.assertEqual(self.get_json(detail_url)['stock'], 1)
+        self.assertEqual(self.get_json(list_url, {'category': self.root.pk})['results'][0]['stock'], 1)
+        self.assertEqual(self.get_json(list_url)['results'][0]['stock'], 1)
+
+
+class ImageVariantTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name, SHOP_IMAGE_VARIANTS={'thumb': (20, 20)})
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.category = Category.objects.create(name='Электроника')
+
+    def create_product(self):
+        buffer = BytesIO()
+        Image.new('RGB', (64, 48), 'red').save(buffer, 'PNG')
+        image = SimpleUploadedFile('phone.png', buffer.getvalue(), content_type='image/png')
+        return Product.objects.create(name='Смартфон', price='100.00', category=self.category, image=image)
+
+    def test_variants_built_on_save(self):
+        product = Product.objects.get(pk=self.create_product().pk)
+
+        self.assertEqual(product.image_variants['sizes'], {'thumb': [20, 20]})
+        with default_storage.open(product.image_variants['thumb']['jpeg']) as file:
+            self.assertEqual(Image.open(file).size, (20, 15))
+        self.assertTrue(default_storage.exists(product.image_variants['thumb']['webp']))
+        self.assertTrue(variant_url(product, 'thumb').endswith('.webp'))
+
+    def test_variant_settings_change_rebuilds_variants(self):
+        product = Product.objects.get(pk=self.create_product().pk)
+
+        with override_settings(SHOP_IMAGE_VARIANTS={'thumb': (40, 40)}):
+            self.assertFalse(variants_are_current(product.image.name, product.image_variants))
+            self.assertEqual(variant_url(product, 'thumb'), product.image.url)
+
+            product.save()
+            product.refresh_from_db()
+            self.assertEqual(product.image_variants['sizes'], {'thumb': [40, 40]})
+            self.assertIn('-thumb-40x40.', variant_url(product, 'thumb'))
+
+    @override_settings(SHOP_IMAGE_VARIANTS_ON_SAVE=False)
+    def test_command_builds_variants_and_invalidates_cache(self):
+        product = self.create_product()
+        url = reverse('shop:product_detail', args=[product.pk])
+        self.assertEqual(self.client.get(url).json()['thumbnail'], product.image.url)
+
+        call_command('build_image_variants', workers=1, stdout=StringIO())
+
+        product.refresh_from_db()
+        self.assertTrue(variants_are_current(product.image.name, product.image_variants))
+        self.assertEqual(self.client.get(url).json()['thumbnail'], variant_url(product, 'thumb'))
+        self.assertNotEqual(variant_url(product, 'thumb'), product.image.url)
+
+
+class ProductSearchTests(TestCase):
+
+    def setUp(self):
+        self.phones = Category.objects.create(name='Смартфоны')
+        self.books = Category.objects.create(name='Книги')
+        self.phone = Product.objects.create(name='Смартфон Нова', price='100.00', category=self.phones)
+        Product.objects.create(name='Нова: роман', price='5.00', category=self.books)
+
+    def search(self, **params):
+        return self.client.get(reverse('shop:product_search'), params)
+
+    def test_search_in_category(self):
+        data = self.search(q='нова', category=self.phones.pk).json()
+
+        self.assertEqual([product['id'] for product in data['results']], [self.phone.pk])
+
+    def test_invalid_category(self):
+        for category in ('abc', '²', '-1', str(10 ** 30)):
+            self.assertEqual(self.search(q='нова', category=category).status_code, 400)
+        self.assertEqual(self.search(q='нова', category='0').status_code, 404)
+
+
+class ProductImportTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Электроника')
+        self.phone = Product.objects.create(name='Смартфон', price='100.00', stock=3, category=self.category)
+
+    def import_jsonl(self, *lines):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', encoding='utf-8', delete=False) as stream:
+            stream.write('\n'.join(lines) + '\n')
+        self.addCleanup(os.remove, stream.name)
+        stderr = StringIO()
+        call_command('import_products', stream.name, stdout=StringIO(), stderr=stderr)
+        return stderr.getvalue()
+
+    def test_bad_lines_are_skipped_and_cached_products_refreshed(self):
+        detail_url = reverse('shop:product_detail', args=[self.phone.pk])
+        self.assertEqual(self.client.get(detail_url).json()['price'], '100.00')
+
+        errors = self.import_jsonl(
+            '{"name": "Смартфон", "category": "Электроника", "price": "90.00", "stock": 5}',
+            '{"name": "Чехол", "category": ',
+            '[]',
+            '{"name": "Чехол", "category": "Электроника", "price": "10.50"}',
+        )
+
+        self.assertIn('Строка 2', errors)
+        self.assertIn('Строка 3', errors)
+        self.assertEqual(set(Product.objects.values_list('name', 'price')),
+                         {('Смартфон', Decimal('90.00')), ('Чехол', Decimal('10.50'))})
+        self.assertEqual(self.client.get(detail_url).json()['price'], '90.00')
+
+
+    def test_price_that_does_not_fit_the_column_is_a_row_error(self):
+        errors = self.import_jsonl(
+            '{"name": "Чехол", "category": "Электроника", "price": "Infinity"}',
+            '{"name": "Кабель", "category": "Электроника", "price": "100000000.00"}',
+            '{"name": "Плёнка", "category": "Электроника", "price": "1.005"}',
+            '{"name": "Зарядка", "category": "Электроника", "price": 20.5}',
+        )
+
+        self.assertIn('Строка 1', errors)
+        self.assertIn('Строка 2', errors)
+        self.assertIn('Строка 3', errors)
+        self.assertEqual(set(Product.objects.values_list('name', flat=True)), {'Смартфон', 'Зарядка'})
+
+    def test_stock_outside_integer_range_is_a_row_error(self):
+        errors = self.import_jsonl(
+            '{"name": "Чехол", "category": "Электроника", "price": "10.50", "stock": 100000000000000000000}',
+            '{"name": "Кабель", "category": "Электроника", "price": "5.00", "stock": -1}',
+            '{"name": "Зарядка", "category": "Электроника", "price": "20.50", "stock": 7}',
+        )
+
+        self.assertIn('Строка 1', errors)
+        self.assertIn('Строка 2', errors)
+        self.assertEqual(dict(Product.objects.values_list('name', 'stock')), {'Смартфон': 3, 'Зарядка': 7})
+
+    def test_numeric_category_is_resolved_as_text(self):
+        year = Category.objects.create(name='2024')
+
+        errors = self.import_jsonl(
+            '{"name": "Календарь", "category": 2024, "price": "3.00"}',
+            '{"name": "Ежедневник", "category": 2025, "price": "4.00"}',
+        )
+
+        self.assertIn('Строка 2', errors)
+        self.assertEqual(list(Product.objects.filter(category=year).values_list('name', flat=True)), ['Календарь'])
+
+class OrderExportTests(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create(
+            username='admin', email='admin@example.com', is_staff=True, is_superuser=True, is_active=True
+        )
+        self.client.force_login(self.admin)
+        category = Category.objects.create(name='Электроника')
+        self.phone = Product.objects.create(name='Смартфон', price=Decimal('100.00'), stock=10, category=category)
+        self.case = Product.objects.create(name='Чехол', price=Decimal('10.50'), stock=10, category=category)
+        self.orders = []
+        for i in range(3):
+            order = Order.objects.create(user=self.admin)
+            OrderItem.objects.create(order=order, product=self.phone, quantity=1)
+            OrderItem.objects.create(order=order, product=self.case, quantity=2)
+            self.orders.append(order)
+
+    def test_admin_action_streams_snapshot_prices(self):
+        self.phone.price = '999.00'
+        self.phone.save()
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('admin:shop_order_changelist'), {
+                'action': 'export_csv',
+                '_selected_action': [self.orders[0].pk, self.orders[2].pk],
+            })
+            self.assertTrue(response.streaming)
+            rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        export_queries = [q for q in ctx.captured_queries if 'shop_orderitem' in q['sql']]
+
+        self.assertEqual(rows[0][0], 'order_id')
+        self.assertEqual([int(row[0]) for row in rows[1:]], [self.orders[0].pk] * 2 + [self.orders[2].pk] * 2)
+        self.assertEqual(rows[1][7:], ['Смартфон', '1', '100.00', '100.00'])
+        self.assertEqual(rows[2][9:], ['10.50', '21.00'])
+        self.assertEqual(len(export_queries), 1)
+
+
+class OrderPricingTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='buyer', email='buyer@example.com')
+        category = Category.objects.create(name='Электроника')
+        self.phone = Product.objects.create(name='Смартфон', price=Decimal('100.00'), stock=10, category=category)
+        self.case = Product.objects.create(name='Чехол', price=Decimal('10.50'), stock=10, category=category)
+        self.order = Order.objects.create(user=self.user)
+
+    def test_item_snapshots_price(self):
+        item = OrderItem.objects.create(order=self.order, product=self.phone, quantity=2)
+        Product.objects.filter(pk=self.phone.pk).update(price=Decimal('120.00'))
+
+        item = OrderItem.objects.get(pk=item.pk)
+        item.quantity = 3
+        item.save()
+        self.assertEqual((item.unit_price, item.line_total), (Decimal('100.00'), Decimal('300.00')))
+
+        # Замена товара в позиции фиксирует цену нового товара
+        item.product = self.case
+        item.save()
+        item.refresh_from_db()
+        self.assertEqual((item.unit_price, item.line_total), (Decimal('10.50'), Decimal('31.50')))
+
+    def test_update_total_price_counts_unfilled_lines(self):
+        OrderItem.objects.create(order=self.order, product=self.phone, quantity=1)
+        legacy = OrderItem.objects.create(order=self.order, product=self.case, quantity=2)
+        OrderItem.objects.filter(pk=legacy.pk).update(unit_price=None, line_total=None)
+        Product.objects.filter(pk=self.phone.pk).update(price=Decimal('120.00'))
+
+        self.order.update_total_price()
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_price, Decimal('121.00'))
+
+    def test_backfill_order_item_prices(self):
+        other = Order.objects.create(user=self.user)
+        items = [
+            OrderItem.objects.create(order=self.order, product=self.phone, quantity=1),
+            OrderItem.objects.create(order=self.order, product=self.case, quantity=2),
+            OrderItem.objects.create(order=other, product=self.case, quantity=1),
+        ]
+        OrderItem.objects.update(unit_price=None, line_total=None)
+        Order.objects.update(total_price=0)
+
+        call_command('backfill_order_item_prices', batch_size=1, stdout=StringIO())
+
+        self.assertEqual(
+            list(OrderItem.objects.filter(pk__in=[item.pk for item in items]).order_by('pk')
+                 .values_list('unit_price', 'line_total')),
+            [(Decimal('100.00'), Decimal('100.00')), (Decimal('10.50'), Decimal('21.00')),
+             (Decimal('10.50'), Decimal('10.50'))],
+        )
+        self.assertEqual(
+            dict(Order.objects.values_list('pk', 'total_price')),
+            {self.order.pk: Decimal('121.00'), other.pk: Decimal('10.50')},
+        )
+
+
+class SalesRollupTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='buyer', email='buyer@example.com')
+        self.phones = Category.objects.create(name='Смартфоны')
+        self.books = Category.objects.create(name='Книги')
+        self.phone = Product.objects.create(name='Смартфон', price=Decimal('100.00'), stock=10, category=self.phones)
+        self.case = Product.objects.create(name='Чехол', price=Decimal('10.50'), stock=10, category=self.phones)
+        self.book = Product.objects.create(name='Книга', price=Decimal('5.00'), stock=10, category=self.books)
+        self.cart = Cart.objects.create(user=self.user)
+
+    def buy(self, *lines):
+        for product, quantity in lines:
+            CartItem.objects.create(cart=self.cart, product=product, quantity=quantity)
+        with self.captureOnCommitCallbacks(execute=True):
+            return checkout(self.cart)
+
+    def rollups(self):
+        products = {
+            row.product_id: (row.units, row.revenue, row.orders) for row in DailyProductSales.objects.all()
+        }
+        categories = {
+            row.category_id: (row.units, row.revenue, row.orders) for row in DailyCategorySales.objects.all()
+        }
+        return products, categories
+
+    def test_checkout_and_cancellation_update_rollups(self):
+        first = self.buy((self.phone, 1), (self.case, 2))
+        self.buy((self.phone, 2), (self.book, 1))
+
+        products, categories = self.rollups()
+        self.assertEqual(products[self.phone.pk], (3, Decimal('300.00'), 2))
+        self.assertEqual(categories[self.phones.pk], (5, Decimal('321.00'), 2))
+        self.assertEqual(categories[self.books.pk], (1, Decimal('5.00'), 1))
+
+        first.status = Order.STATUS_CANCELLED
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save()
+        products, categories = self.rollups()
+        self.assertEqual(products[self.case.pk], (0, Decimal('0.00'), 0))
+        self.assertEqual(categories[self.phones.pk], (2, Decimal('200.00'), 1))
+
+        first.status = 'processing'
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save()
+        self.assertEqual(self.rollups()[1][self.phones.pk], (5, Decimal('321.00'), 2))
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.buy((self.phone, 1), (self.case, 2))
+        cancelled = self.buy((self.book, 3))
+        self.buy((self.case, 1))
+        cancelled.status = Order.STATUS_CANCELLED
+        with self.captureOnCommitCallbacks(execute=True):
+            cancelled.save()
+        incremental = self.rollups()
+
+        DailyProductSales.objects.all().delete()
+        DailyCategorySales.objects.all().delete()
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+
+        products, categories = self.rollups()
+        self.assertEqual(products, {key: value for key, value in incremental[0].items() if value[0]})
+        self.assertEqual(categories, {key: value for key, value in incremental[1].items() if value[0]})
+
+    def test_admin_item_change_together_with_status_change(self):
+        order = self.buy((self.phone, 1), (self.case, 2))
+        admin_user = get_user_model().objects.create(
+            username='admin', email='admin@example.com', is_staff=True, is_superuser=True, is_active=True
+        )
+        self.client.force_login(admin_user)
+        phone_line, case_line = order.items.order_by('product_id')
+
+        # Позиции меняются вместе со сменой статуса, отменой и снятием отмены
+        for status, phone_quantity in [('shipping', 3), ('cancelled', 4), ('processing', 5)]:
+            data = {
+                'user': self.user.pk, 'status': status, 'total_price': order.total_price,
+                'items-TOTAL_FORMS': 2, 'items-INITIAL_FORMS': 2, 'items-MIN_NUM_FORMS': 0, 'items-MAX_NUM_FORMS': 1000,
+            }
+            for i, (line, quantity) in enumerate([(phone_line, phone_quantity), (case_line, 2)]):
+                data.update({
+                    f'items-{i}-id': line.pk, f'items-{i}-order': order.pk,
+                    f'items-{i}-product': line.product_id, f'items-{i}-quantity': quantity,
+                })
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('admin:shop_order_change', args=[order.pk]), data)
+            self.assertEqual(response.status_code, 302)
+
+            products, categories = self.rollups()
+            call_command('rebuild_sales_rollups', stdout=StringIO())
+            self.assertEqual(self.rollups(), (
+                {key: value for key, value in products.items() if value[0]},
+                {key: value for key, value in categories.items() if value[0]},
+            ))
+        self.assertEqual(self.rollups()[0][self.phone.pk][0], 5)
+
+    def test_generated_data_is_spread_over_days_and_rolled_up(self):
+        Order.objects.all().delete()
+        call_command('generate_data', seed=1, categories=5, products=20, users=5, orders=40, reviews=10,
+                     carts=10, hot_skus=2, days=30, stdout=StringIO())
+
+        order_days = {timezone.localdate(created_at) for created_at in Order.objects.values_list('created_at', flat=True)}
+        self.assertGreater(len(order_days), 10)
+        self.assertLess(timezone.now() - min(Order.objects.values_list('created_at', flat=True)), timedelta(days=31))
+        self.assertFalse(Cart.objects.filter(updated_at__lt=F('created_at')).exists())
+        self.assertEqual(
+            DailyProductSales.objects.aggregate(total=Sum('units'))['total'],
+            OrderItem.objects.exclude(order__status=Order.STATUS_CANCELLED).aggregate(total=Sum('quantity'))['total'],
+        )
+
+
+    def test_generate_data_reruns_with_same_seed(self):
+        options = {'categories': 7, 'max_depth': 1, 'products': 10, 'users': 3, 'orders': 5, 'reviews': 5,
+                   'carts': 4, 'hot_skus': 2, 'stdout': StringIO()}
+        call_command('generate_data', seed=1, **options)
+        call_command('generate_data', seed=1, **options)
+        call_command('generate_data', seed=11, **options)
+
+        categories = Category.objects.filter(name__startswith='Категория s1-')
+        self.assertEqual(categories.count(), 14)
+        self.assertFalse(categories.filter(depth__gt=0).exists())
+        self.assertEqual(get_user_model().objects.filter(username__startswith='user_s1_').count(), 3)
+        self.assertEqual(Order.objects.filter(user__username__startswith='user_s1_').count(), 10)
+        self.assertEqual(Cart.objects.filter(session_key__startswith='s1-').count(), 4)
+        self.assertEqual(Cart.objects.filter(session_key__startswith='s11-').count(), 4)
+
+class CartDetailTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Электроника')
+        self.phone = Product.objects.create(name='Смартфон', price=Decimal('100.00'), stock=10, category=category)
+        self.case = Product.objects.create(name='Чехол', price=Decimal('10.50'), stock=10, category=category)
+        self.user = get_user_model().objects.create(username='buyer', email='buyer@example.com', is_active=True)
+
+    async def test_user_cart(self):
+        cart = await Cart.objects.acreate(user=self.user)
+        await CartItem.objects.acreate(cart=cart, product=self.phone, quantity=1)
+        await CartItem.objects.acreate(cart=cart, product=self.case, quantity=2)
+        await self.async_client.aforce_login(self.user)
+
+        data = (await self.async_client.get(reverse('shop:cart_detail'))).json()
+
+        self.assertEqual([line['product']['id'] for line in data['items']], [self.phone.pk, self.case.pk])
+        self.assertEqual((data['total_quantity'], data['total_price']), (3, '121.00'))
+
+    @override_settings(SHOP_CART_BACKEND='session')
+    def test_anonymous_session_cart(self):
+        session = self.client.session
+        session['cart'] = {str(self.case.pk): 3}
+        session.save()
+
+        data = self.client.get(reverse('shop:cart_detail')).json()
+
+        self.assertEqual((data['total_quantity'], data['total_price']), (3, '31.50'))
+        self.assertFalse(Cart.objects.exists())
+
+
+class CartUpdateTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Электроника')
+        self.phone = Product.objects.create(name='Смартфон', price=Decimal('100.00'), stock=3, category=category)
+        self.case = Product.objects.create(name='Чехол', price=Decimal('10.50'), stock=10, category=category)
+        self.user = get_user_model().objects.create(username='buyer', email='buyer@example.com', is_active=True)
+        self.client.force_login(self.user)
+
+    def post_changes(self, *changes):
+        return self.client.post(reverse('shop:cart_update'), {'changes': list(changes)}, content_type='application/json')
+
+    def test_batch_applies_changes_and_returns_summary(self):
+        self.post_changes({'op': 'add', 'product': self.case.pk, 'quantity': 1})
+
+        response = self.post_changes(
+            {'op': 'add', 'product': self.case.pk, 'quantity': 2},
+            {'op': 'add', 'product': self.phone.pk},
+            {'op': 'set', 'product': self.phone.pk, 'quantity': 2},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([(line['product']['id'], line['quantity']) for line in data['items']],
+                         [(self.phone.pk, 2), (self.case.pk, 3)])
+        self.assertEqual((data['total_quantity'], data['total_price']), (5, '231.50'))
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual(dict(cart.reservations.values_list('product', 'quantity')), {self.phone.pk: 2, self.case.pk: 3})
+
+        data = self.post_changes({'op': 'remove', 'product': self.case.pk}).json()
+        self.assertEqual([line['product']['id'] for line in data['items']], [self.phone.pk])
+        self.assertFalse(cart.reservations.filter(product=self.case).exists())
+
+    def test_shortage_rejects_whole_batch(self):
+        response = self.post_changes(
+            {'op': 'add', 'product': self.case.pk, 'quantity': 1},
+            {'op': 'set', 'product': self.phone.pk, 'quantity': 4},
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual((response.json()['product'], response.json()['available']), (self.phone.pk, 3))
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_invalid_changes(self):
+        self.assertEqual(self.post_changes({'op': 'add', 'product': 0}).status_code, 400)
+        self.assertEqual(self.post_changes({'op': 'add', 'product': self.case.pk, 'quantity': -1}).status_code, 400)
+        self.assertEqual(self.post_changes({'op': 'drop', 'product': self.case.pk}).status_code, 400)
+        self.assertEqual(self.post_changes().status_code, 400)
+        self.assertEqual(self.post_changes({'op': 'add', 'product': 10 ** 30}).status_code, 400)
+        self.assertEqual(self.post_changes({'op': 'set', 'product': self.case.pk, 'quantity': 10 ** 30}).status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_add_to_cart(self):
+        response = self.client.post(reverse('shop:add_to_cart', args=[self.case.pk]), {'quantity': '2'})
+
+        self.assertEqual(response.json()['total_quantity'], 2)
+        self.assertEqual(self.client.get(reverse('shop:add_to_cart', args=[self.case.pk])).status_code, 405)
+
+    def test_add_to_cart_rejects_invalid_input(self):
+        url = reverse('shop:add_to_cart', args=[self.case.pk])
+        for quantity in ('²', '0', '-1', '1.5', str(10 ** 30), '1' * 5000):
+            self.assertEqual(self.client.post(url, {'quantity': quantity}).status_code, 400)
+        response = self.client.post(reverse('shop:add_to_cart', args=[10 ** 30]), {'quantity': '1'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+
+    @override_settings(SHOP_CART_BACKEND='db')
+    def test_login_merges_anonymous_cart(self):
+        self.user.set_password('secret-pass')
+        self.user.save()
+        Cart.objects.get(user=self.user).items.create(product=self.case, quantity=1)
+        self.client.logout()
+        self.post_changes({'op': 'add', 'product': self.phone.pk, 'quantity': 2},
+                          {'op': 'add', 'product': self.case.pk, 'quantity': 1})
+        anonymous_cart = Cart.objects.get(user=None)
+
+        # Настоящий вход: login() меняет ключ сессии до сигнала user_logged_in
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('users:login'), {'username': 'buyer@example.com', 'password': 'secret-pass'})
+
+        cart = Cart.objects.get(user=self.user)
+        self.assertFalse(Cart.objects.filter(pk=anonymous_cart.pk).exists())
+        self.assertEqual(dict(cart.items.values_list('product', 'quantity')), {self.phone.pk: 2, self.case.pk: 2})
+        self.assertEqual(dict(cart.reservations.values_list('product', 'quantity')), {self.phone.pk: 2, self.case.pk: 2})
+        self.assertEqual(self.client.session['cart_id'], cart.pk)
+
+    @override_settings(SHOP_CART_BACKEND='db')
+    def test_cart_access_after_login_skips_merge(self):
+        self.post_changes({'op': 'add', 'product': self.case.pk, 'quantity': 1})
+
+        with mock.patch('shop.utils.merge_cart_quantities') as merge:
+            self.assertEqual(self.client.get(reverse('shop:cart_detail')).status_code, 200)
+            self.post_changes({'op': 'add', 'product': self.case.pk, 'quantity': 1})
+
+        merge.assert_not_called()
+        self.assertEqual(Cart.objects.get(user=self.user).items.get().quantity, 2)
+
+    @override_settings(SHOP_CART_BACKEND='session')
+    def test_anonymous_session_cart(self):
+        self.client.logout()
+
+        self.post_changes({'op': 'add', 'product': self.case.pk, 'quantity': 2})
+        data = self.post_changes({'op': 'set', 'product': self.case.pk, 'quantity': 1}).json()
+
+        self.assertEqual((data['total_quantity'], data['total_price']), (1, '10.50'))
+        self.assertEqual(self.client.session['cart'], {str(self.case.pk): 1})
+        self.assertFalse(Cart.objects.filter(user=None).exists())
+
+
+@override_settings(SHOP_CART_BACKEND='db')
+class CartMergeConcurrencyTests(TransactionTestCase):
+
+    def test_concurrent_logins_merge_every_anonymous_cart(self):
+        category = Category.objects.create(name='Электроника')
+        products = [
+            Product.objects.create(name=f'Товар {i}', price='9.99', stock=10, category=category) for i in range(2)
+        ]
+        user = get_user_model().objects.create(username='buyer', email='buyer@example.com', is_active=True)
+        user.set_password('secret-pass')
+        user.save()
+        clients = []
+        for product in products:
+            client = self.client_class()
+            client.post(reverse('shop:cart_update'), {'changes': [{'op': 'add', 'product': product.pk, 'quantity': 2}]},
+                        content_type='application/json')
+            clients.append(client)
+
+        barrier = threading.Barrier(len(clients))
+        statuses = []
+
+        def login(client):
+            try:
+                barrier.wait()
+                response = client.post(reverse('users:login'), {'username': 'buyer@example.com', 'password': 'secret-pass'})
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=login, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses, [302, 302])
+        cart = Cart.objects.get(user=user)
+        self.assertFalse(Cart.objects.filter(user=None).exists())
+        self.assertEqual(dict(cart.items.values_list('product', 'quantity')), {product.pk: 2 for product in products})
+        self.assertEqual(dict(cart.reservations.values_list('product', 'quantity')), {product.pk: 2 for product in products})
+
+
+class CartSummaryTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Электроника')
+        self.phone = Product.objects.create(name='Смартфон', price=Decimal('100.00'), stock=10, category=category)
+        self.case = Product.objects.create(name='Чехол', price=Decimal('10.50'), stock=10, category=category)
+
+    def post_changes(self, *changes):
+        # Сводка сбрасывается после фиксации транзакции
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('shop:cart_update'), {'changes': list(changes)}, content_type='application/json')
+
+    def summary(self, queries):
+        session = self.client.session
+        # Данные сессии загружаются заранее: считаются только запросы сводки
+        session.items()
+        with self.assertNumQueries(queries):
+            summary = get_summary(session)
+        return summary['count'], summary['subtotal']
+
+    def test_summary_is_cached_and_follows_cart_and_prices(self):
+        user = get_user_model().objects.create(username='buyer', email='buyer@example.com', is_active=True)
+        self.client.force_login(user)
+        self.post_changes({'op': 'add', 'product': self.phone.pk}, {'op': 'add', 'product': self.case.pk, 'quantity': 2})
+
+        self.assertEqual(self.summary(queries=1), (3, Decimal('121.00')))
+        self.assertEqual(self.summary(queries=0), (3, Decimal('121.00')))
+
+        self.post_changes({'op': 'remove', 'product': self.case.pk})
+        self.assertEqual(self.summary(queries=1), (1, Decimal('100.00')))
+
+        self.phone.price = Decimal('90.00')
+        self.phone.save()
+        self.assertEqual(self.summary(queries=1), (1, Decimal('90.00')))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            checkout(Cart.objects.get(user=user))
+        self.assertEqual(self.summary(queries=1), (0, Decimal('0.00')))
+
+    def test_deleted_items_refresh_summary(self):
+        user = get_user_model().objects.create(username='buyer', email='buyer@example.com', is_active=True)
+        self.client.force_login(user)
+        self.post_changes({'op': 'add', 'product': self.phone.pk}, {'op': 'add', 'product': self.case.pk, 'quantity': 2})
+        self.assertEqual(self.summary(queries=1), (3, Decimal('121.00')))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CartItem.objects.get(product=self.case).delete()
+        self.assertEqual(self.summary(queries=1), (1, Decimal('100.00')))
+
+        # Каскадное удаление позиции вместе с товаром
+        with self.captureOnCommitCallbacks(execute=True):
+            self.phone.delete()
+        self.assertEqual(self.summary(queries=1), (0, Decimal('0.00')))
+
+    def test_badge_on_warm_page_reads_only_the_session(self):
+        self.post_changes({'op': 'add', 'product': self.case.pk, 'quantity': 2})
+        self.client.get('/')
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/')
+
+        self.assertContains(response, reverse('shop:cart_detail'))
+        self.assertContains(response, '<span class="badge bg-primary">2</span>', html=True)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+    def test_badge_on_warm_page_needs_no_queries_with_cached_sessions(self):
+        self.post_changes({'op': 'add', 'product': self.case.pk, 'quantity': 2})
+        self.client.get('/')
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/')
+
+        self.assertContains(response, '<span class="badge bg-primary">2</span>', html=True)
+
+    @override_settings(SHOP_CART_BACKEND='session')
+    def test_session_cart_summary(self):
+        self.post_changes({'op': 'add', 'product': self.case.pk, 'quantity': 3})
+
+        self.assertEqual(self.summary(queries=1), (3, Decimal('31.50')))
+        self.assertFalse(Cart.objects.exists())
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class DatabaseRouterTests(SimpleTestCase):
+    router = PrimaryReplicaRouter()
+
+    def test_reads_are_split_by_model(self):
+        self.assertEqual(self.router.db_for_read(Product), 'replica')
+        self.assertEqual(self.router.db_for_read(Review), 'replica')
+        self.assertEqual(self.router.db_for_read(Cart), 'default')
+        self.assertEqual(self.router.db_for_read(get_user_model()), 'default')
+        with use_primary():
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_request_reads_from_primary_after_write(self):
+        factory = RequestFactory()
+
+        def view(request):
+            before = self.router.db_for_read(Product)
+            self.router.db_for_write(Product)
+            return HttpResponse(f'{before},{self.router.db_for_read(Product)}')
+
+        response = DatabaseStickinessMiddleware(view)(factory.get('/'))
+        self.assertEqual(response.content, b'replica,default')
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(self.router.db_for_read(Product), 'replica')
+
+        # Следующий запрос клиента, только что записавшего данные, читает из основной БД
+        request = factory.get('/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        response = DatabaseStickinessMiddleware(lambda request: HttpResponse(self.router.db_for_read(Product)))(request)
+        self.assertEqual(response.content, b'default')
+
+
+@override_settings(SQL_INSTRUMENTATION_ENABLED=True, SQL_INSTRUMENTATION_N_PLUS_ONE_THRESHOLD=3)
+class QueryInstrumentationTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Электроника')
+        self.products = [
+            Product.objects.create(name=f'Товар {i}', price='10.00', category=category) for i in range(3)
+        ]
+        self.request = RequestFactory().get('/shop/products/')
+
+    def logged_report(self, logs):
+        return json.loads(logs.records[-1].getMessage())
+
+    def test_fingerprint_normalizes_values(self):
+        self.assertEqual(
+            fingerprint('SELECT  *\n FROM t WHERE id IN (%s, %s, %s) AND name = \'x\' LIMIT 21'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s) AND name = \'y\' LIMIT 1'),
+        )
+        self.assertEqual(
+            fingerprint('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)'),
+            'INSERT INTO t (a, b) VALUES (?, ...), ...',
+        )
+
+    def test_sync_view_reports_duplicates_and_n_plus_one(self):
+        def view(request):
+            for product in self.products:
+                Product.objects.filter(pk=product.pk).first()
+            Category.objects.count()
+            Category.objects.count()
+            return HttpResponse()
+
+        with self.assertLogs('onlinestore.sql', 'INFO') as logs:
+            response = QueryInstrumentationMiddleware(view)(self.request)
+
+        self.assertEqual(response['X-DB-Query-Count'], '5')
+        self.assertEqual(response['X-DB-Duplicate-Queries'], '1')
+        self.assertEqual(response['X-DB-N-Plus-One'], '1')
+        report = self.logged_report(logs)
+        self.assertEqual(logs.records[-1].levelname, 'WARNING')
+        self.assertEqual([query['repeats'] for query in report['duplicate_queries']], [1])
+        self.assertIn('COUNT(*)', report['duplicate_queries'][0]['sql'])
+        self.assertEqual(report['n_plus_one'][0]['count'], 3)
+        self.assertEqual(len(report['n_plus_one'][0]['fingerprint']), 16)
+
+    async def test_async_view(self):
+        async def view(request):
+            await Product.objects.acount()
+            await Category.objects.acount()
+            return HttpResponse()
+
+        middleware = QueryInstrumentationMiddleware(view)
+        with self.assertLogs('onlinestore.sql', 'INFO'):
+            response = await middleware(self.request)
+
+        self.assertEqual(response['X-DB-Query-Count'], '2')
+
+        # Весь стек middleware под ASGI: запросы асинхронного представления каталога учтены
+        cache.clear()
+        with self.assertLogs('onlinestore.sql', 'INFO'):
+            response = await self.async_client.get(reverse('shop:product_list'))
+        self.assertGreater(int(response['X-DB-Query-Count']), 0)
+
+    def test_streaming_response_counts_queries_while_consumed(self):
+        def rows():
+            for product in self.products:
+                yield Product.objects.filter(pk=product.pk).values_list('name', flat=True).get()
+
+        def view(request):
+            Category.objects.count()
+            return StreamingHttpResponse(rows())
+
+        with self.assertLogs('onlinestore.sql', 'INFO') as logs:
+            response = QueryInstrumentationMiddleware(view)(self.request)
+            self.assertFalse(logs.records)
+            content = b''.join(response.streaming_content)
+
+        self.assertEqual(content.decode(), 'Товар 0Товар 1Товар 2')
+        self.assertNotIn('X-DB-Query-Count', response)
+        report = self.logged_report(logs)
+        self.assertEqual((report['queries'], report['streaming']), (4, True))
+        self.assertEqual(report['n_plus_one'][0]['count'], 3)
@@ -1,10 +1,20 @@
 from django.conf import settings
 from django.conf.urls.static import static
+from django.urls import path
+
+from shop.views import add_to_cart, cart_detail, cart_update, product_detail, product_list, product_search
 
 app_name = 'shop'
 
 # Список товаров
-urlpatterns = []
+urlpatterns = [
+    path('products/', product_list, name='product_list'),
+    path('products/search/', product_search, name='product_search'),
+    path('products/<int:product_id>/', product_detail, name='product_detail'),
+    path('cart/', cart_detail, name='cart_detail'),
+    path('cart/changes/', cart_update, name='cart_update'),
+    path('cart/add/<int:product_id>/', add_to_cart, name='add_to_cart'),
+]
 
 # Добавляем возможность отображения изображений
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,34 +1,163 @@
-from shop.models import Cart
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from shop import cart_summary, reservations
+from shop.models import Cart, CartItem, fold_cart_changes
+
+# Ключ сессии, под которым SessionCart хранит {product_id: quantity}
+SESSION_CART_KEY = 'cart'
+
+CART_BACKEND_DB = 'db'
+CART_BACKEND_SESSION = 'session'
+
+
+def get_cart_backend():
+    """
+    Способ хранения корзин анонимных посетителей (настройка SHOP_CART_BACKEND):
+    'db' — строки Cart/CartItem по ключу сессии, 'session' — только в сессии.
+    """
+    return getattr(settings, 'SHOP_CART_BACKEND', CART_BACKEND_DB)
+
+
+class SessionCart:
+    """
+    Корзина анонимного посетителя, целиком хранящаяся в сессии.
+
+    Не создаёт строк в БД: при хранении сессий в подписанной cookie
+    (SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies')
+    корзина вообще не требует записи на сервере. Строки Cart/CartItem
+    появляются только при входе пользователя, когда корзина сливается
+    с его корзиной в БД. Повторяет методы изменения корзины модели Cart,
+    но товар не резервирует: резерв ставится при слиянии с корзиной в БД.
+    """
+
+    pk = None
+    user_id = None
+
+    def __init__(self, session):
+        self.session = session
+
+    def __str__(self):
+        return f'Session cart (session={self.session.session_key})'
+
+    def quantities(self):
+        return {int(product_id): quantity for product_id, quantity in self.session.get(SESSION_CART_KEY, {}).items()}
+
+    def _store(self, quantities):
+        self.session[SESSION_CART_KEY] = {
+            str(product_id): quantity for product_id, quantity in quantities.items() if quantity > 0
+        }
+        self.session.pop(cart_summary.SESSION_SUMMARY_KEY, None)
+
+    def add(self, product_id, quantity=1):
+        quantities = self.quantities()
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+        self._store(quantities)
+
+    def set_quantity(self, product_id, quantity):
+        quantities = self.quantities()
+        quantities[product_id] = quantity
+        self._store(quantities)
+
+    def remove(self, product_id):
+        quantities = self.quantities()
+        quantities.pop(product_id, None)
+        self._store(quantities)
+
+    def apply(self, changes):
+        """Применяет пачку изменений [(операция, product_id, quantity), ...] (см. fold_cart_changes)."""
+        quantities = self.quantities()
+        for product_id, (absolute, amount) in fold_cart_changes(changes).items():
+            quantities[product_id] = amount if absolute else quantities.get(product_id, 0) + amount
+        self._store(quantities)
+
+    def clear(self):
+        self.session.pop(SESSION_CART_KEY, None)
+        self.session.pop(cart_summary.SESSION_SUMMARY_KEY, None)
+
+
+def merge_cart_quantities(cart, quantities):
+    """
+    Добавляет в корзину товары из словаря {product_id: quantity}.
+
+    Выполняется фиксированным числом запросов вне зависимости от количества позиций:
+    одна выборка текущих количеств и один bulk upsert по уникальному ключу
+    (cart, product). Резерв новых количеств ставится по возможности (partial):
+    вход пользователя не должен срываться из-за нехватки товара, остаток
+    всё равно проверяется при оформлении заказа. Вызывать внутри транзакции,
+    заблокировав строку корзины.
+    """
+    if not quantities:
+        return
+    existing = dict(cart.items.filter(product_id__in=quantities).values_list('product_id', 'quantity'))
+    totals = {product_id: existing.get(product_id, 0) + quantity for product_id, quantity in quantities.items()}
+    reservations.reserve(cart, totals, partial=True)
+    CartItem.objects.bulk_create(
+        [CartItem(cart=cart, product_id=product_id, quantity=quantity) for product_id, quantity in totals.items()],
+        update_conflicts=True,
+        unique_fields=['cart', 'product'],
+        update_fields=['quantity'],
+    )
+    cart.save(update_fields=['updated_at'])
+    cart_summary.invalidate(cart.pk)
 
 
 def get_or_create_cart(request):
     """
     Получает существующую или создает новую корзину для пользователя.
     Для авторизованных пользователей привязывает корзину к аккаунту.
-    Для неавторизованных пользователей создает сессионную корзину.
+    Для неавторизованных пользователей создает сессионную корзину: строку Cart
+    по ключу сессии или, при SHOP_CART_BACKEND = 'session', объект SessionCart.
     При авторизации объединяет товары из сессионной корзины с корзиной пользователя.
     """
 
     if request.user.is_authenticated:
         cart, created = Cart.objects.get_or_create(user=request.user)
         # Если у сессионной корзины есть товары — объединяем:
-        session_key = request.session.session_key
-        if session_key:
-            try:
-                session_cart = Cart.objects.get(session_key=session_key, user=None)
-                for item in session_cart.items.all():
-                    existing = cart.items.filter(product=item.product).first()
-                    if existing:
-                        existing.quantity += item.quantity
-                        existing.save()
-                    else:
-                        item.cart = cart
-                        item.save()
-                session_cart.delete()
-            except Cart.DoesNotExist:
-                pass
+        quantities = SessionCart(request.session).quantities()
+        # login() меняет ключ сессии (cycle_key) до сигнала входа, поэтому сессионная
+        # корзина ищется по id, запомненному в данных сессии. После слияния там лежит
+        # id корзины пользователя, и обычные обращения к корзине обходятся без транзакции
+        session_cart_id = request.session.get(cart_summary.CART_ID_SESSION_KEY)
+        if session_cart_id == cart.pk:
+            session_cart_id = None
+        if session_cart_id or quantities:
+            with transaction.atomic():
+                # Первая операция транзакции — запись в строку корзины пользователя (как
+                # в checkout): параллельные входы одного пользователя выполняют слияние
+                # строго по очереди, а SQLite сразу берёт блокировку на запись, не допуская
+                # взаимоблокировки при повышении уровня блокировки
+                Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+                session_carts = Cart.objects.none()
+                if session_cart_id:
+                    session_carts = Cart.objects.select_for_update().filter(pk=session_cart_id, user=None)
+                for session_cart in session_carts:
+                    for product_id, quantity in session_cart.items.values_list('product_id', 'quantity'):
+                        quantities[product_id] = quantities.get(product_id, 0) + quantity
+                    # Удаляем до слияния: резервы сессионной корзины переходят корзине пользователя
+                    session_cart.delete()
+                merge_cart_quantities(cart, quantities)
+            SessionCart(request.session).clear()
+    elif get_cart_backend() == CART_BACKEND_SESSION:
+        cart = SessionCart(request.session)
     else:
         if not request.session.session_key:
             request.session.create()
         cart, _ = Cart.objects.get_or_create(session_key=request.session.session_key, user=None)
-    return cart
\ No newline at end of file
+    if cart.pk is not None:
+        # Бейдж корзины в шапке находит её сводку по id из сессии, не обращаясь к БД
+        cart_summary.remember_cart(request.session, cart)
+    return cart
+
+
+async def aget_or_create_cart(request):
+    """
+    Асинхронный вариант get_or_create_cart для async-представлений.
+
+    Пользователь загружается через request.auser() и подставляется в request.user,
+    сама корзина (сессия, блокировки и слияние в транзакции) получается в синхронном потоке.
+    """
+    request.user = await request.auser()
+    return await sync_to_async(get_or_create_cart)(request)
@@ -1,8 +1,291 @@
-from django.shortcuts import render
+import json
+import re
 
-from shop.utils import get_or_create_cart
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse
+from django.shortcuts import aget_object_or_404
+from django.views.decorators.http import require_GET, require_POST
 
+from shop import cache as catalog_cache
+from shop.images import variant_url
+from shop.models import CART_ADD, CART_OPERATIONS, CartItem, Category, Product
+from shop.pagination import InvalidCursor, apaginate_keyset, decode_cursor
+from shop.reservations import InsufficientStockError
+from shop.search import get_search_backend
+from shop.utils import aget_or_create_cart
 
-def add_to_cart(request, product_id):
-    cart = get_or_create_cart(request)
-    # Далее: добавление товара в cart.items
\ No newline at end of file
+"""
+Представления каталога и корзины асинхронные: запросы к БД выполняются через
+асинхронный API ORM, кеш — через асинхронный API кеша, поэтому под ASGI один
+воркер обслуживает много медленных клиентов одновременно.
+"""
+
+CATALOG_PAGE_SIZE = 20
+CATALOG_MAX_PAGE_SIZE = 100
+
+# Наибольший id: первичные ключи — 64-битные целые со знаком (SQLite INTEGER, bigint)
+MAX_ID = 2 ** 63 - 1
+
+_DIGITS = re.compile(r'[0-9]+')
+
+
+def product_to_dict(product):
+    return {
+        'id': product.pk,
+        'name': product.name,
+        'price': str(product.price),
+        'stock': product.stock,
+        'category_id': product.category_id,
+        'rating_avg': product.rating_avg,
+        'rating_count': product.rating_count,
+        'image': product.image.url if product.image else None,
+        'thumbnail': variant_url(product, 'thumb'),
+        'created_at': product.created_at.isoformat(),
+    }
+
+
+def parse_limit(request):
+    """Размер страницы из GET-параметра limit или None, если он некорректен."""
+    try:
+        limit = int(request.GET.get('limit', CATALOG_PAGE_SIZE))
+    except ValueError:
+        return None
+    return min(limit, CATALOG_MAX_PAGE_SIZE) if limit > 0 else None
+
+
+def parse_int(value, maximum):
+    """
+    Неотрицательное целое из строкового параметра запроса или None, если это
+    не число или оно больше maximum. Принимает только ASCII-цифры: str.isdigit()
+    пропускает, например, '²', на котором int() падает.
+    """
+    if len(value) > len(str(maximum)) or not _DIGITS.fullmatch(value):
+        return None
+    number = int(value)
+    return number if number <= maximum else None
+
+
+def parse_id(value):
+    """id из строкового параметра запроса или None, если это не целое число в диапазоне первичных ключей."""
+    return parse_int(value, MAX_ID)
+
+
+@require_GET
+async def product_list(request):
+    """
+    Каталог товаров (JSON) с keyset-пагинацией.
+
+    GET-параметры:
+        category: id категории — товары категории и всех её подкатегорий
+        cursor: курсор следующей страницы из поля ``next`` предыдущего ответа
+        limit: размер страницы (не больше CATALOG_MAX_PAGE_SIZE)
+    """
+    limit = parse_limit(request)
+    if limit is None:
+        return JsonResponse({'error': 'Некорректный параметр limit.'}, status=400)
+
+    category_id = None
+    if category := request.GET.get('category'):
+        category_id = parse_id(category)
+        if category_id is None:
+            return JsonResponse({'error': 'Некорректный параметр category.'}, status=400)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except InvalidCursor:
+            return JsonResponse({'error': 'Некорректный курсор.'}, status=400)
+
+    async def build():
+        products = Product.objects.all()
+        if category_id is not None:
+            category = await Category.objects.only('path').filter(pk=category_id).afirst()
+            if category is None:
+                return None
+            products = products.in_category_subtree(category)
+        page, next_cursor = await apaginate_keyset(products, cursor, limit)
+        return {'results': [product_to_dict(product) for product in page], 'next': next_cursor}
+
+    # Тёплый запрос обслуживается целиком из кеша, без обращений к БД
+    scope = catalog_cache.CATALOG_SCOPE if category_id is None else catalog_cache.CATEGORY_SCOPE
+    scopes = [(scope, category_id)]
+    payload = await catalog_cache.acached_payload(
+        'product_list', scopes, {'category': category_id, 'cursor': cursor, 'limit': limit}, build
+    )
+    if payload is None:
+        raise Http404
+    return JsonResponse(payload)
+
+
+@require_GET
+async def product_detail(request, product_id):
+    """
+    Карточка товара (JSON) с гистограммой оценок.
+    """
+    async def build():
+        product = await Product.objects.filter(pk=product_id).afirst()
+        if product is None:
+            return None
+        return {
+            **product_to_dict(product),
+            'description': product.description,
+            'medium_image': variant_url(product, 'medium'),
+            'rating_histogram': product.rating_histogram,
+        }
+
+    payload = await catalog_cache.acached_payload(
+        'product_detail', [(catalog_cache.PRODUCT_SCOPE, product_id)], {}, build
+    )
+    if payload is None:
+        raise Http404
+    return JsonResponse(payload)
+
+
+@require_GET
+async def product_search(request):
+    """
+    Полнотекстовый поиск товаров (JSON), результаты упорядочены по релевантности.
+
+    GET-параметры:
+        q: поисковый запрос
+        category: id категории — искать только в категории и её подкатегориях
+        limit: количество результатов (не больше CATALOG_MAX_PAGE_SIZE)
+    """
+    limit = parse_limit(request)
+    if limit is None:
+        return JsonResponse({'error': 'Некорректный параметр limit.'}, status=400)
+
+    category = None
+    if category_id := request.GET.get('category'):
+        category_id = parse_id(category_id)
+        if category_id is None:
+            return JsonResponse({'error': 'Некорректный параметр category.'}, status=400)
+        category = await aget_object_or_404(Category.objects.only('path'), pk=category_id)
+
+    # Бэкенды поиска работают через курсор БД напрямую, поэтому вызываются в синхронном потоке
+    search = sync_to_async(get_search_backend().search)
+    products = await search(request.GET.get('q', ''), category=category, limit=limit)
+    return JsonResponse({'results': [product_to_dict(product) for product in products]})
+
+
+CART_MAX_CHANGES = 100
+# Наибольшее количество одного товара в одном изменении корзины
+CART_MAX_QUANTITY = 9999
+
+
+async def cart_payload(cart):
+    """Содержимое корзины (JSON): позиции, количество и сумма."""
+    if cart.pk is None:
+        quantities = cart.quantities()
+    else:
+        items = CartItem.objects.filter(cart_id=cart.pk).values_list('product_id', 'quantity')
+        quantities = {product_id: quantity async for product_id, quantity in items}
+
+    lines = []
+    total_price = 0
+    async for product in Product.objects.filter(pk__in=quantities).order_by('pk'):
+        quantity = quantities[product.pk]
+        total_price += product.price * quantity
+        lines.append({
+            'product': product_to_dict(product),
+            'quantity': quantity,
+            'total_price': str(product.price * quantity),
+        })
+    return {
+        'items': lines,
+        'total_quantity': sum(line['quantity'] for line in lines),
+        'total_price': f'{total_price:.2f}',
+    }
+
+
+def parse_cart_changes(data):
+    """
+    Изменения корзины из тела запроса
+    {"changes": [{"op": "add" | "set" | "remove", "product": id, "quantity": n}, ...]}
+    в виде [(операция, product_id, quantity), ...]. Для add quantity по умолчанию 1.
+
+    Raises:
+        ValueError: тело запроса некорректно
+    """
+    changes = data.get('changes') if isinstance(data, dict) else None
+    if not isinstance(changes, list) or not changes:
+        raise ValueError('Ожидается непустой список changes.')
+    if len(changes) > CART_MAX_CHANGES:
+        raise ValueError(f'Не больше {CART_MAX_CHANGES} изменений за запрос.')
+
+    parsed = []
+    for change in changes:
+        if not isinstance(change, dict) or change.get('op') not in CART_OPERATIONS:
+            raise ValueError(f'Операция должна быть одной из: {", ".join(CART_OPERATIONS)}.')
+        product_id = change.get('product')
+        quantity = change.get('quantity', 1 if change['op'] == CART_ADD else 0)
+        if type(product_id) is not int or type(quantity) is not int:
+            raise ValueError('product и quantity должны быть целыми числами.')
+        if not 0 < product_id <= MAX_ID:
+            raise ValueError('Некорректный id товара.')
+        if not 0 <= quantity <= CART_MAX_QUANTITY or (change['op'] == CART_ADD and quantity == 0):
+            raise ValueError('Некорректное количество товара.')
+        parsed.append((change['op'], product_id, quantity))
+    return parsed
+
+
+async def apply_cart_changes(request, changes):
+    """
+    Применяет изменения к корзине посетителя и возвращает ответ с её новым
+    содержимым: корзина находится один раз на всю пачку изменений.
+    """
+    product_ids = {product_id for _, product_id, _ in changes}
+    known = {pk async for pk in Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True)}
+    if unknown := sorted(product_ids - known):
+        return JsonResponse({'error': 'Товары не найдены.', 'products': unknown}, status=400)
+
+    cart = await aget_or_create_cart(request)
+    try:
+        # Изменения выполняются одной транзакцией, а сессия — синхронный объект
+        await sync_to_async(cart.apply)(changes)
+    except InsufficientStockError as exc:
+        return JsonResponse(
+            {'error': 'Недостаточно товара на складе.', 'product': exc.product_id, 'available': exc.available},
+            status=409,
+        )
+    return JsonResponse(await cart_payload(cart))
+
+
+@require_GET
+async def cart_detail(request):
+    """
+    Содержимое корзины текущего посетителя (JSON): позиции, количество и сумма.
+    """
+    cart = await aget_or_create_cart(request)
+    return JsonResponse(await cart_payload(cart))
+
+
+@require_POST
+async def cart_update(request):
+    """
+    Пачка изменений корзины одним запросом (JSON): добавление, установка
+    количества и удаление позиций. Изменения применяются все вместе или
+    ни одно; в ответе — новое содержимое корзины, как у cart_detail.
+
+    Ответы с ошибкой: 400 — некорректное тело запроса или неизвестный товар,
+    409 — товара не хватает с учётом резервов других корзин.
+    """
+    try:
+        changes = parse_cart_changes(json.loads(request.body))
+    except (ValueError, UnicodeDecodeError) as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return await apply_cart_changes(request, changes)
+
+
+@require_POST
+async def add_to_cart(request, product_id):
+    """
+    Добавляет товар в корзину (POST-параметр quantity, по умолчанию 1)
+    и возвращает её новое содержимое.
+    """
+    if product_id > MAX_ID:
+        return JsonResponse({'error': 'Некорректный id товара.'}, status=400)
+    quantity = parse_int(request.POST.get('quantity', '1'), CART_MAX_QUANTITY)
+    if not quantity:
+        return JsonResponse({'error': 'Некорректное количество товара.'}, status=400)
+    return await apply_cart_changes(request, [(CART_ADD, product_id, quantity)])
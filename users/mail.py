@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.mail import EmailMessage
+
+from .models import OutgoingEmail
+
+"""
+Постановка писем в очередь и их сборка для отправки.
+"""
+
+
+def queue_email(subject, body, to, from_email=None):
+    """
+    Ставит письмо в очередь на отправку вместо синхронной отправки в запросе.
+
+    Args:
+        subject: Тема письма
+        body: Текст письма
+        to: Список адресов получателей
+        from_email: Адрес отправителя (по умолчанию DEFAULT_FROM_EMAIL)
+
+    Returns:
+        OutgoingEmail: письмо в очереди
+    """
+    return OutgoingEmail.objects.create(subject=subject, body=body, to=list(to), from_email=from_email or '')
+
+
+async def aqueue_email(subject, body, to, from_email=None):
+    """
+    Асинхронный вариант queue_email для async-представлений.
+    """
+    return await OutgoingEmail.objects.acreate(subject=subject, body=body, to=list(to), from_email=from_email or '')
+
+
+def contact_notification_recipients():
+    """
+    Адреса для уведомлений о сообщениях с формы обратной связи:
+    CONTACT_NOTIFICATION_EMAILS, а если не заданы — адреса из ADMINS.
+    """
+    recipients = getattr(settings, 'CONTACT_NOTIFICATION_EMAILS', None)
+    if recipients is None:
+        recipients = [email for _, email in settings.ADMINS]
+    return list(recipients)
+
+
+def build_message(email, connection=None):
+    """
+    Собирает EmailMessage для письма из очереди.
+    """
+    return EmailMessage(
+        email.subject,
+        email.body,
+        from_email=email.from_email or settings.DEFAULT_FROM_EMAIL,
+        to=email.to,
+        connection=connection,
+    )
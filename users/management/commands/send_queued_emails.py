@@ -0,0 +1,133 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, transaction
+from django.utils import timezone
+
+from users.mail import build_message
+from users.models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Обработчик очереди исходящих писем.
+
+    Забирает из очереди пачку готовых к отправке писем, «арендуя» их условным
+    UPDATE со сдвигом next_attempt_at (параллельные обработчики не возьмут те же письма),
+    и отправляет их через одно переиспользуемое соединение почтового бэкенда.
+    Неудачные письма откладываются с экспоненциально растущей паузой, после
+    max_attempts попыток помечаются как failed. По каждой пачке пишутся метрики.
+    """
+
+    help = 'Отправляет письма из очереди пачками через одно SMTP-соединение'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Количество писем в одной пачке')
+        parser.add_argument('--max-attempts', type=int, default=5, help='Количество попыток до статуса failed')
+        parser.add_argument('--backoff', type=int, default=60, help='Базовая пауза перед повтором, секунд')
+        parser.add_argument('--lease', type=int, default=300, help='На сколько секунд пачка закрепляется за обработчиком')
+        parser.add_argument('--loop', action='store_true', help='Не завершаться, а ждать новые письма')
+        parser.add_argument('--interval', type=float, default=5, help='Пауза между опросами очереди в режиме --loop, секунд')
+
+    def handle(self, *args, **options):
+        totals = {'sent': 0, 'retried': 0, 'failed': 0}
+        connection = get_connection()
+        try:
+            while True:
+                try:
+                    batch = self.claim_batch(options['batch_size'], options['lease'])
+                except OperationalError as exc:
+                    # Например, «database is locked» на SQLite: в режиме --loop повторяем позже
+                    if not options['loop']:
+                        raise
+                    logger.warning('email outbox: не удалось забрать пачку: %s', exc)
+                    time.sleep(options['interval'])
+                    continue
+                if batch:
+                    stats = self.send_batch(connection, batch, options['max_attempts'], options['backoff'])
+                    for key in totals:
+                        totals[key] += stats[key]
+                elif options['loop']:
+                    time.sleep(options['interval'])
+                else:
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connection.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Отправлено: {totals['sent']}, отложено: {totals['retried']}, с ошибкой: {totals['failed']}"
+        ))
+
+    def claim_batch(self, batch_size, lease):
+        """
+        Закрепляет за обработчиком пачку писем и возвращает закреплённые письма.
+
+        Кандидаты выбираются без блокировок, а закрепляются одним условным UPDATE:
+        он сдвигает next_attempt_at только у писем, которые всё ещё ждут отправки
+        и не закреплены другим обработчиком. Новое значение next_attempt_at служит
+        отметкой аренды: в той же транзакции читаются только письма с ней, то есть
+        обновлённые именно этим UPDATE. В отличие от SELECT ... FOR UPDATE SKIP LOCKED
+        это работает и на SQLite.
+        """
+        now = timezone.now()
+        leased_until = now + timedelta(seconds=lease)
+        ready = OutgoingEmail.objects.filter(status=OutgoingEmail.STATUS_PENDING, next_attempt_at__lte=now)
+        candidates = self.candidate_ids(ready, batch_size)
+        if not candidates:
+            return []
+        with transaction.atomic():
+            if not ready.filter(pk__in=candidates).update(next_attempt_at=leased_until):
+                return []
+            return list(
+                OutgoingEmail.objects.filter(
+                    pk__in=candidates, status=OutgoingEmail.STATUS_PENDING, next_attempt_at=leased_until
+                ).order_by('pk')
+            )
+
+    def candidate_ids(self, ready, batch_size):
+        return list(ready.order_by('next_attempt_at').values_list('pk', flat=True)[:batch_size])
+
+    def send_batch(self, connection, batch, max_attempts, backoff):
+        started = time.monotonic()
+        stats = {'sent': 0, 'retried': 0, 'failed': 0}
+        sent, retried = [], []
+
+        for email in batch:
+            try:
+                connection.open()
+                connection.send_messages([build_message(email, connection)])
+            except Exception as exc:
+                # Соединение могло оборваться — следующее письмо откроет новое
+                connection.close()
+                email.attempts += 1
+                email.last_error = str(exc)
+                if email.attempts >= max_attempts:
+                    email.status = OutgoingEmail.STATUS_FAILED
+                    stats['failed'] += 1
+                else:
+                    email.next_attempt_at = timezone.now() + timedelta(seconds=backoff * 2 ** (email.attempts - 1))
+                    stats['retried'] += 1
+                retried.append(email)
+            else:
+                email.status = OutgoingEmail.STATUS_SENT
+                email.sent_at = timezone.now()
+                stats['sent'] += 1
+                sent.append(email)
+
+        OutgoingEmail.objects.bulk_update(sent, ['status', 'sent_at'])
+        OutgoingEmail.objects.bulk_update(retried, ['status', 'attempts', 'last_error', 'next_attempt_at'])
+
+        elapsed = time.monotonic() - started
+        logger.info(
+            'email outbox batch: size=%d sent=%d retried=%d failed=%d elapsed=%.3fs rate=%.1f/s',
+            len(batch), stats['sent'], stats['retried'], stats['failed'], elapsed,
+            len(batch) / elapsed if elapsed else 0,
+        )
+        return stats
@@ -1,6 +1,7 @@
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -69,4 +70,56 @@ class Message(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата отправки")
 
     def __str__(self):
-        return f"Сообщение от {self.name}"
\ No newline at end of file
+        return f"Сообщение от {self.name}"
+
+
+class OutgoingEmail(models.Model):
+    """
+    Письмо в очереди на отправку (outbox).
+
+    Представления не отправляют письма сами, а только ставят их в очередь;
+    доставкой занимается команда send_queued_emails, которая отправляет письма
+    пачками через одно SMTP-соединение и повторяет неудачные попытки с нарастающей паузой.
+
+    Attributes:
+        subject (CharField): Тема письма
+        body (TextField): Текст письма
+        from_email (CharField): Адрес отправителя (пустой — DEFAULT_FROM_EMAIL)
+        to (JSONField): Список адресов получателей
+        status (CharField): Состояние письма в очереди
+        attempts (PositiveSmallIntegerField): Количество неудачных попыток отправки
+        next_attempt_at (DateTimeField): Время, не раньше которого письмо можно отправлять
+        last_error (TextField): Текст последней ошибки отправки
+        created_at (DateTimeField): Дата и время постановки в очередь
+        sent_at (DateTimeField): Дата и время успешной отправки
+    """
+
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Ожидает отправки'),
+        (STATUS_SENT, 'Отправлено'),
+        (STATUS_FAILED, 'Ошибка отправки'),
+    ]
+
+    subject = models.CharField(max_length=255, verbose_name='Тема')
+    body = models.TextField(verbose_name='Текст')
+    from_email = models.CharField(max_length=254, blank=True, verbose_name='Отправитель')
+    to = models.JSONField(default=list, verbose_name='Получатели')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name='Статус')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name='Следующая попытка')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата отправки')
+
+    class Meta:
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Исходящие письма'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outgoing_email_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {', '.join(self.to)}"
@@ -1,3 +1,107 @@
-from django.test import TestCase
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .mail import queue_email
+from .management.commands.send_queued_emails import Command as SendQueuedEmailsCommand
+from .models import Message, OutgoingEmail
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError('SMTP недоступен')
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class EmailOutboxTests(TestCase):
+
+    def test_register_queues_activation_email_instead_of_sending(self):
+        response = self.client.post(reverse('users:register'), {
+            'username': 'newuser',
+            'email': 'newuser@example.com',
+            'password1': 'S3cure-passw0rd',
+            'password2': 'S3cure-passw0rd',
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.to, ['newuser@example.com'])
+        self.assertEqual(email.status, OutgoingEmail.STATUS_PENDING)
+
+    @override_settings(CONTACT_NOTIFICATION_EMAILS=['support@example.com'])
+    async def test_contact_form_saves_message_and_queues_notification(self):
+        response = await self.async_client.post(reverse('users:send_message'), {
+            'name': 'Иван',
+            'email': 'ivan@example.com',
+            'text': 'Когда будет доставка?',
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(await Message.objects.filter(email='ivan@example.com').aexists())
+        email = await OutgoingEmail.objects.aget()
+        self.assertEqual(email.to, ['support@example.com'])
+        self.assertIn('Когда будет доставка?', email.body)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_worker_sends_queued_emails_in_batches(self):
+        for i in range(5):
+            queue_email(f'Письмо {i}', 'Текст', [f'user{i}@example.com'])
+
+        call_command('send_queued_emails', batch_size=2, stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertFalse(OutgoingEmail.objects.exclude(status=OutgoingEmail.STATUS_SENT).exists())
+
+    @override_settings(EMAIL_BACKEND='users.tests.FailingEmailBackend')
+    def test_failed_delivery_is_retried_with_backoff_then_marked_failed(self):
+        email = queue_email('Письмо', 'Текст', ['user@example.com'])
+
+        call_command('send_queued_emails', max_attempts=2, backoff=60, stdout=StringIO())
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutgoingEmail.STATUS_PENDING, 1))
+        self.assertIn('SMTP недоступен', email.last_error)
+
+        OutgoingEmail.objects.update(next_attempt_at=email.created_at)
+        call_command('send_queued_emails', max_attempts=2, backoff=60, stdout=StringIO())
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutgoingEmail.STATUS_FAILED, 2))
+
+    def test_worker_skips_emails_claimed_by_another_worker(self):
+        emails = [queue_email(f'Письмо {i}', 'Текст', [f'user{i}@example.com']) for i in range(3)]
+
+        class RacingCommand(SendQueuedEmailsCommand):
+            def candidate_ids(self, ready, batch_size):
+                ids = super().candidate_ids(ready, batch_size)
+                # Другой обработчик успел забрать и отправить первое письмо
+                OutgoingEmail.objects.filter(pk=emails[0].pk).update(status=OutgoingEmail.STATUS_SENT)
+                return ids
+
+        batch = RacingCommand().claim_batch(batch_size=10, lease=300)
+
+        self.assertEqual([email.pk for email in batch], [emails[1].pk, emails[2].pk])
+        self.assertEqual(SendQueuedEmailsCommand().claim_batch(batch_size=10, lease=300), [])
+
+    def test_loop_retries_after_database_error(self):
+        queue_email('Письмо', 'Текст', ['user@example.com'])
+        claim_batch = SendQueuedEmailsCommand.claim_batch
+        calls = []
+
+        def flaky_claim_batch(command, batch_size, lease):
+            calls.append(batch_size)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            if len(calls) == 3:
+                raise KeyboardInterrupt
+            return claim_batch(command, batch_size, lease)
+
+        with mock.patch.object(SendQueuedEmailsCommand, 'claim_batch', flaky_claim_batch):
+            call_command('send_queued_emails', loop=True, interval=0, stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 1)
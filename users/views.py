@@ -1,11 +1,10 @@
-from django.conf import settings
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.tokens import default_token_generator
 from django.contrib.sites.shortcuts import get_current_site
-from django.core.mail import EmailMessage, send_mail
 from django.http import HttpResponse
 from django.shortcuts import render, redirect
 from django.template.loader import render_to_string
@@ -14,6 +13,7 @@ from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 
 from .forms import RegistrationForm, LoginForm, MessageForm, ProfileForm
+from .mail import aqueue_email, contact_notification_recipients, queue_email
 from .models import CustomUser
 
 
@@ -37,7 +37,7 @@ def register(request):
             user.save()
 
             # Генерация токена для подтверждения email
-            # Отправка письма
+            # Постановка письма в очередь (отправляет команда send_queued_emails)
             current_site = get_current_site(request)
             mail_subject = 'Активация аккаунта на нашем сайте'
             message = render_to_string('users/activation_email.html', {
@@ -47,8 +47,7 @@ def register(request):
                 'token': default_token_generator.make_token(user),
             })
             to_email = form.cleaned_data.get('email')
-            email = EmailMessage(mail_subject, message, to=[to_email])
-            email.send()
+            queue_email(mail_subject, message, [to_email])
 
             return render(request, "users/registration_success.html", {"username": user.username})
     else:
@@ -105,20 +104,32 @@ def login_view(request):
 
     return render(request, 'users/login.html', {'form': form})
 
-def send_message_view(request):
+async def send_message_view(request):
     """
     Отправка сообщений
+
+    Сообщение сохраняется и уведомление ставится в очередь писем асинхронными
+    запросами ORM, поэтому представление не занимает поток на время работы с БД.
     """
     if request.method == "POST":
         form = MessageForm(request.POST)
         if form.is_valid():
-            form.save()
+            message = form.instance
+            await message.asave()
+            recipients = contact_notification_recipients()
+            if recipients:
+                await aqueue_email(
+                    subject=f"Новое сообщение от {message.name}",
+                    body=f"{message.name} <{message.email}> пишет:\n\n{message.text}",
+                    to=recipients,
+                )
             messages.success(request, "Ваше сообщение успешно отправлено!")
-            return render(request, "users/send_message.html", {"form": form})
+            return await sync_to_async(render)(request, "users/send_message.html", {"form": form})
     else:
         form = MessageForm()
 
-    return render(request, "users/send_message.html", {"form": form})
+    # Шаблон читает пользователя и сообщения из сессии синхронно — рендерим в синхронном потоке
+    return await sync_to_async(render)(request, "users/send_message.html", {"form": form})
 
 @login_required
 def profile_view(request):
@@ -149,11 +160,10 @@ def request_account_delete(request):
         reverse('users:confirm_account_delete', kwargs={'uidb64': uid, 'token': token})
     )
 
-    send_mail(
+    queue_email(
         subject="Подтверждение удаления аккаунта",
-        message=f"Для удаления аккаунта перейдите по ссылке:\n\n{delete_url}",
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=[user.email],
+        body=f"Для удаления аккаунта перейдите по ссылке:\n\n{delete_url}",
+        to=[user.email],
     )
 
     return render(request, 'users/delete_email_sent.html')